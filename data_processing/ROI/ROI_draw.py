@@ -1,11 +1,16 @@
 import cv2
 import numpy as np
 import os
+import time  # For measuring how fast the drawing window responds
 
 #Allows the function in mis_folder_functions to be imported
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.ROI.roi_store import roi_table_path, make_roi_record, append_roi, load_roi_table, record_ellipse
+from data_processing.misc_folder_functions.prefetch import prefetch
+from data_processing.ROI.roi_tracking import series_key, series_position, track_roi
+from data_processing.misc_folder_functions.work_queue import default_owner, acquire_lease, release_lease, active_leases, format_progress, LEASE_SECONDS
 
 #Change as you need to
 THERMAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "thermal_images")
@@ -13,6 +18,101 @@ OPTICAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "Processed
 
 OUTPUT_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "ROI_masks") 
 
+# Every accepted ROI is saved as its ellipse and clicked points in OUTPUT_DIR/roi_table.jsonl (see roi_store.py).
+# True also saves the binary mask and the thermal image with the mask overlay as png files like before
+SAVE_MASK_IMAGES = False
+
+# Number of upcoming image pairs read and decoded in the background while you draw
+PREFETCH_DEPTH = 3
+
+# Your name, so several people can draw ROIs on the same folder at once. Each image is leased to one person while
+# they draw it (OUTPUT_DIR/leases) and everyone's ROIs go to their own part of the ROI table. None uses user@computer
+ANNOTATOR = None
+
+# True carries the ROI of an accepted image over to the next images of the same series (subject, camera, combo)
+# and shows it for a one key accept (y). Any other key lets you draw the ROI yourself like before
+PROPAGATE_ROIS = True
+
+# True prints how long the drawing window took to respond to mouse events after each image
+REPORT_FRAME_TIMES = True
+
+# Colors (BGR) of the clicked points, the lines between them and the ellipses
+POINT_COLOR = (0, 0, 255)
+LINE_COLOR = (0, 255, 0)
+PREVIEW_COLOR = (0, 255, 255)
+
+def load_image_pair(optical_path, thermal_path):
+    """
+    Read an optical/thermal pair and resize the thermal image to the optical image.
+
+    Args:
+        optical_path (str): File path to the optical image.
+        thermal_path (str): File path to the corresponding thermal image.
+
+    Returns:
+        tuple: (optical_img, thermal_img) as BGR arrays of the same size.
+    """
+    optical_img = cv2.imread(optical_path)
+    if optical_img is None:
+        raise ValueError(f"Could not read {optical_path}")
+    thermal_img = cv2.imread(thermal_path)
+    if thermal_img is None:
+        raise ValueError(f"Could not read {thermal_path}")
+    thermal_img = cv2.resize(thermal_img, (optical_img.shape[1], optical_img.shape[0]))
+    return optical_img, thermal_img
+
+"""
+Functions that keep the drawing window fast on large optical images.
+
+The window shows a display buffer. The committed drawing (clicked points, lines and fitted ellipse)
+lives in img_copy, and only the parts of the display that the rubber-band line and the ellipse
+preview touched are restored from it on the next mouse event. Nothing is copied in full per event.
+
+Global variables used:
+img_copy (numpy.ndarray): The optical image with the committed drawing.
+display (numpy.ndarray): The buffer shown in the window.
+dirty (tuple): (x0, y0, x1, y1) area of the display drawn on since it was last restored, or None.
+"""
+def padded_rect(xs, ys, pad, shape):
+    # Bounding box of the given coordinates, grown by pad and clipped to the image
+    x0 = max(int(np.floor(min(xs))) - pad, 0)
+    y0 = max(int(np.floor(min(ys))) - pad, 0)
+    x1 = min(int(np.ceil(max(xs))) + pad + 1, shape[1])
+    y1 = min(int(np.ceil(max(ys))) + pad + 1, shape[0])
+    return x0, y0, x1, y1
+
+def ellipse_rect(ellipse, pad, shape):
+    # Bounding box of a rotated ellipse
+    corners = cv2.boxPoints(ellipse)
+    return padded_rect(corners[:, 0], corners[:, 1], pad, shape)
+
+def union_rect(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+def refresh_region(rect):
+    # Copy part of the committed drawing onto the display buffer
+    if rect is not None:
+        x0, y0, x1, y1 = rect
+        display[y0:y1, x0:x1] = img_copy[y0:y1, x0:x1]
+
+def restore_dirty_region():
+    # Remove the rubber-band line and ellipse preview drawn by the last mouse move
+    global dirty
+    refresh_region(dirty)
+    dirty = None
+
+def report_frame_times():
+    """Print how long the drawing window took to handle mouse events for the current image."""
+    if not REPORT_FRAME_TIMES or not frame_times:
+        return
+    times_ms = np.array(frame_times) * 1000
+    print(f"Mouse events: {len(times_ms)}, frame time mean {times_ms.mean():.1f} ms, "
+          f"95th percentile {np.percentile(times_ms, 95):.1f} ms, max {times_ms.max():.1f} ms")
+
 """
 Function to handle mouse events for drawing and fitting an ellipse on an image.
 
@@ -21,16 +121,19 @@ This function is designed to be used as a callback for OpenCV's mouse events. It
 1. On left mouse button press (EVENT_LBUTTONDOWN):
    - Adds the clicked point to a list of points.
    - Draws a small red circle at the clicked point.
-   - If there are multiple points, draws green lines connecting them.
+   - If there are multiple points, draws a green line from the previous point.
 
 2. On mouse movement while drawing (EVENT_MOUSEMOVE):
    - Draws a temporary green line from the last point to the current mouse position.
+   - Once there are at least 5 points, also previews (in yellow) the ellipse that would be fitted
+     to the points and the current mouse position.
 
 3. On right mouse button press (EVENT_RBUTTONDOWN):
    - If there are at least 5 points, fits an ellipse to the points using OpenCV's fitEllipse function.
    - Draws the fitted ellipse on the image in green.
 
-The function updates the display after each action, allowing the user to see the progress of their drawing and the final fitted ellipse.
+Only the area around what changed is redrawn (see the canvas functions above), and the time each
+event takes is recorded in frame_times.
 
 Parameters:
 event (int): The type of mouse event (e.g., left button down, mouse move).
@@ -42,39 +145,128 @@ param: Any extra parameters (not used in this function).
 Global variables used:
 points (list): List to store the coordinates of clicked points.
 drawing (bool): Flag to indicate whether drawing is in progress.
-img_copy (numpy.ndarray): A copy of the original image for drawing.
+img (numpy.ndarray): The optical image, the fitted ellipse is drawn on it.
+img_copy (numpy.ndarray): The optical image with the committed drawing.
+display (numpy.ndarray): The buffer shown in the window.
 ellipse (tuple): Stores the parameters of the fitted ellipse.
 filename (str): The name of the current image file being processed.
+frame_times (list): Seconds taken by each handled mouse event.
 """
 def draw_and_fit_ellipse(event, x, y, flags, param):
-    global points, drawing, img_copy, ellipse, filename
+    global points, drawing, img_copy, ellipse, filename, dirty
+
+    start = time.perf_counter()
+    shape = img_copy.shape
 
     if event == cv2.EVENT_LBUTTONDOWN:
         # Add new point on left click
         points.append((x, y))
         drawing = True
-        img_copy = img.copy()
-        # Draw a red circle at the clicked point
-        cv2.circle(img_copy, (x, y), 3, (0, 0, 255), -1)
+        restore_dirty_region()
+        changed = padded_rect([x], [y], 4, shape)
         if len(points) > 1:
-            # Draw green lines connecting the points
-            cv2.polylines(img_copy, [np.array(points)], False, (0, 255, 0), 2)
-        cv2.imshow(f"Optical Image - {filename}", img_copy)
+            # Draw a green line from the previous point
+            cv2.line(img_copy, points[-2], points[-1], LINE_COLOR, 2)
+            changed = union_rect(changed, padded_rect([points[-2][0], x], [points[-2][1], y], 2, shape))
+        # Draw a red circle at the clicked point
+        cv2.circle(img_copy, (x, y), 3, POINT_COLOR, -1)
+        refresh_region(changed)
 
     elif event == cv2.EVENT_MOUSEMOVE and drawing:
-        # Draw temporary line while moving the mouse
-        temp_img = img_copy.copy()
+        # Draw temporary line while moving the mouse, only touching the area around it
+        restore_dirty_region()
         if len(points) > 0:
-            cv2.line(temp_img, points[-1], (x, y), (0, 255, 0), 2)
-        cv2.imshow(f"Optical Image - {filename}", temp_img)
+            cv2.line(display, points[-1], (x, y), LINE_COLOR, 2)
+            dirty = padded_rect([points[-1][0], x], [points[-1][1], y], 2, shape)
+        if len(points) > 4:
+            # Live preview of the ellipse that includes the current mouse position
+            preview = cv2.fitEllipse(np.array(points + [(x, y)]))
+            cv2.ellipse(display, preview, PREVIEW_COLOR, 1)
+            dirty = union_rect(dirty, ellipse_rect(preview, 2, shape))
 
     elif event == cv2.EVENT_RBUTTONDOWN:
         # Fit and draw ellipse on right click if enough points are available
         if len(points) > 4:
             ellipse = cv2.fitEllipse(np.array(points))
-            cv2.ellipse(img, ellipse, (0, 255, 0), 2)
-            cv2.imshow(f"Optical Image - {filename}", img)
+            cv2.ellipse(img, ellipse, LINE_COLOR, 2)
+            cv2.ellipse(img_copy, ellipse, LINE_COLOR, 2)
+            restore_dirty_region()
+            refresh_region(ellipse_rect(ellipse, 2, shape))
             drawing = False
+    else:
+        return
+
+    cv2.imshow(f"Optical Image - {filename}", display)
+    frame_times.append(time.perf_counter() - start)
+
+def mask_overlay(thermal_img, ellipse):
+    """
+    Draw the mask of an ellipse and overlay it on the thermal image.
+
+    Args:
+        thermal_img (numpy.ndarray): Thermal image, resized to the optical image.
+        ellipse (tuple): The ROI ellipse on the optical image, or None for an empty mask.
+
+    Returns:
+        tuple: (mask, result) with the binary mask (255 inside the ROI) and the thermal image with the ROI in green.
+    """
+    # Create a binary mask from the fitted ellipse
+    mask = np.zeros((thermal_img.shape[0], thermal_img.shape[1]), dtype=np.uint8)
+
+    if ellipse is not None:
+        cv2.ellipse(mask, ellipse, 255, -1)
+
+    # Create a colored mask overlay
+    colored_mask = np.zeros_like(thermal_img)
+    colored_mask[mask == 255] = [0, 255, 0]
+
+    # Blend the thermal image with the mask overlay
+    alpha = 0.5
+    result = cv2.addWeighted(thermal_img, 1, colored_mask, alpha, 0)
+    return mask, result
+
+def save_roi(optical_path, thermal_path, output_dir, ellipse, mask, result, roi_table, save_mask_images,
+             points=None, tracked_from=None):
+    """
+    Save an accepted ROI to the ROI table, and the mask and overlay images if save_mask_images is set.
+
+    Args:
+        optical_path (str): File path to the optical image.
+        thermal_path (str): File path to the corresponding thermal image.
+        output_dir (str): Directory where the masks and overlays are saved.
+        ellipse (tuple): The accepted ROI ellipse, or None.
+        mask (numpy.ndarray): Binary mask of the ROI, see mask_overlay.
+        result (numpy.ndarray): Thermal image with the ROI overlay, see mask_overlay.
+        roi_table (str): Path of the ROI table, or None to not record the ROI.
+        save_mask_images (bool): Whether to also save the binary mask and the overlay as png files.
+        points (list): The clicked points, or None if the ROI was not drawn.
+        tracked_from (str): Image the ROI was carried over from, or None if it was drawn.
+    """
+    if roi_table is not None and ellipse is not None:
+        # Record the ellipse and the points it was fitted to; masks can be redrawn from these at any size
+        base_name = os.path.basename(optical_path).replace("_cropped_optical.jpg", "")
+        subject = os.path.basename(os.path.normpath(output_dir))
+        append_roi(roi_table, make_roi_record(subject, base_name, ellipse, mask.shape, points, tracked_from))
+        print(f"ROI saved in: {roi_table}")
+
+    if not save_mask_images:
+        return
+
+    # Save the binary mask
+    mask_dir = os.path.join(output_dir, "binary_masks")
+    os.makedirs(mask_dir, exist_ok=True)
+    mask_path = os.path.join(mask_dir, f"{os.path.splitext(os.path.basename(optical_path))[0]}_mask.png")
+    cv2.imwrite(mask_path, mask)
+
+    print(f"Binary mask saved at: {mask_path}")
+
+    # Save the thermal image with mask overlay
+    overlay_dir = os.path.join(output_dir, "thermal_with_mask")
+    os.makedirs(overlay_dir, exist_ok=True)
+    overlay_path = os.path.join(overlay_dir, f"{os.path.splitext(os.path.basename(thermal_path))[0]}_with_mask.png")
+    cv2.imwrite(overlay_path, result)
+
+    print(f"Thermal image with mask overlay saved at: {overlay_path}")
 
 """
 Function to process a pair of optical and thermal images.
@@ -82,15 +274,18 @@ Function to process a pair of optical and thermal images.
 This function handles the interactive process of selecting a region of interest (ROI) on an optical image
 and applying it to a corresponding thermal image. It performs the following steps:
 
-1. Loads the optical image and sets up the interactive ROI selection process.
-2. Allows the user to draw points on the optical image to define an elliptical ROI.
-3. Fits an ellipse to the user-drawn points.
-4. Creates a binary mask based on the fitted ellipse.
-5. Loads and resizes the corresponding thermal image to match the optical image dimensions.
-6. Overlays the ROI mask on the thermal image.
-7. Displays the result and waits for user confirmation.
-8. If confirmed, saves the binary mask and the thermal image with the ROI overlay.
-9. If not confirmed, allows the user to retry the ROI selection.
+1. If an ROI was carried over from an earlier image of the series (proposal), shows it on the thermal
+   image. Pressing y accepts it as is; any other key goes on to drawing it by hand.
+2. Loads the optical image and sets up the interactive ROI selection process.
+3. Allows the user to draw points on the optical image to define an elliptical ROI.
+4. Fits an ellipse to the user-drawn points.
+5. Creates a binary mask based on the fitted ellipse.
+6. Loads and resizes the corresponding thermal image to match the optical image dimensions.
+7. Overlays the ROI mask on the thermal image.
+8. Displays the result and waits for user confirmation.
+9. If confirmed, adds the ellipse and clicked points to the ROI table, and saves the binary mask
+   and the thermal image with the ROI overlay if save_mask_images is set.
+10. If not confirmed, allows the user to retry the ROI selection.
 
 The function uses OpenCV for image processing and display operations.
 
@@ -98,6 +293,12 @@ Parameters:
 optical_path (str): File path to the optical image.
 thermal_path (str): File path to the corresponding thermal image.
 output_dir (str): Directory where the output files (masks and overlays) will be saved.
+roi_table (str): Path of the ROI table the ellipse and clicked points are added to, or None to not record them.
+save_mask_images (bool): Whether to also save the binary mask and the overlay as png files.
+images (tuple): The pair already loaded by load_image_pair (e.g. by the prefetcher), or None to read it here.
+                The pair is read only once and kept in memory for every retry.
+proposal (tuple): ROI ellipse carried over from another image of the series (see roi_tracking.py), or None.
+tracked_from (str): Name of the image the proposal was carried over from, recorded with the ROI.
 
 Global variables used:
 img (numpy.ndarray): The loaded optical image.
@@ -107,45 +308,53 @@ drawing (bool): Flag to indicate whether drawing is in progress.
 ellipse (tuple): Stores the parameters of the fitted ellipse.
 filename (str): The name of the current image file being processed.
 
-The function does not return any value but saves output files to the specified directory.
+Returns:
+tuple: The accepted ROI ellipse (None if no ellipse was drawn), so it can be carried over to the next images.
 """
-def process_image_pair(optical_path, thermal_path, output_dir):
-    global img, img_copy, points, drawing, ellipse, filename
+def process_image_pair(optical_path, thermal_path, output_dir, roi_table=None, save_mask_images=True, images=None,
+                       proposal=None, tracked_from=None):
+    global img, img_copy, display, dirty, points, drawing, ellipse, filename, frame_times
 
     filename = os.path.basename(optical_path)
 
+    # Read both images once; a retry starts again from the copy in memory
+    if images is None:
+        images = load_image_pair(optical_path, thermal_path)
+    optical_img, thermal_img = images
+
+    if proposal is not None:
+        # One key accept of the carried over ROI
+        mask, result = mask_overlay(thermal_img, proposal)
+        print(f"Proposed ROI from {tracked_from}: press 'y' to accept, any other key to draw it yourself.")
+        cv2.imshow(f"Proposed ROI - {filename}", result)
+        key = cv2.waitKey(0) & 0xFF
+        cv2.destroyAllWindows()
+
+        if key == ord('y'):
+            save_roi(optical_path, thermal_path, output_dir, proposal, mask, result, roi_table, save_mask_images,
+                     tracked_from=tracked_from)
+            return proposal
+
     while True:
-        # Load the optical image and initialize variables
-        img = cv2.imread(optical_path)
+        # Start from a clean copy of the optical image and initialize variables
+        img = optical_img.copy()
         img_copy = img.copy()
+        display = img.copy()
+        dirty = None
         points = []
         drawing = False
         ellipse = None
+        frame_times = []
 
         # Set up the window and mouse callback for ROI selection
         cv2.namedWindow(f"Optical Image - {filename}")
-        cv2.imshow(f"Optical Image - {filename}", img)
+        cv2.imshow(f"Optical Image - {filename}", display)
         cv2.setMouseCallback(f"Optical Image - {filename}", draw_and_fit_ellipse)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
+        report_frame_times()
 
-        # Create a binary mask from the fitted ellipse
-        mask = np.zeros((img.shape[0], img.shape[1]), dtype=np.uint8)
-
-        if ellipse is not None:
-            cv2.ellipse(mask, ellipse, 255, -1)
-
-        # Load and resize the thermal image
-        thermal_img = cv2.imread(thermal_path)
-        thermal_img = cv2.resize(thermal_img, (mask.shape[1], mask.shape[0]))
-
-        # Create a colored mask overlay
-        colored_mask = np.zeros_like(thermal_img)
-        colored_mask[mask == 255] = [0, 255, 0]
-
-        # Blend the thermal image with the mask overlay
-        alpha = 0.5
-        result = cv2.addWeighted(thermal_img, 1, colored_mask, alpha, 0)
+        mask, result = mask_overlay(thermal_img, ellipse)
 
         # Display the result and wait for user confirmation
         cv2.imshow(f"Thermal Image with Mask Overlay - {filename}", result)
@@ -153,28 +362,31 @@ def process_image_pair(optical_path, thermal_path, output_dir):
         cv2.destroyAllWindows()
 
         if key == ord('y'):
-            # Save the binary mask
-            mask_dir = os.path.join(output_dir, "binary_masks")
-            os.makedirs(mask_dir, exist_ok=True)
-            mask_path = os.path.join(mask_dir, f"{os.path.splitext(os.path.basename(optical_path))[0]}_mask.png")
-            cv2.imwrite(mask_path, mask)
-
-            print(f"Binary mask saved at: {mask_path}")
-
-            # Save the thermal image with mask overlay
-            overlay_dir = os.path.join(output_dir, "thermal_with_mask")
-            os.makedirs(overlay_dir, exist_ok=True)
-            overlay_path = os.path.join(overlay_dir, f"{os.path.splitext(os.path.basename(thermal_path))[0]}_with_mask.png")
-            cv2.imwrite(overlay_path, result)
-
-            print(f"Thermal image with mask overlay saved at: {overlay_path}")
-            break
+            save_roi(optical_path, thermal_path, output_dir, ellipse, mask, result, roi_table, save_mask_images, points)
+            return ellipse
         elif key == ord('n'):
             # If the user is not satisfied, continue the loop to retry
             continue
         else:
             print("Invalid key pressed. Please press 'y' to accept or 'n' to retry.")
 
+def closest_accepted(series_rois, position):
+    """
+    Pick the accepted ROI of a series to carry over to an image.
+
+    Args:
+        series_rois (dict): Maps image name to (position, optical_path, ellipse) for the accepted ROIs of the series.
+        position (tuple): Position of the image in the series, see roi_tracking.series_position.
+
+    Returns:
+        tuple: (image, (position, optical_path, ellipse)) of the latest accepted image before this one,
+               or of the first accepted image after it if there is none before.
+    """
+    earlier = [item for item in series_rois.items() if item[1][0] < position]
+    if earlier:
+        return max(earlier, key=lambda item: item[1][0])
+    return min(series_rois.items(), key=lambda item: item[1][0])
+
 """
 Main function to process all image pairs in the specified directories.
 
@@ -185,11 +397,19 @@ processes matching pairs, and saves the results. It performs the following tasks
 2. Walks through the optical image directory structure.
 3. For each subdirectory in the optical directory:
    - Finds the corresponding subdirectory in the thermal directory.
-   - Processes each cropped optical image file:
+   - Collects each cropped optical image file:
      a. Finds the matching thermal image.
      b. Checks if the image pair has already been processed.
-     c. If not processed, calls process_image_pair() to handle ROI selection and masking.
-4. Skips any images that have already been processed or don't have a matching thermal image.
+4. Skips any images that are already in the ROI table (or have a mask image) or don't have a matching thermal image.
+   The ROI table includes every annotator's part of it (see roi_store.roi_table_path).
+5. Sorts the remaining pairs by series (subject, camera, combo) and by shot within the series.
+6. Calls process_image_pair() on each remaining pair, while the next PREFETCH_DEPTH pairs are
+   read and decoded on a background thread. If PROPAGATE_ROIS is set and an image of the same
+   series already has an ROI, that ROI is tracked onto this image (roi_tracking.track_roi) and
+   offered for a one key accept.
+7. Before drawing an image, takes its lease (misc_folder_functions/work_queue.py) so nobody else draws
+   it at the same time. Images leased by someone else, or finished by someone else in the meantime,
+   are skipped. After each image the progress of the subject (done, in progress by others, left) is printed.
 
 The function uses os.walk() to navigate the directory structure and os.path operations
 to handle file paths and checks.
@@ -199,6 +419,10 @@ No parameters are required as the function uses global constants for directory p
 Global constants used:
 OPTICAL_BASE_DIR (str): Base directory for optical images.
 THERMAL_BASE_DIR (str): Base directory for thermal images.
+OUTPUT_DIR (str): Base directory for the ROI table (and mask images).
+SAVE_MASK_IMAGES (bool): Whether to also save mask and overlay png files.
+PROPAGATE_ROIS (bool): Whether to carry ROIs over to the next images of a series.
+ANNOTATOR (str): Name the leases and ROI table part are under, or None for user@computer.
 
 The function does not return any value but orchestrates the entire image processing workflow.
 """
@@ -206,6 +430,21 @@ def main():
     optical_dir = OPTICAL_BASE_DIR
     thermal_dir = THERMAL_BASE_DIR
     output_dir = OUTPUT_DIR
+    roi_table = roi_table_path(output_dir)
+    rois = load_roi_table(roi_table)
+    pending = []
+
+    # Work queue shared with anyone else drawing on the same folder
+    owner = ANNOTATOR or default_owner()
+    own_roi_table = roi_table_path(output_dir, owner)
+    lease_dir = os.path.join(output_dir, "leases")
+
+    # Every image of each subject and the ones already done, for the progress
+    subject_images = {}
+    done = set()
+
+    # Accepted ROIs of each series: series -> {image: (position, optical_path, ellipse)}
+    accepted = {}
 
     # Walk through the directory structure
     for root, dirs, files in os.walk(optical_dir):
@@ -217,26 +456,103 @@ def main():
             if not os.path.exists(thermal_subdir):
                 continue
 
-            # Process each optical image file
+            # Collect each optical image file
             for optical_file in os.listdir(optical_subdir):
                 if optical_file.endswith("_cropped_optical.jpg"):
                     base_name = optical_file.replace("_cropped_optical.jpg", "")
                     thermal_file = f"{base_name}_thermal.jpg"
                     thermal_path = os.path.join(thermal_subdir, thermal_file)
+                    optical_path = os.path.join(optical_subdir, optical_file)
                     
                     # Check if the corresponding thermal image exists
                     if os.path.exists(thermal_path):
+                        subject_images.setdefault(dir_name, []).append(base_name)
+
                         # Check if this image pair has already been processed
                         mask_path = os.path.join(output_dir, dir_name, "binary_masks", f"{base_name}_cropped_optical_mask.png")
-                        if os.path.exists(mask_path):
+                        if (dir_name, base_name) in rois or os.path.exists(mask_path):
+                            done.add(base_name)
+                            record = rois.get((dir_name, base_name))
+                            if record is not None and series_key(base_name) is not None:
+                                # ROIs from earlier sessions can be carried over too
+                                accepted.setdefault(series_key(base_name), {})[base_name] = (
+                                    series_position(base_name), optical_path, record_ellipse(record))
                             print(f"Skipped images (already processed): {optical_file}")
                             continue
 
-                        print(f"Processing: {optical_file} and {thermal_file}")
-                        optical_path = os.path.join(optical_subdir, optical_file)
-                        process_image_pair(optical_path, thermal_path, os.path.join(output_dir, dir_name))
+                        pending.append((optical_path, thermal_path, os.path.join(output_dir, dir_name)))
                     else:
                         print(f"Matching thermal image not found for: {optical_file}")
 
+    # Go through each series in order (InitialCtrl, PreCup, 0min, 1min, ..., Base, Cool)
+    def series_order(pair):
+        base_name = os.path.basename(pair[0]).replace("_cropped_optical.jpg", "")
+        return pair[2], series_key(base_name) or (base_name,), series_position(base_name), base_name
+    pending.sort(key=series_order)
+
+    print(f"{len(pending)} image pairs to draw")
+    leases = active_leases(lease_dir)
+    for subject in sorted({os.path.basename(pair[2]) for pair in pending}):
+        print(format_progress(subject, subject_images[subject], done, leases, owner))
+
+    # Optical image of the last accepted ROI of each series, so it does not have to be read again
+    reference_images = {}
+
+    # Read the next pairs in the background so there is no wait between images
+    for (optical_path, thermal_path, pair_output_dir), images, error in prefetch(
+            pending, lambda pair: load_image_pair(pair[0], pair[1]), PREFETCH_DEPTH):
+        if error is not None:
+            print(f"Error processing {optical_path}: {error}")
+            continue
+        base_name = os.path.basename(optical_path).replace("_cropped_optical.jpg", "")
+        subject = os.path.basename(pair_output_dir)
+
+        # Take the image so nobody else draws it at the same time
+        if not acquire_lease(lease_dir, base_name, owner, LEASE_SECONDS):
+            print(f"Skipped images (being drawn by someone else): {os.path.basename(optical_path)}")
+            continue
+
+        try:
+            # Someone else may have finished it since the folders were checked
+            rois = load_roi_table(roi_table)
+            done.update(image for (table_subject, image) in rois if table_subject == subject)
+            mask_path = os.path.join(pair_output_dir, "binary_masks", f"{base_name}_cropped_optical_mask.png")
+            if base_name in done or os.path.exists(mask_path):
+                done.add(base_name)
+                print(f"Skipped images (already processed): {os.path.basename(optical_path)}")
+                continue
+
+            print(f"Processing: {os.path.basename(optical_path)} and {os.path.basename(thermal_path)}")
+            series = series_key(base_name)
+            proposal, tracked_from = None, None
+
+            if PROPAGATE_ROIS and accepted.get(series):
+                # Carry over the ROI of the closest accepted image of the series
+                tracked_from, (_, reference_path, reference_ellipse) = closest_accepted(accepted[series], series_position(base_name))
+                try:
+                    reference_img = reference_images.get(reference_path)
+                    if reference_img is None:
+                        reference_img = cv2.imread(reference_path)
+                        if reference_img is None:
+                            raise ValueError(f"Could not read {reference_path}")
+                    proposal, correlation = track_roi(reference_img, images[0], reference_ellipse)
+                    if proposal is None:
+                        print(f"Could not carry over the ROI from {tracked_from} (match {correlation:.2f}), please draw it.")
+                except Exception as e:
+                    print(f"Error processing {optical_path}: {e}")
+                    proposal = None
+
+            ellipse = process_image_pair(optical_path, thermal_path, pair_output_dir, own_roi_table, SAVE_MASK_IMAGES, images,
+                                         proposal, tracked_from)
+            done.add(base_name)
+        finally:
+            release_lease(lease_dir, base_name, owner)
+
+        if ellipse is not None and series is not None:
+            accepted.setdefault(series, {})[base_name] = (series_position(base_name), optical_path, ellipse)
+            reference_images = {optical_path: images[0]}
+
+        print(format_progress(subject, subject_images[subject], done, active_leases(lease_dir), owner))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,219 @@
+import os  # For interacting with the file system
+import cv2  # For fitting and drawing the ellipses
+import numpy as np  # For the label image and the grouped statistics
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.ROI.roi_statistics import statistics_columns
+
+def ellipse_from_mask(mask):
+    """
+    Recover the ellipse of an ROI from its binary mask.
+
+    ROI_draw fills the ellipse fitted to the clicked points, so fitting an ellipse to the
+    outline of the mask gives that ellipse back (to within a pixel).
+
+    Args:
+        mask (np.ndarray): 2D boolean mask of the ROI.
+
+    Returns:
+        tuple: ((center_x, center_y), (width, height), angle) as returned by cv2.fitEllipse,
+               or None if the mask has no outline of at least 5 points.
+    """
+    contours, _ = cv2.findContours(mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if not contours:
+        return None
+    outline = max(contours, key=cv2.contourArea)
+    if len(outline) < 5:
+        return None
+    return cv2.fitEllipse(outline)
+
+def scale_ellipse(ellipse, ratio):
+    """
+    Scale an ellipse about its center.
+
+    Args:
+        ellipse (tuple): ((center_x, center_y), (width, height), angle).
+        ratio (float): Size ratio, e.g. 1.5 for an ellipse 1.5 times as wide and high.
+
+    Returns:
+        tuple: The scaled ellipse.
+    """
+    center, (width, height), angle = ellipse
+    return center, (width * ratio, height * ratio), angle
+
+def control_ellipse(ellipse, offset):
+    """
+    Get the control region: an ellipse the size of the ROI, moved to the side of it.
+
+    Args:
+        ellipse (tuple): ((center_x, center_y), (width, height), angle) of the ROI.
+        offset (float): How far to move the center to the right, in ROI widths (the longer axis).
+                        Use a negative value to place the control region on the left.
+
+    Returns:
+        tuple: The control ellipse.
+    """
+    (center_x, center_y), axes, angle = ellipse
+    return (center_x + offset * max(axes), center_y), axes, angle
+
+def region_names(ring_ratios, control_offset=None):
+    """
+    Get the region names in label order.
+
+    Args:
+        ring_ratios (list): Size ratios of the concentric ellipses, see build_label_image.
+        control_offset (float): Offset of the control region, or None for no control region.
+
+    Returns:
+        list: e.g. ['ring_0.5', 'ring_1', 'ring_1.5', 'control']. Region i has label i + 1.
+    """
+    names = [f'ring_{ratio:g}' for ratio in sorted(ring_ratios)]
+    if control_offset is not None:
+        names.append('control')
+    return names
+
+def build_label_image(shape, ellipse, ring_ratios, control_offset=None):
+    """
+    Label every pixel with the ROI region it belongs to.
+
+    The concentric ellipses are the ROI ellipse scaled by each ratio. Region 'ring_<ratio>' is the
+    band between that ellipse and the next smaller one (the smallest ratio is a full ellipse), so
+    the rings do not overlap and every pixel gets one label. The control region keeps only the
+    pixels that are not inside any ring.
+
+    Args:
+        shape (tuple): (height, width) of the temperature array.
+        ellipse (tuple): ((center_x, center_y), (width, height), angle) of the ROI.
+        ring_ratios (list): Size ratios of the concentric ellipses, e.g. [0.5, 1.0, 1.5].
+        control_offset (float): Offset of the control region in ROI widths (see control_ellipse), or None.
+
+    Returns:
+        np.ndarray: 2D int32 label image. 0 is outside every region, label i + 1 is region_names()[i].
+    """
+    labels = np.zeros(shape[:2], dtype=np.int32)
+    ratios = sorted(ring_ratios)
+
+    # Draw from the back to the front: control, then the rings from the outside in,
+    # so each pixel ends up with the innermost region it lies in
+    if control_offset is not None:
+        cv2.ellipse(labels, control_ellipse(ellipse, control_offset), len(ratios) + 1, -1)
+    for label in range(len(ratios), 0, -1):
+        cv2.ellipse(labels, scale_ellipse(ellipse, ratios[label - 1]), label, -1)
+
+    return labels
+
+def grouped_statistics(temperatures, labels, names, percentiles=()):
+    """
+    Calculate the statistics of every labelled region in one pass.
+
+    The labelled pixels are sorted once by (label, temperature). Every region is then a
+    contiguous sorted slice, so min, max, median and percentiles are read straight out of it
+    for all regions at once, and the mean and std come from grouped sums (np.bincount).
+
+    Args:
+        temperatures (np.ndarray): 2D array of temperatures.
+        labels (np.ndarray): Label image of the same shape, see build_label_image.
+        names (list): Region names, names[i] is label i + 1.
+        percentiles (list): Extra percentiles to report, see roi_statistics.summarize_temperatures.
+
+    Returns:
+        dict: Maps each region name to its statistics (same keys as roi_statistics), or None if
+              the region has no pixels (e.g. it lies outside the image).
+    """
+    temperatures = np.asarray(temperatures)
+    if labels.shape != temperatures.shape:
+        raise ValueError(f"Label image shape {labels.shape} does not match temperature shape {temperatures.shape}")
+
+    flat_labels = labels.ravel()
+    inside = flat_labels > 0
+    region_labels = flat_labels[inside]
+    values = temperatures.ravel()[inside].astype(np.float64)
+    if len(values) == 0:
+        return dict.fromkeys(names)
+
+    # One sort: by label, then by temperature within each label
+    order = np.lexsort((values, region_labels))
+    region_labels, values = region_labels[order], values[order]
+
+    num_labels = len(names) + 1
+    last = len(values) - 1
+    counts = np.bincount(region_labels, minlength=num_labels)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    present = counts > 0
+    safe_counts = np.maximum(counts, 1)
+
+    means = np.bincount(region_labels, weights=values, minlength=num_labels) / safe_counts
+    variances = np.bincount(region_labels, weights=(values - means[region_labels]) ** 2, minlength=num_labels) / safe_counts
+
+    def sorted_percentile(q):
+        # Linear interpolation between the two nearest ranks, like np.percentile
+        position = starts + (q / 100.0) * (safe_counts - 1)
+        lower = np.minimum(np.floor(position).astype(np.int64), last)
+        upper = np.minimum(lower + 1, np.maximum(ends - 1, 0))
+        return values[lower] + (position - lower) * (values[upper] - values[lower])
+
+    columns = {
+        'min_temp': sorted_percentile(0),
+        'max_temp': sorted_percentile(100),
+        'std_dev': np.sqrt(variances),
+        'median_temp': sorted_percentile(50),
+    }
+    for percentile in percentiles:
+        columns[f'p{percentile:g}_temp'] = sorted_percentile(percentile)
+
+    results = {}
+    for label, name in enumerate(names, start=1):
+        if not present[label]:
+            results[name] = None
+            continue
+        stats = {'white_pixels': int(counts[label])}
+        stats.update((column, float(values_by_label[label])) for column, values_by_label in columns.items())
+        results[name] = stats
+    return results
+
+def region_columns(names, percentiles=()):
+    """
+    Get the wide-row column names of every region, in order.
+
+    Args:
+        names (list): Region names, see region_names.
+        percentiles (list): Extra percentiles, see roi_statistics.statistics_columns.
+
+    Returns:
+        list: e.g. ['ring_0.5_white_pixels', 'ring_0.5_min_temp', ..., 'control_median_temp'].
+    """
+    return [f'{name}_{column}' for name in names for column in statistics_columns(percentiles)]
+
+def region_statistics(temperatures, mask, ring_ratios, control_offset=None, percentiles=(), ellipse=None):
+    """
+    Calculate the concentric ring and control region statistics of one ROI as one wide row.
+
+    Args:
+        temperatures (np.ndarray): 2D array of temperatures.
+        mask (np.ndarray): 2D boolean mask of the ROI, on the same grid as the temperatures.
+        ring_ratios (list): Size ratios of the concentric ellipses, see build_label_image.
+        control_offset (float): Offset of the control region in ROI widths, or None for no control region.
+        percentiles (list): Extra percentiles to report.
+        ellipse (tuple): The ROI ellipse on the temperature grid if it is known (e.g. from the ROI table),
+                         or None to recover it from the mask.
+
+    Returns:
+        dict: Maps each column of region_columns to its value. Regions without pixels (or all
+              regions, if no ellipse can be fitted to the mask) are left empty.
+    """
+    names = region_names(ring_ratios, control_offset)
+    row = dict.fromkeys(region_columns(names, percentiles), '')
+
+    if ellipse is None:
+        ellipse = ellipse_from_mask(mask)
+    if ellipse is None:
+        return row
+
+    labels = build_label_image(np.shape(temperatures), ellipse, ring_ratios, control_offset)
+    for name, stats in grouped_statistics(temperatures, labels, names, percentiles).items():
+        if stats is not None:
+            row.update((f'{name}_{column}', value) for column, value in stats.items())
+    return row
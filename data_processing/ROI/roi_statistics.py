@@ -0,0 +1,105 @@
+import numpy as np  # For masking and reducing the temperature arrays
+from PIL import Image  # For opening the binary mask images
+
+def load_mask(image_path):
+    """
+    Load a binary mask image as a boolean array.
+
+    Args:
+        image_path (str): The path to the binary mask image (ROI pixels are white, 255).
+
+    Returns:
+        np.ndarray: 2D boolean array, True where the pixel is white.
+    """
+    # Open the image file and convert it to a numpy array
+    with Image.open(image_path) as img:
+        img_array = np.array(img)
+
+    # Colour masks (e.g. re-saved as RGB) count a pixel as white when every channel is 255
+    if img_array.ndim == 3:
+        return np.all(img_array == 255, axis=2)
+    return img_array == 255
+
+def masked_temperatures(temperatures, mask):
+    """
+    Get the temperatures under a mask in one indexing operation.
+
+    Args:
+        temperatures (np.ndarray): 2D array of temperatures.
+        mask (np.ndarray): 2D boolean mask. If it is smaller than the temperature array it is
+                           lined up with the top left corner, like the old per-pixel lookup.
+
+    Returns:
+        np.ndarray: 1D array of the temperatures where the mask is True, in row-major order.
+    """
+    temperatures = np.asarray(temperatures)
+    if mask.shape == temperatures.shape:
+        return temperatures[mask]
+
+    # Index by coordinates; raises IndexError if the mask reaches outside the temperature array
+    ys, xs = np.nonzero(mask)
+    return temperatures[ys, xs]
+
+def statistics_columns(percentiles=()):
+    """
+    Get the names of the statistics summarize_temperatures returns, in order.
+
+    Args:
+        percentiles (list): Extra percentiles, see summarize_temperatures.
+
+    Returns:
+        list: Column names, e.g. ['white_pixels', 'min_temp', 'max_temp', 'std_dev', 'median_temp'].
+    """
+    return ['white_pixels', 'min_temp', 'max_temp', 'std_dev', 'median_temp'] + [f'p{percentile:g}_temp' for percentile in percentiles]
+
+def summarize_temperatures(temperatures, percentiles=()):
+    """
+    Calculate the ROI statistics of a set of temperatures.
+
+    Args:
+        temperatures (np.ndarray): 1D array of temperatures inside the ROI.
+        percentiles (list): Extra percentiles to report, e.g. [10, 90] adds 'p10_temp' and 'p90_temp'.
+
+    Returns:
+        dict: 'white_pixels', 'min_temp', 'max_temp', 'std_dev', 'median_temp' and one entry per
+              percentile, or None if there are no temperatures.
+    """
+    if len(temperatures) == 0:
+        return None
+
+    stats = {
+        'white_pixels': len(temperatures),
+        'min_temp': np.min(temperatures),
+        'max_temp': np.max(temperatures),
+        'std_dev': np.std(temperatures),
+        'median_temp': np.median(temperatures),
+    }
+    if len(percentiles) > 0:
+        for percentile, value in zip(percentiles, np.percentile(temperatures, percentiles)):
+            stats[f'p{percentile:g}_temp'] = value
+    return stats
+
+def roi_statistics(temperatures, masks, percentiles=()):
+    """
+    Calculate temperature statistics for one ROI mask or a stack of ROI masks on the same frame.
+
+    The temperature array is loaded and indexed once per mask with boolean indexing, so no
+    per-pixel Python work is done no matter how large the ROI is.
+
+    Args:
+        temperatures (np.ndarray): 2D array of temperatures (e.g. from load_temperature_array).
+        masks (np.ndarray): 2D boolean mask, or a 3D stack of masks (number of ROIs, height, width).
+        percentiles (list): Extra percentiles to report, see summarize_temperatures.
+
+    Returns:
+        dict or list: The statistics of the mask (see summarize_temperatures), or for a stack one
+                      entry per mask in the same order. Empty masks give None.
+    """
+    temperatures = np.asarray(temperatures)
+    masks = np.asarray(masks, dtype=bool)
+
+    if masks.ndim == 2:
+        return summarize_temperatures(masked_temperatures(temperatures, masks), percentiles)
+    if masks.ndim != 3:
+        raise ValueError(f"Expected a 2D mask or a 3D stack of masks, got shape {masks.shape}")
+    return [summarize_temperatures(masked_temperatures(temperatures, mask), percentiles) for mask in masks]
@@ -0,0 +1,245 @@
+import os  # For interacting with the file system
+import json  # For the ROI table, one JSON object per line
+import argparse  # For the mask import command line options
+from functools import lru_cache  # For caching rasterized masks
+import cv2  # For drawing the ellipses
+import numpy as np  # For the mask arrays
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.ROI.roi_statistics import load_mask
+from data_processing.ROI.roi_regions import ellipse_from_mask
+
+#Change as you need to
+ROI_ROOT_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "ROI_masks")
+
+# Name of the ROI table kept in the root of an ROI folder
+ROI_TABLE_FILENAME = "roi_table.jsonl"
+
+# Number of rasterized masks kept in memory
+MASK_CACHE_SIZE = 256
+
+def roi_table_path(roi_root_dir, annotator=None):
+    """
+    Get the path of the ROI table of an ROI folder.
+
+    Args:
+        roi_root_dir (str): Root of the ROI folder (the one with a folder per subject).
+        annotator (str): Name of the annotator to get their own part of the table, or None for the main table.
+                         When several people draw ROIs on the same synced folder each writes to their own
+                         part, so OneDrive never has to merge two edits of one file.
+
+    Returns:
+        str: Path of the ROI table (e.g. roi_table.jsonl, or roi_table.andrew.jsonl for an annotator).
+    """
+    if annotator is None:
+        return os.path.join(roi_root_dir, ROI_TABLE_FILENAME)
+    safe_name = ''.join(c if c.isalnum() or c in '-_@' else '_' for c in annotator)
+    stem, extension = os.path.splitext(ROI_TABLE_FILENAME)
+    return os.path.join(roi_root_dir, f"{stem}.{safe_name}{extension}")
+
+def make_roi_record(subject, image, ellipse, shape, points=None, tracked_from=None):
+    """
+    Build the ROI table entry of one image.
+
+    Args:
+        subject (str): Subject folder (e.g. "HIP_01").
+        image (str): Image name without suffix and extension (e.g. "HIP_01_E8XT_1_Base").
+        ellipse (tuple): ((center_x, center_y), (width, height), angle) as returned by cv2.fitEllipse.
+        shape (tuple): (height, width) of the image the ellipse was drawn on.
+        points (list): The clicked (x, y) points the ellipse was fitted to, or None if unknown.
+        tracked_from (str): Image the ROI was carried over from (see roi_tracking.py), or None if it was drawn.
+
+    Returns:
+        dict: The ROI record.
+    """
+    (center_x, center_y), (width, height), angle = ellipse
+
+    # OpenCV keeps ellipses in float32, so the shortest float32 text is exact and redraws the same mask
+    def compact(value):
+        return float(str(np.float32(value)))
+
+    return {
+        "subject": subject,
+        "image": image,
+        "center": [compact(center_x), compact(center_y)],
+        "axes": [compact(width), compact(height)],
+        "angle": compact(angle),
+        "shape": [int(shape[0]), int(shape[1])],
+        "points": [[int(x), int(y)] for x, y in points] if points is not None else None,
+        "tracked_from": tracked_from,
+    }
+
+def record_ellipse(record):
+    """
+    Get the ellipse of an ROI record in the form cv2.ellipse and cv2.fitEllipse use.
+
+    Args:
+        record (dict): ROI record, see make_roi_record.
+
+    Returns:
+        tuple: ((center_x, center_y), (width, height), angle).
+    """
+    return tuple(record["center"]), tuple(record["axes"]), record["angle"]
+
+def append_roi(table_path, record):
+    """
+    Add an ROI to the ROI table.
+
+    The table is only ever appended to, so a redrawn ROI is added again and the newest entry
+    of an image is the one that counts (see load_roi_table).
+
+    Args:
+        table_path (str): Path of the ROI table.
+        record (dict): ROI record, see make_roi_record.
+    """
+    os.makedirs(os.path.dirname(table_path), exist_ok=True)
+    with open(table_path, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+def load_roi_table(table_path):
+    """
+    Load the ROI table, together with the annotators' parts of it (see roi_table_path).
+
+    Args:
+        table_path (str): Path of the ROI table.
+
+    Returns:
+        dict: Maps (subject, image) to the newest ROI record of that image. Empty if the table does not exist.
+    """
+    rois = {}
+    table_dir = os.path.dirname(table_path)
+    stem, extension = os.path.splitext(os.path.basename(table_path))
+
+    # The main table first, then the annotators' parts from the least to the most recently changed
+    paths = [table_path] if os.path.exists(table_path) else []
+    if os.path.isdir(table_dir):
+        parts = [os.path.join(table_dir, name) for name in os.listdir(table_dir)
+                 if name.startswith(f"{stem}.") and name.endswith(extension) and name != os.path.basename(table_path)]
+        paths += sorted(parts, key=os.path.getmtime)
+
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut off while it was being written
+                rois[(record["subject"], record["image"])] = record
+    return rois
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _rasterize(center, axes, angle, shape, target_shape):
+    mask = np.zeros(target_shape, dtype=np.uint8)
+
+    if target_shape == shape:
+        # Same grid the ROI was drawn on: the same call ROI_draw uses, so the mask is identical
+        cv2.ellipse(mask, (center, axes, angle), 255, -1)
+    else:
+        # Scale an outline of the ellipse to the target grid (x and y can scale differently)
+        scale_x, scale_y = target_shape[1] / shape[1], target_shape[0] / shape[0]
+        t = np.linspace(0, 2 * np.pi, 360, endpoint=False)
+        theta = np.deg2rad(angle)
+        x = axes[0] / 2 * np.cos(t)
+        y = axes[1] / 2 * np.sin(t)
+        outline_x = (center[0] + x * np.cos(theta) - y * np.sin(theta)) * scale_x
+        outline_y = (center[1] + x * np.sin(theta) + y * np.cos(theta)) * scale_y
+        # 4 fractional bits keep sub-pixel precision when filling
+        outline = np.round(np.column_stack((outline_x, outline_y)) * 16).astype(np.int32)
+        cv2.fillPoly(mask, [outline], 255, lineType=cv2.LINE_8, shift=4)
+
+    mask = mask == 255
+    mask.flags.writeable = False  # Shared by everyone who asks for the same mask
+    return mask
+
+def rasterize_roi(record, target_shape=None):
+    """
+    Draw the mask of an ROI on any grid.
+
+    Masks are cached, so asking for the same ROI on the same grid again costs nothing. The
+    returned array is read-only because it is shared; copy it before changing it.
+
+    Args:
+        record (dict): ROI record, see make_roi_record.
+        target_shape (tuple): (height, width) of the grid to draw on, e.g. the temperature array.
+                              None uses the grid the ROI was drawn on.
+
+    Returns:
+        np.ndarray: 2D boolean mask, True inside the ROI.
+    """
+    shape = tuple(record["shape"])
+    target_shape = shape if target_shape is None else tuple(target_shape[:2])
+    return _rasterize(tuple(record["center"]), tuple(record["axes"]), record["angle"], shape, target_shape)
+
+def scale_record_ellipse(record, target_shape):
+    """
+    Get the ellipse of an ROI on another grid.
+
+    Only exact when the grid is scaled the same in x and y (or the ellipse is not rotated),
+    which is the case for the thermal and cropped optical images.
+
+    Args:
+        record (dict): ROI record, see make_roi_record.
+        target_shape (tuple): (height, width) of the target grid.
+
+    Returns:
+        tuple: ((center_x, center_y), (width, height), angle) on the target grid.
+    """
+    scale_x = target_shape[1] / record["shape"][1]
+    scale_y = target_shape[0] / record["shape"][0]
+    (center_x, center_y), (width, height), angle = record_ellipse(record)
+    return (center_x * scale_x, center_y * scale_y), (width * scale_x, height * scale_y), angle
+
+def import_mask_folder(roi_root_dir, table_path=None):
+    """
+    Add the ROIs of existing binary mask images to the ROI table.
+
+    The ellipse is recovered from each mask's outline. The clicked points are not known for
+    these, so they are stored as None. Images already in the table are skipped.
+
+    Args:
+        roi_root_dir (str): Root of the ROI folder (HIP_xx/binary_masks/*_mask.png).
+        table_path (str): Path of the ROI table, or None for the table in roi_root_dir.
+    """
+    if not os.path.exists(roi_root_dir):
+        print(f"The directory {roi_root_dir} does not exist.")
+        return
+
+    table_path = table_path or roi_table_path(roi_root_dir)
+    rois = load_roi_table(table_path)
+    imported = 0
+
+    for subject in sorted(os.listdir(roi_root_dir)):
+        mask_dir = os.path.join(roi_root_dir, subject, "binary_masks")
+        if not os.path.isdir(mask_dir):
+            continue
+
+        for mask_file in sorted(os.listdir(mask_dir)):
+            if not mask_file.endswith("_cropped_optical_mask.png"):
+                continue
+            image = mask_file.replace("_cropped_optical_mask.png", "")
+            if (subject, image) in rois:
+                continue
+
+            mask_path = os.path.join(mask_dir, mask_file)
+            try:
+                mask = load_mask(mask_path)
+                ellipse = ellipse_from_mask(mask)
+                if ellipse is None:
+                    print(f"No ROI found in {mask_path}")
+                    continue
+                append_roi(table_path, make_roi_record(subject, image, ellipse, mask.shape))
+                imported += 1
+            except Exception as e:
+                print(f"Error processing {mask_path}: {e}")
+
+    print(f"Imported {imported} masks into {table_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the ROIs of existing binary mask images to the ROI table.")
+    parser.add_argument("root", nargs="?", default=ROI_ROOT_DIR, help="ROI folder with HIP_xx/binary_masks folders")
+    args = parser.parse_args()
+
+    import_mask_folder(args.root)
@@ -0,0 +1,183 @@
+import os  # For interacting with the file system
+import cv2  # For registering the optical images
+import numpy as np  # For the image windows and the ellipse outline
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.file_names import parse_filename
+
+# Order of the shots of a series. Minute shots ("0min", "1min", ...) come after PreCup, in minute order
+PHASE_ORDER = {"InitialCtrl": 0, "PreCup": 1, "min": 2, "Base": 3, "Cool": 4}
+
+# Size of the area around the ROI that is registered, in ROI bounding boxes
+TRACK_WINDOW = 2.5
+
+# The registered area is downscaled so its longer side is at most this many pixels
+TRACK_MAX_SIZE = 320
+
+# Number of pyramid levels the registration runs on, coarse to fine
+TRACK_LEVELS = 3
+
+# Proposals whose registration correlation (-1 to 1) is below this are not shown
+TRACK_MIN_CORRELATION = 0.6
+
+def series_key(image):
+    """
+    Get the series an image belongs to.
+
+    Args:
+        image (str): Image name without suffix and extension (e.g. "HIP_01_E8XT_6_0min").
+
+    Returns:
+        tuple: (subject_id, camera, combo_number), or None if the name does not follow the naming scheme.
+    """
+    try:
+        subject_id, camera, combo_number, _, _ = parse_filename(image)
+    except IndexError:
+        return None
+    return subject_id, camera, combo_number
+
+def series_position(image):
+    """
+    Get the position of an image within its series, for sorting.
+
+    Args:
+        image (str): Image name without suffix and extension.
+
+    Returns:
+        tuple: (phase, minutes). Unknown phases sort last.
+    """
+    phase = image.split('_')[-1]
+    if phase.endswith("min") and phase[:-3].isdigit():
+        return PHASE_ORDER["min"], int(phase[:-3])
+    return PHASE_ORDER.get(phase, len(PHASE_ORDER)), 0
+
+def ellipse_outline(ellipse, num_points=72):
+    """
+    Get points on the outline of an ellipse.
+
+    Args:
+        ellipse (tuple): ((center_x, center_y), (width, height), angle) as returned by cv2.fitEllipse.
+        num_points (int): Number of points.
+
+    Returns:
+        np.ndarray: (num_points, 2) float32 array of (x, y) points.
+    """
+    (center_x, center_y), (width, height), angle = ellipse
+    t = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
+    theta = np.deg2rad(angle)
+    x = width / 2 * np.cos(t)
+    y = height / 2 * np.sin(t)
+    return np.column_stack((center_x + x * np.cos(theta) - y * np.sin(theta),
+                            center_y + x * np.sin(theta) + y * np.cos(theta))).astype(np.float32)
+
+def register_window(reference_window, target_window, shift_x=0.0, shift_y=0.0):
+    """
+    Find the affine warp from the reference window to the target window, coarse to fine.
+
+    ECC is run on a small image pyramid (TRACK_LEVELS levels), so larger movements are caught
+    at the coarse levels and refined at full window resolution.
+
+    Args:
+        reference_window (np.ndarray): float32 grayscale window around the ROI in the reference image.
+        target_window (np.ndarray): float32 grayscale window at the same place in the target image.
+        shift_x (float): Starting guess of the x movement, in window pixels.
+        shift_y (float): Starting guess of the y movement, in window pixels.
+
+    Returns:
+        tuple: (correlation, warp) with the 2x3 float32 warp mapping reference window coordinates to
+               target window coordinates, or (0.0, None) if ECC did not converge.
+    """
+    levels = [(reference_window, target_window)]
+    for _ in range(TRACK_LEVELS - 1):
+        if min(levels[-1][0].shape) < 64:
+            break
+        levels.append((cv2.pyrDown(levels[-1][0]), cv2.pyrDown(levels[-1][1])))
+
+    factor = 2 ** (len(levels) - 1)
+    warp = np.array([[1, 0, shift_x / factor], [0, 1, shift_y / factor]], dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 100, 1e-5)
+    correlation = 0.0
+
+    for level, (reference_level, target_level) in enumerate(reversed(levels)):
+        if level > 0:
+            warp[:, 2] *= 2  # Translation doubles going to the next finer level
+        try:
+            correlation, warp = cv2.findTransformECC(reference_level, target_level, warp, cv2.MOTION_AFFINE, criteria, None, 5)
+        except cv2.error:
+            return 0.0, None
+    return correlation, warp
+
+def track_roi(reference_img, target_img, ellipse):
+    """
+    Move an ROI drawn on one optical image of a series onto a later one.
+
+    Only the area around the ROI is registered (the arm can shift and the camera angle change
+    a little between shots). The ROI patch is first found in the target with template matching,
+    the area is then registered with an affine ECC registration, coarse to fine (see
+    register_window), and the ellipse outline is moved with the result and fitted again.
+
+    Args:
+        reference_img (np.ndarray): Optical image the ROI was accepted on (BGR or grayscale).
+        target_img (np.ndarray): Optical image to move the ROI onto. Can be a different size.
+        ellipse (tuple): ((center_x, center_y), (width, height), angle) of the ROI on reference_img.
+
+    Returns:
+        tuple: (ellipse, correlation) with the ROI on target_img and how well the areas matched
+               (1 is a perfect match), or (None, correlation) if the registration failed or
+               matched worse than TRACK_MIN_CORRELATION.
+    """
+    reference = reference_img if reference_img.ndim == 2 else cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
+    target = target_img if target_img.ndim == 2 else cv2.cvtColor(target_img, cv2.COLOR_BGR2GRAY)
+
+    # Work on the reference grid; the result is scaled back to the target at the end
+    target_scale_x = target.shape[1] / reference.shape[1]
+    target_scale_y = target.shape[0] / reference.shape[0]
+    if target.shape != reference.shape:
+        target = cv2.resize(target, (reference.shape[1], reference.shape[0]), interpolation=cv2.INTER_AREA)
+
+    # Window around the ROI, the same in both images
+    corners = cv2.boxPoints(ellipse)
+    (center_x, center_y), _, _ = ellipse
+    half_width = (corners[:, 0].max() - corners[:, 0].min()) * TRACK_WINDOW / 2
+    half_height = (corners[:, 1].max() - corners[:, 1].min()) * TRACK_WINDOW / 2
+    x0, x1 = max(int(center_x - half_width), 0), min(int(center_x + half_width) + 1, reference.shape[1])
+    y0, y1 = max(int(center_y - half_height), 0), min(int(center_y + half_height) + 1, reference.shape[0])
+    if x1 - x0 < 16 or y1 - y0 < 16:
+        return None, 0.0
+
+    scale = min(1.0, TRACK_MAX_SIZE / max(x1 - x0, y1 - y0))
+    size = (max(int(round((x1 - x0) * scale)), 1), max(int(round((y1 - y0) * scale)), 1))
+    reference_window = cv2.resize(reference[y0:y1, x0:x1], size, interpolation=cv2.INTER_AREA).astype(np.float32)
+    target_window = cv2.resize(target[y0:y1, x0:x1], size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    # Starting guess of the movement: where the ROI itself (a smaller patch than the window, so
+    # less affected by rotation) best matches in the target window
+    patch_x0 = max(int((center_x - half_width / TRACK_WINDOW - x0) * scale), 0)
+    patch_y0 = max(int((center_y - half_height / TRACK_WINDOW - y0) * scale), 0)
+    patch_x1 = int((center_x + half_width / TRACK_WINDOW - x0) * scale)
+    patch_y1 = int((center_y + half_height / TRACK_WINDOW - y0) * scale)
+    patch = reference_window[patch_y0:patch_y1, patch_x0:patch_x1]
+    shift_x, shift_y = 0.0, 0.0
+    if min(patch.shape) >= 8:
+        _, _, _, (match_x, match_y) = cv2.minMaxLoc(cv2.matchTemplate(target_window, patch, cv2.TM_CCOEFF_NORMED))
+        shift_x, shift_y = float(match_x - patch_x0), float(match_y - patch_y0)
+
+    # Register from no movement and from the matched shift, and keep whichever matches better
+    correlation, warp = -1.0, None
+    for start_x, start_y in ((0.0, 0.0), (shift_x, shift_y)):
+        candidate_correlation, candidate_warp = register_window(reference_window, target_window, start_x, start_y)
+        if candidate_warp is not None and candidate_correlation > correlation:
+            correlation, warp = candidate_correlation, candidate_warp
+    if warp is None:
+        return None, 0.0
+    if correlation < TRACK_MIN_CORRELATION:
+        return None, correlation
+
+    # Move the outline: reference window -> target window -> full target image
+    outline = (ellipse_outline(ellipse) - (x0, y0)) * scale
+    moved = outline @ warp[:, :2].T + warp[:, 2]
+    moved = moved / scale + (x0, y0)
+    moved *= (target_scale_x, target_scale_y)
+    return cv2.fitEllipse(moved.astype(np.float32)), correlation
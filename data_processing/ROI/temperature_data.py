@@ -1,192 +1,368 @@
 import os  # For interacting with the file system
+import csv  # For streaming the results into the output CSV
+import json  # For the checkpoint of rows already written
+import argparse  # For the --workers command line option
+from concurrent.futures import ProcessPoolExecutor, as_completed  # For processing masks on several cores
 import numpy as np  # For numerical operations, especially on arrays
-from PIL import Image  # For opening and processing image files
-import pandas as pd  # For handling and analyzing data, especially in CSV files
 
 #Allows the function in mis_folder_functions to be imported
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.data_extraction.temperature_store import load_temperature_array, find_temperature_file
+from data_processing.misc_folder_functions.file_helpers import file_signature, read_csv_rows
+from data_processing.ROI.roi_statistics import load_mask, roi_statistics, statistics_columns
+from data_processing.ROI.roi_regions import region_statistics, region_names, region_columns
+from data_processing.ROI.roi_store import roi_table_path, load_roi_table, rasterize_roi, scale_record_ellipse
 
 REGIONOFINTEREST_ROOT_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "ROI Images")
-#directory of all temperature pixel value csvs
+#directory of all temperature pixel value files (.npy arrays or legacy csvs)
 TEMPERATURE_ROOT_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "temperature_csv")
 
 # Define the output path for the results CSV
 OUTPUT_CSV_PATH = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "temperature_analysis_results.csv")
 
-def get_white_pixel_coordinates(image_path):
+# Extra percentiles of the ROI temperatures to add to the results, e.g. [10, 90] adds p10_temp and p90_temp columns
+PERCENTILES = []
+
+# Concentric ellipses around the ROI, as size ratios of the ROI ellipse. Each one gets its own columns for the band
+# between it and the next smaller one (e.g. [0.5, 1.0, 1.5], ring_1.5 = between 1x and 1.5x the ROI). [] for no rings
+RING_RATIOS = []
+# Control region the size of the ROI, moved this many ROI widths to the right (negative = left), e.g. 1.5. None for no control region
+CONTROL_OFFSET = None
+
+def process_image_and_csv(image_path, csv_path, percentiles=(), ring_ratios=(), control_offset=None, roi_record=None):
     """
-    Get the coordinates of white pixels in an image.
+    Process an image and its corresponding temperature file to extract statistics.
 
     Args:
-        image_path (str): The path to the image file.
+        image_path (str): The path to the binary mask image file. Not used if roi_record is given.
+        csv_path (str): The path to the temperature file (.npy array or legacy .csv).
+        percentiles (list): Extra percentiles to report, e.g. [10, 90] (see roi_statistics.py).
+        ring_ratios (list): Size ratios of the concentric rings to add, see RING_RATIOS.
+        control_offset (float): Offset of the control region to add, see CONTROL_OFFSET.
+        roi_record (dict): The image's entry in the ROI table (see roi_store.py). The mask is then
+                           drawn from the stored ellipse instead of read from image_path.
 
     Returns:
-        np.ndarray: An array of coordinates where the white pixels are located.
+        dict: A dictionary containing various statistics about the temperatures in white pixel areas.
     """
-    # Open the image file and convert it to a numpy array
-    with Image.open(image_path) as img:
-        img_array = np.array(img)
+    print(f"Processing image: {image_path if roi_record is None else roi_record['image']}")
+    print(f"Corresponding temperature file: {csv_path}")
+
+    # Load the temperature data (.npy or legacy CSV)
+    temperatures = load_temperature_array(csv_path)
+    print(f"Temperature array shape: {temperatures.shape}")
+
+    if roi_record is not None:
+        # Draw the stored ellipse straight onto the temperature grid
+        mask = rasterize_roi(roi_record, temperatures.shape)
+        ellipse = scale_record_ellipse(roi_record, temperatures.shape)
+    else:
+        # Load the binary mask as a boolean array (True where the pixel is white)
+        mask = load_mask(image_path)
+        ellipse = None
+    print(f"Number of white pixels found: {np.count_nonzero(mask)}")
+
+    # Take all temperatures under the mask at once and calculate the statistics on them
+    stats = roi_statistics(temperatures, mask, percentiles)
+
+    if stats is None:
+        print("Warning: No temperatures extracted. Skipping this file.")
+        return None
+
+    # Modify the image name by removing "_cropped_optical_mask.png"
+    if roi_record is not None:
+        modified_image_name = roi_record['image']
+    else:
+        modified_image_name = os.path.basename(image_path).replace("_cropped_optical_mask.png", "")
 
-    # Find the coordinates where the pixel value is 255 (white)
-    white_pixels = np.column_stack(np.where(img_array == 255))
+    # Return the results as a dictionary
+    result = {'Filename': modified_image_name, **stats}
 
-    return white_pixels
+    # Rings and control region all come from one label image of the same frame
+    if len(ring_ratios) > 0 or control_offset is not None:
+        result.update(region_statistics(temperatures, mask, ring_ratios, control_offset, percentiles, ellipse))
+    return result
 
-def get_temperatures_for_coordinates(coordinates, temp_df):
+def find_mask_pairs(roi_root_dir, temp_root_dir, rois=None):
     """
-    Extract temperature values from the CSV file at the given coordinates.
+    Collect every ROI and the temperature file that goes with it.
+
+    ROIs come from the ROI table when the image is in it, and from the binary mask images otherwise.
 
     Args:
-        coordinates (np.ndarray): An array of coordinates (y, x) where temperatures should be extracted.
-        temp_df (pd.DataFrame): The DataFrame containing temperature values.
+        roi_root_dir (str): Root directory containing the ROI (Region of Interest) images.
+        temp_root_dir (str): Root directory containing the temperature files (.npy or .csv).
+        rois (dict): The loaded ROI table (see roi_store.load_roi_table), or None.
 
     Returns:
-        np.ndarray: An array of temperature values corresponding to the given coordinates.
+        list: (image_file, image_path, csv_path, roi_record) tuples in sorted order. image_file is the
+              mask file name, or the image name for ROIs from the table (which have no image_path).
+              csv_path is None when no matching temperature file exists.
     """
-    temperatures = []
+    pairs = []
+    rois = rois or {}
 
-    # Loop through each coordinate and retrieve the corresponding temperature
-    for y, x in coordinates:
-        temp = temp_df.iloc[y, x]  # Use iloc to access the DataFrame by row and column index
-        temperatures.append(temp)
+    subjects = {subject for subject, _ in rois}
+    subjects.update(subdir for subdir in os.listdir(roi_root_dir) if os.path.isdir(os.path.join(roi_root_dir, subdir, 'binary_masks')))
 
-    return np.array(temperatures)
+    # Iterate over each subject in the ROI root directory and the ROI table
+    for subdir in sorted(subjects):
+        # Define paths to the binary mask images and corresponding temperature CSVs
+        roi_subdir = os.path.join(roi_root_dir, subdir, 'binary_masks')
+        temp_subdir = os.path.join(temp_root_dir, subdir)
 
-def process_image_and_csv(image_path, csv_path):
+        if not os.path.isdir(temp_subdir):
+            continue
+
+        entries = {}
+        if os.path.isdir(roi_subdir):
+            # Each image file in the binary mask directory
+            for image_file in os.listdir(roi_subdir):
+                if image_file.endswith('_optical_mask.png'):
+                    # Generate the base name to find the corresponding temperature file
+                    base_name = image_file.replace('_cropped_optical_mask.png', '')
+                    entries[base_name] = (image_file, os.path.join(roi_subdir, image_file), None)
+
+        # The ROI table wins over a mask image of the same image
+        for (subject, base_name), record in rois.items():
+            if subject == subdir:
+                entries[base_name] = (base_name, None, record)
+
+        for base_name in sorted(entries):
+            image_file, image_path, record = entries[base_name]
+            # Prefer the .npy array and fall back to a legacy CSV
+            pairs.append((image_file, image_path, find_temperature_file(temp_subdir, base_name), record))
+
+    return pairs
+
+def process_pair_task(task):
     """
-    Process an image and its corresponding temperature CSV to extract statistics.
+    Run process_image_and_csv for one mask and capture any error instead of raising it.
 
     Args:
-        image_path (str): The path to the binary mask image file.
-        csv_path (str): The path to the temperature CSV file.
+        task (tuple): (image_file, image_path, csv_path, percentiles, ring_ratios, control_offset, roi_record).
 
     Returns:
-        dict: A dictionary containing various statistics about the temperatures in white pixel areas.
+        tuple: (image_file, result, error_message). error_message is None on success.
     """
-    print(f"Processing image: {image_path}")
-    print(f"Corresponding CSV: {csv_path}")
+    image_file, image_path, csv_path = task[:3]
+    try:
+        return image_file, process_image_and_csv(image_path, csv_path, *task[3:]), None
+    except Exception as e:
+        return image_file, None, str(e)
 
-    # Get the coordinates of the white pixels in the image
-    coordinates = get_white_pixel_coordinates(image_path)
-    print(f"Number of white pixels found: {len(coordinates)}")
-
-    # Load the temperature data from the CSV file into a DataFrame
-    temp_df = pd.read_csv(csv_path, header=None)
-    print(f"CSV shape: {temp_df.shape}")
+def checkpoint_path(output_csv_path):
+    """
+    Get the path of the checkpoint kept next to the results CSV.
 
-    # Extract the temperature values at the white pixel coordinates
-    temperatures = get_temperatures_for_coordinates(coordinates, temp_df)
-    print(f"Number of temperatures extracted: {len(temperatures)}")
+    Args:
+        output_csv_path (str): Path of the results CSV.
 
-    if len(temperatures) == 0:
-        print("Warning: No temperatures extracted. Skipping this file.")
-        return None
+    Returns:
+        str: Path of the checkpoint file (e.g. temperature_analysis_results_checkpoint.jsonl).
+    """
+    return os.path.splitext(output_csv_path)[0] + "_checkpoint.jsonl"
 
-    # Calculate statistics on the extracted temperatures
-    min_temp = np.min(temperatures)
-    max_temp = np.max(temperatures)
-    std_dev = np.std(temperatures)
-    median_temp = np.median(temperatures)
+def pair_signature(image_path, csv_path, roi_record=None):
+    """
+    Get the signature of the inputs of one result row, used to tell whether the row is still valid.
 
-    # Modify the image name by removing "_cropped_optical_mask.png"
-    modified_image_name = os.path.basename(image_path).replace("_cropped_optical_mask.png", "")
+    Args:
+        image_path (str): The path to the binary mask image file.
+        csv_path (str): The path to the temperature file.
+        roi_record (dict): The ROI table entry used instead of the mask image, if any.
 
-    # Return the results as a dictionary
+    Returns:
+        dict: The temperature file name, the size and modification time of the temperature file,
+              and the same for the mask image or the stored ellipse of the ROI table entry.
+    """
+    if roi_record is not None:
+        mask_signature = {key: roi_record[key] for key in ("center", "axes", "angle", "shape")}
+    else:
+        mask_signature = file_signature(image_path)
     return {
-        'Filename': modified_image_name,
-        'white_pixels': len(coordinates),
-        'min_temp': min_temp,
-        'max_temp': max_temp,
-        'std_dev': std_dev,
-        'median_temp': median_temp
+        "temperature_file": os.path.basename(csv_path),
+        "mask": mask_signature,
+        "temperature": file_signature(csv_path),
     }
 
-def main(roi_root_dir, temp_root_dir):
+def load_checkpoint(path):
+    """
+    Load the checkpoint of rows already written to the results CSV.
+
+    The checkpoint has one JSON line per written row. A line cut off by a crash is ignored,
+    and if a Filename appears more than once the last line wins.
+
+    Args:
+        path (str): Path of the checkpoint file.
+
+    Returns:
+        dict: Maps each Filename to its pair signature. Empty if there is no checkpoint.
+    """
+    checkpoint = {}
+    if not os.path.exists(path):
+        return checkpoint
+
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            checkpoint[entry["Filename"]] = entry["signature"]
+    return checkpoint
+
+def write_results(output_csv_path, header, rows, checkpoint):
+    """
+    Write the results CSV and its checkpoint from scratch.
+
+    Args:
+        output_csv_path (str): Path of the results CSV.
+        header (list): Column names.
+        rows (list): Result rows as dictionaries, in the order to write them.
+        checkpoint (dict): Maps each Filename in rows to its pair signature.
+    """
+    with open(output_csv_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(checkpoint_path(output_csv_path), 'w') as f:
+        for row in rows:
+            f.write(json.dumps({"Filename": row['Filename'], "signature": checkpoint[row['Filename']]}) + "\n")
+
+def main(roi_root_dir, temp_root_dir, percentiles=(), output_csv_path=None, workers=1, ring_ratios=(), control_offset=None, roi_table=None):
     """
     Main function to process all images and corresponding temperature CSVs.
 
+    With output_csv_path, every result row is appended to the CSV as soon as it is done, together
+    with a line in a checkpoint file next to it, so a crash only loses the rows still being worked
+    on. A rerun keeps the rows whose mask and temperature file have not changed since they were
+    written and only processes the rest. Once all masks are done the CSV is rewritten in folder order.
+
+    With workers > 1 the masks are processed on a process pool and written in the order they finish.
+
     Args:
         roi_root_dir (str): Root directory containing the ROI (Region of Interest) images.
-        temp_root_dir (str): Root directory containing the temperature CSV files.
+        temp_root_dir (str): Root directory containing the temperature files (.npy or .csv).
+        percentiles (list): Extra percentiles to report, see PERCENTILES.
+        output_csv_path (str): Path of the results CSV to stream into, or None to only return the results.
+        workers (int): Number of worker processes. 1 processes the masks in this process.
+        ring_ratios (list): Size ratios of the concentric rings, see RING_RATIOS.
+        control_offset (float): Offset of the control region, see CONTROL_OFFSET.
+        roi_table (str): Path of the ROI table to take ROIs from (see roi_store.py), or None to only use mask images.
 
     Returns:
-        tuple: A list of results and a list of files that were not processed.
+        tuple: A list of results and a list of files that were not processed. Rows kept from a
+               previous run are returned as read from the CSV.
     """
-    results = []
+    header = ['Filename'] + statistics_columns(percentiles)
+    if len(ring_ratios) > 0 or control_offset is not None:
+        header += region_columns(region_names(ring_ratios, control_offset), percentiles)
     unprocessed_files = []
 
-    # Iterate over each subdirectory in the ROI root directory
-    for subdir in os.listdir(roi_root_dir):
-        # Define paths to the binary mask images and corresponding temperature CSVs
-        roi_subdir = os.path.join(roi_root_dir, subdir, 'binary_masks')
-        temp_subdir = os.path.join(temp_root_dir, subdir)
-
-        if not (os.path.isdir(roi_subdir) and os.path.isdir(temp_subdir)):
-            continue
-
-        # Process each image file in the binary mask directory
-        for image_file in os.listdir(roi_subdir):
-            if image_file.endswith('_optical_mask.png'):
-                image_path = os.path.join(roi_subdir, image_file)
-
-                # Generate the base name to find the corresponding CSV file
-                base_name = image_file.replace('_cropped_optical_mask.png', '')
-
-                csv_file = f"{base_name}.csv"
-                csv_path = os.path.join(temp_subdir, csv_file)
-
-                # Check if the corresponding CSV file exists
-                if os.path.exists(csv_path):
-                    try:
-                        # Process the image and its CSV file
-                        result = process_image_and_csv(image_path, csv_path)
-                        if result is not None:
-                            results.append(result)
-                        else:
-                            unprocessed_files.append(image_file)
-                    except Exception as e:
-                        # Handle any errors that occur during processing
-                        print(f"Error processing {image_file}: {str(e)}")
-                        unprocessed_files.append(image_file)
-                else:
-                    print(f"Warning: No matching CSV found for {image_file}")
-                    unprocessed_files.append(image_file)
+    pairs = find_mask_pairs(roi_root_dir, temp_root_dir, load_roi_table(roi_table) if roi_table else None)
+    signatures = {}
+    for image_file, image_path, csv_path, roi_record in pairs:
+        if csv_path is None:
+            print(f"Warning: No matching temperature file found for {image_file}")
+            unprocessed_files.append(image_file)
+        else:
+            signatures[image_file] = pair_signature(image_path, csv_path, roi_record)
+
+    def row_name(image_file):
+        return image_file.replace("_cropped_optical_mask.png", "")
+
+    # Keep the rows of the previous run whose inputs have not changed
+    results_by_name, checkpoint = {}, {}
+    if output_csv_path is not None:
+        previous_header, previous_rows = read_csv_rows(output_csv_path)
+        previous_checkpoint = load_checkpoint(checkpoint_path(output_csv_path))
+        if previous_header == header:
+            for image_file, signature in signatures.items():
+                name = row_name(image_file)
+                if name in previous_rows and previous_checkpoint.get(name) == signature:
+                    results_by_name[name] = dict(zip(header, previous_rows[name]))
+                    checkpoint[name] = signature
+        if previous_rows:
+            print(f"Skipped (unchanged since last run): {len(results_by_name)} of {len(signatures)} masks")
+
+        # Start the CSV over with only the rows that are still valid, then stream new rows into it
+        os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
+        write_results(output_csv_path, header, list(results_by_name.values()), checkpoint)
+
+    tasks = [(image_file, image_path, csv_path, percentiles, ring_ratios, control_offset, roi_record)
+             for image_file, image_path, csv_path, roi_record in pairs
+             if csv_path is not None and row_name(image_file) not in results_by_name]
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        finished = as_completed([executor.submit(process_pair_task, task) for task in tasks])
+        results_iter = (future.result() for future in finished)
+    else:
+        executor = None
+        results_iter = map(process_pair_task, tasks)
+
+    csvfile, checkpoint_file, writer = None, None, None
+    try:
+        if output_csv_path is not None:
+            csvfile = open(output_csv_path, 'a', newline='')
+            checkpoint_file = open(checkpoint_path(output_csv_path), 'a')
+            writer = csv.DictWriter(csvfile, fieldnames=header)
+
+        for image_file, result, error in results_iter:
+            if error is not None:
+                # Handle any errors that occur during processing
+                print(f"Error processing {image_file}: {error}")
+                unprocessed_files.append(image_file)
+                continue
+            if result is None:
+                unprocessed_files.append(image_file)
+                continue
+
+            results_by_name[result['Filename']] = result
+            checkpoint[result['Filename']] = signatures[image_file]
+            if writer is not None:
+                # Write the row first and then its checkpoint line, so a checkpointed row is always in the CSV
+                writer.writerow(result)
+                csvfile.flush()
+                checkpoint_file.write(json.dumps({"Filename": result['Filename'], "signature": signatures[image_file]}) + "\n")
+                checkpoint_file.flush()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if csvfile is not None:
+            csvfile.close()
+            checkpoint_file.close()
+
+    # Put the results back in folder order
+    results = [results_by_name[row_name(image_file)] for image_file, _, _, _ in pairs if row_name(image_file) in results_by_name]
+    if output_csv_path is not None:
+        write_results(output_csv_path, header, results, checkpoint)
 
     return results, unprocessed_files
 
-# Set your root directories here
-roi_root_dir = REGIONOFINTEREST_ROOT_DIR
-temp_root_dir = TEMPERATURE_ROOT_DIR
-
-# Call the main function and retrieve the results
-results, unprocessed_files = main(roi_root_dir, temp_root_dir)
-
-# Optionally print the results (commented out for now)
-
-# for result in results:
-#     print(f"Image: {result['image']}")
-#     print(f"Number of white pixels: {result['white_pixels']}")
-#     print(f"Minimum temperature in white pixel areas: {result['min_temp']}")
-#     print(f"Maximum temperature in white pixel areas: {result['max_temp']}")
-#     print(f"Standard deviation of temperatures: {result['std_dev']}")
-#     print(f"Median temperature: {result['median_temp']}")
-#     print("---")
-# If you want to save results to a CSV file:
-
-if results:
-    df = pd.DataFrame(results)
-    # Create the directory if it doesn't exist
-    os.makedirs(os.path.dirname(OUTPUT_CSV_PATH), exist_ok=True)
-    df.to_csv(OUTPUT_CSV_PATH, index=False)
-    print(f"Results saved to {OUTPUT_CSV_PATH}")
-else:
-    print("No results to save to CSV.")
-
-# Print the list of files that were not processed
-print("\nFiles that were not processed:")
-for file in unprocessed_files:
-    print(file)
-
-print(f"\nTotal number of unprocessed files: {len(unprocessed_files)}")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Get the temperature statistics inside every ROI mask.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to work on masks with (default: 1, no pool)")
+    args = parser.parse_args()
+
+    # Call the main function and retrieve the results, streaming them into OUTPUT_CSV_PATH
+    results, unprocessed_files = main(REGIONOFINTEREST_ROOT_DIR, TEMPERATURE_ROOT_DIR, PERCENTILES,
+                                      output_csv_path=OUTPUT_CSV_PATH, workers=args.workers,
+                                      ring_ratios=RING_RATIOS, control_offset=CONTROL_OFFSET,
+                                      roi_table=roi_table_path(REGIONOFINTEREST_ROOT_DIR))
+
+    if results:
+        print(f"Results saved to {OUTPUT_CSV_PATH}")
+    else:
+        print("No results to save to CSV.")
+
+    # Print the list of files that were not processed
+    print("\nFiles that were not processed:")
+    for file in unprocessed_files:
+        print(file)
+
+    print(f"\nTotal number of unprocessed files: {len(unprocessed_files)}")
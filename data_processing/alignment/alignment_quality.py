@@ -0,0 +1,79 @@
+import cv2  # For the grayscale conversion and the overlap mask
+import numpy as np  # For the joint histogram
+
+# Number of gray level bins of the joint histogram
+SCORE_BINS = 32
+
+# Images are downscaled so their longer side is at most this many pixels before scoring
+SCORE_MAX_SIZE = 640
+
+def _gray(image):
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def overlap_mask(optical_shape, transform_matrix, thermal_shape):
+    """
+    Get the part of the thermal image the warped optical image covers.
+
+    Args:
+        optical_shape (tuple): Shape of the optical image before warping.
+        transform_matrix (np.ndarray): 2x3 affine matrix from optical to thermal coordinates.
+        thermal_shape (tuple): Shape of the thermal image.
+
+    Returns:
+        np.ndarray: Boolean mask with the shape of the thermal image.
+    """
+    ones = np.ones(optical_shape[:2], dtype=np.uint8)
+    return cv2.warpAffine(ones, np.asarray(transform_matrix, dtype=np.float64), (thermal_shape[1], thermal_shape[0]),
+                          flags=cv2.INTER_NEAREST) > 0
+
+def alignment_score(thermal_img, aligned_optical, mask=None, bins=SCORE_BINS):
+    """
+    Score how well an aligned optical image matches its thermal image.
+
+    The score is the normalized mutual information MI / H(thermal, optical) of the gray levels,
+    from 0 (the images tell nothing about each other) to 1 (one fully predicts the other). It
+    does not need the two images to look alike, only for the same structures (the arm edge,
+    the cup, the background) to line up, so it works across the two modalities. Scores are
+    only comparable between images of similar content, e.g. the same camera and combo.
+
+    Args:
+        thermal_img (np.ndarray): Thermal image (BGR or grayscale).
+        aligned_optical (np.ndarray): Optical image warped onto the thermal image, same size.
+        mask (np.ndarray): Boolean mask of the pixels to score (see overlap_mask), or None for all.
+        bins (int): Number of gray level bins.
+
+    Returns:
+        float: The score, or 0.0 if there are no pixels to score.
+    """
+    thermal = _gray(thermal_img)
+    optical = _gray(aligned_optical)
+
+    scale = min(1.0, SCORE_MAX_SIZE / max(thermal.shape))
+    if scale < 1.0:
+        size = (max(int(thermal.shape[1] * scale), 1), max(int(thermal.shape[0] * scale), 1))
+        thermal = cv2.resize(thermal, size, interpolation=cv2.INTER_AREA)
+        optical = cv2.resize(optical, size, interpolation=cv2.INTER_AREA)
+        if mask is not None:
+            mask = cv2.resize(mask.astype(np.uint8), size, interpolation=cv2.INTER_NEAREST) > 0
+
+    if mask is not None:
+        thermal = thermal[mask]
+        optical = optical[mask]
+    if thermal.size == 0:
+        return 0.0
+
+    # Joint histogram of the binned gray levels in one pass
+    thermal_bins = (thermal.ravel().astype(np.intp) * bins) >> 8
+    optical_bins = (optical.ravel().astype(np.intp) * bins) >> 8
+    joint = np.bincount(thermal_bins * bins + optical_bins, minlength=bins * bins).reshape(bins, bins)
+    joint = joint / joint.sum()
+
+    def entropy(p):
+        p = p[p > 0]
+        return -np.sum(p * np.log(p))
+
+    joint_entropy = entropy(joint)
+    if joint_entropy == 0:
+        return 0.0
+    mutual_information = entropy(joint.sum(axis=1)) + entropy(joint.sum(axis=0)) - joint_entropy
+    return float(mutual_information / joint_entropy)
@@ -0,0 +1,364 @@
+import os  # For interacting with the file system
+import argparse  # For the command line options
+from functools import lru_cache  # For reusing the windows and filters of each image size
+from concurrent.futures import ProcessPoolExecutor  # For registering pairs on several cores
+import cv2  # For reading, resizing and the ECC refinement
+import numpy as np  # For the FFTs
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.alignment.transform_store import make_transform_record, append_transform, load_transform_table
+
+#Change as you need to
+THERMAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "thermal_images")
+VISIBLE_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "optical_images")
+TRANSFORM_INFO_ROOT_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "transform_info")
+
+# The automatic guesses are kept apart from the checked transforms in transform_table.jsonl
+AUTO_TRANSFORM_FILENAME = "auto_transforms.jsonl"
+
+# Both images are shrunk so their longer side is this many pixels before registering
+REGISTRATION_SIZE = 256
+
+# Range of scale_x/scale_y (thermal pixels per optical pixel) searched, and how many scales of that range are always tried
+# next to the ones the log-polar correlation finds
+SCALE_RANGE = (0.2, 1.2)
+SCALE_STEPS = 12
+
+# Number of scales the log-polar correlation proposes
+LOG_POLAR_CANDIDATES = 3
+
+# Guesses whose ECC correlation (-1 to 1) is below this are not saved
+MIN_CORRELATION = 0.3
+
+# Number of processes registering pairs
+REGISTRATION_WORKERS = 4
+
+def auto_transform_path(transform_root_dir):
+    """Get the path of the table of automatic guesses in a transform_info folder."""
+    return os.path.join(transform_root_dir, AUTO_TRANSFORM_FILENAME)
+
+def gradient_magnitude(image, size):
+    """
+    Get the normalized gradient magnitude of an image, shrunk so its longer side is size pixels.
+
+    The two cameras see different things (heat against light), but edges like the arm outline
+    show up in both, so the registration works on gradients rather than gray levels.
+
+    Args:
+        image (np.ndarray): Image (BGR or grayscale).
+        size (int): Longer side of the result.
+
+    Returns:
+        tuple: (gradient, (factor_x, factor_y)) with the float32 gradient image (zero mean, unit variance) and how
+               much it was shrunk along x and y (the rounding of the size makes them differ slightly).
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    factor = size / max(gray.shape)
+    width, height = max(int(round(gray.shape[1] * factor)), 1), max(int(round(gray.shape[0] * factor)), 1)
+    gray = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR)
+    gray = cv2.GaussianBlur(gray.astype(np.float32), (5, 5), 0)
+    gradient = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+    gradient -= gradient.mean()
+    gradient /= gradient.std() + 1e-6
+    return gradient, (width / image.shape[1], height / image.shape[0])
+
+@lru_cache(maxsize=None)
+def hann_window(shape):
+    """Hanning window of an image size, made once per size."""
+    return cv2.createHanningWindow((shape[1], shape[0]), cv2.CV_32F)
+
+@lru_cache(maxsize=None)
+def highpass_filter(size):
+    """Filter that weakens the lowest frequencies of a centered size x size spectrum, made once per size."""
+    frequencies = np.fft.fftshift(np.fft.fftfreq(size))
+    cos = np.cos(np.pi * frequencies[:, None]) * np.cos(np.pi * frequencies[None, :])
+    return ((1 - cos) * (2 - cos)).astype(np.float32)
+
+@lru_cache(maxsize=None)
+def fft_size(length):
+    """Fast FFT size of at least length."""
+    return cv2.getOptimalDFTSize(length)
+
+def pad_to(image, shape):
+    """Put an image in the top left corner of a zero image of the given shape."""
+    padded = np.zeros(shape, dtype=np.float32)
+    padded[:image.shape[0], :image.shape[1]] = image
+    return padded
+
+def correlation_peaks(first, second, count=1):
+    """
+    Phase correlation of two images of the same shape.
+
+    Args:
+        first (np.ndarray): float32 image.
+        second (np.ndarray): float32 image of the same shape.
+        count (int): Number of peaks to return.
+
+    Returns:
+        list: (height, shift_y, shift_x) of the highest peaks, highest first. The shift moves second onto first
+              (first(y, x) ~ second(y - shift_y, x - shift_x)), wrapped to -size/2 .. size/2.
+    """
+    cross_power = np.fft.rfft2(first) * np.conj(np.fft.rfft2(second))
+    cross_power /= np.abs(cross_power) + 1e-9
+    surface = np.fft.irfft2(cross_power, s=first.shape)
+
+    peaks = []
+    for _ in range(count):
+        y, x = np.unravel_index(np.argmax(surface), surface.shape)
+        peaks.append((float(surface[y, x]),
+                      y - surface.shape[0] if y > surface.shape[0] // 2 else y,
+                      x - surface.shape[1] if x > surface.shape[1] // 2 else x))
+        # Clear around the peak before looking for the next one
+        rows = np.arange(y - 2, y + 3) % surface.shape[0]
+        columns = np.arange(x - 2, x + 3) % surface.shape[1]
+        surface[np.ix_(rows, columns)] = -np.inf
+    return peaks
+
+def log_polar_spectrum(image, size):
+    """
+    Get the log-polar image of the magnitude spectrum of an image.
+
+    Scaling an image shifts this along its x axis (and rotating it shifts it along its y axis),
+    whatever the translation, so scale can be found with a phase correlation.
+
+    Args:
+        image (np.ndarray): float32 image, at most size x size.
+        size (int): FFT size.
+
+    Returns:
+        np.ndarray: size x size float32 log-polar spectrum.
+    """
+    windowed = pad_to(image * hann_window(image.shape), (size, size))
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft2(windowed))).astype(np.float32) * highpass_filter(size)
+    return cv2.warpPolar(spectrum, (size, size), (size / 2, size / 2), size / 2, cv2.WARP_POLAR_LOG | cv2.INTER_LINEAR)
+
+def log_polar_scales(thermal_gradient, optical_gradient, size):
+    """
+    Find the likely scales from optical to thermal pixels (of the shrunk images) with log-polar phase correlation.
+
+    Args:
+        thermal_gradient (np.ndarray): Shrunk thermal gradient image.
+        optical_gradient (np.ndarray): Shrunk optical gradient image.
+        size (int): FFT size, at least the size of both images.
+
+    Returns:
+        list: Candidate scales, the most likely first.
+    """
+    thermal_polar = log_polar_spectrum(thermal_gradient, size)
+    optical_polar = log_polar_spectrum(optical_gradient, size)
+    # warpPolar puts log(radius) on x: x = size * log(radius) / log(size / 2)
+    log_base = np.log(size / 2) / size
+    scales = []
+    for _, _, shift_x in correlation_peaks(optical_polar, thermal_polar, LOG_POLAR_CANDIDATES):
+        # A spectrum shrinks when its image grows, so a shift of the optical spectrum to larger radii means a larger thermal scale
+        scales.append(float(np.exp(shift_x * log_base)))
+    return scales
+
+def match_translation(thermal_gradient, optical_gradient, scale):
+    """
+    Find where the thermal image is in the optical image at a given scale.
+
+    Uses normalized cross-correlation, which OpenCV computes with FFTs for images this size. Unlike
+    the height of a phase correlation peak, its value can be compared between scales. The optical
+    image is given a border of zeros so the thermal image may stick out of it a little.
+
+    Args:
+        thermal_gradient (np.ndarray): Shrunk thermal gradient image.
+        optical_gradient (np.ndarray): Shrunk optical gradient image.
+        scale (float): Thermal pixels per optical pixel (of the shrunk images).
+
+    Returns:
+        tuple: (correlation, translation_x, translation_y), with thermal = scale * optical + translation, or None if
+               the scale makes the optical image too small to match.
+    """
+    width = int(round(optical_gradient.shape[1] * scale))
+    height = int(round(optical_gradient.shape[0] * scale))
+    border_y, border_x = thermal_gradient.shape[0] // 4, thermal_gradient.shape[1] // 4
+    if width + 2 * border_x < thermal_gradient.shape[1] or height + 2 * border_y < thermal_gradient.shape[0]:
+        return None
+    scaled = cv2.resize(optical_gradient, (width, height), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    scaled = cv2.copyMakeBorder(scaled, border_y, border_y, border_x, border_x, cv2.BORDER_CONSTANT, value=0)
+
+    result = cv2.matchTemplate(scaled, thermal_gradient, cv2.TM_CCOEFF_NORMED)
+    _, correlation, _, (x, y) = cv2.minMaxLoc(result)
+    # The thermal image starts at (x, y) of the bordered optical image
+    return float(correlation), float(border_x - x), float(border_y - y)
+
+def refine_ecc(thermal_gradient, optical_gradient, scale_x, scale_y, translation_x, translation_y):
+    """
+    Refine a transform of the shrunk images with ECC on the gradient images.
+
+    Args:
+        thermal_gradient (np.ndarray): Shrunk thermal gradient image.
+        optical_gradient (np.ndarray): Shrunk optical gradient image.
+        scale_x, scale_y, translation_x, translation_y (float): Starting transform (thermal = scale * optical + translation).
+
+    Returns:
+        tuple: (correlation, scale_x, scale_y, translation_x, translation_y), or None if ECC did not converge.
+    """
+    # ECC looks for the warp from thermal to optical pixels, the inverse of the transform
+    warp = np.array([[1 / scale_x, 0, -translation_x / scale_x],
+                     [0, 1 / scale_y, -translation_y / scale_y]], dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 100, 1e-5)
+    try:
+        correlation, warp = cv2.findTransformECC(thermal_gradient, optical_gradient, warp, cv2.MOTION_AFFINE, criteria, None, 5)
+    except cv2.error:
+        return None
+    # Keep only scale and translation, like the clicked alignments
+    scale_x, scale_y = 1 / warp[0, 0], 1 / warp[1, 1]
+    return float(correlation), float(scale_x), float(scale_y), float(-warp[0, 2] * scale_x), float(-warp[1, 2] * scale_y)
+
+def register_pair(thermal_img, optical_img):
+    """
+    Estimate the scale and translation from an optical image to its thermal image.
+
+    Both images are shrunk to REGISTRATION_SIZE and turned into gradient images. Candidate scales
+    come from log-polar phase correlation of their spectra, plus an even grid over SCALE_RANGE in case
+    the spectra do not agree. For each scale the translation is found with normalized cross-correlation,
+    the best one is refined with ECC and scaled back to full size pixels.
+
+    Args:
+        thermal_img (np.ndarray): Thermal image.
+        optical_img (np.ndarray): Optical image.
+
+    Returns:
+        dict: scale_x, scale_y, translation_x, translation_y (like semi_automatic_alignment saves) and the ECC
+              correlation, or None if no scale matched or ECC moved the scales out of SCALE_RANGE.
+    """
+    thermal_gradient, (thermal_factor_x, thermal_factor_y) = gradient_magnitude(thermal_img, REGISTRATION_SIZE)
+    optical_gradient, (optical_factor_x, optical_factor_y) = gradient_magnitude(optical_img, REGISTRATION_SIZE)
+
+    # Scales of the full size images -> scales of the shrunk images
+    to_small = thermal_factor_x / optical_factor_x
+    low, high = SCALE_RANGE[0] * to_small, SCALE_RANGE[1] * to_small
+    size = fft_size(REGISTRATION_SIZE)
+    candidates = [scale for scale in log_polar_scales(thermal_gradient, optical_gradient, size) if low <= scale <= high]
+    candidates += list(np.geomspace(low, high, SCALE_STEPS))
+
+    best = None
+    for scale in candidates:
+        match = match_translation(thermal_gradient, optical_gradient, scale)
+        if match is not None and (best is None or match[0] > best[0]):
+            best = (match[0], scale, match[1], match[2])
+    if best is None:
+        return None
+
+    _, scale, translation_x, translation_y = best
+    refined = refine_ecc(thermal_gradient, optical_gradient, scale, scale, translation_x, translation_y)
+    if refined is None:
+        return None
+    correlation, scale_x, scale_y, translation_x, translation_y = refined
+
+    # Shrunk pixels -> full size pixels. Pixel centers move as small = factor * (full + 0.5) - 0.5, so
+    # thermal = scale * optical + translation on the shrunk images becomes, on the full size images:
+    def to_full(scale, translation, thermal_factor, optical_factor):
+        return (scale * optical_factor / thermal_factor,
+                (translation + 0.5 - 0.5 * scale + 0.5 * scale * optical_factor) / thermal_factor - 0.5)
+
+    scale_x, translation_x = to_full(scale_x, translation_x, thermal_factor_x, optical_factor_x)
+    scale_y, translation_y = to_full(scale_y, translation_y, thermal_factor_y, optical_factor_y)
+
+    # ECC can drift away from the scales that were searched, which is never a real match
+    if not (SCALE_RANGE[0] <= scale_x <= SCALE_RANGE[1] and SCALE_RANGE[0] <= scale_y <= SCALE_RANGE[1]):
+        return None
+    return {
+        "scale_x": scale_x,
+        "scale_y": scale_y,
+        "translation_x": translation_x,
+        "translation_y": translation_y,
+        "correlation": correlation,
+    }
+
+def register_files(task):
+    """
+    Register one pair in a worker process.
+
+    Args:
+        task (tuple): (subject, image, thermal_path, optical_path).
+
+    Returns:
+        dict: See register_pair, or None.
+    """
+    _, _, thermal_path, optical_path = task
+    thermal_img = cv2.imread(thermal_path)
+    if thermal_img is None:
+        raise ValueError(f"Could not read {thermal_path}")
+    optical_img = cv2.imread(optical_path)
+    if optical_img is None:
+        raise ValueError(f"Could not read {optical_path}")
+    return register_pair(thermal_img, optical_img)
+
+def register_batch(tasks, workers=REGISTRATION_WORKERS):
+    """
+    Register many pairs on a pool of worker processes.
+
+    Each worker keeps the windows and filters of the image sizes it has seen, so a cohort of
+    images from the same cameras only makes them once per worker.
+
+    Args:
+        tasks (list): (subject, image, thermal_path, optical_path) of each pair.
+        workers (int): Number of processes.
+
+    Yields:
+        tuple: (task, result, error) in the order of tasks, see register_pair for result.
+    """
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(register_files, task) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                yield task, future.result(), None
+            except Exception as e:
+                yield task, None, e
+
+def main(subjects=None, workers=REGISTRATION_WORKERS, overwrite=False):
+    """
+    Make an automatic transform guess for every image pair and add them to the table of automatic guesses.
+
+    semi_automatic_alignment offers these as proposals for images that have no transform of their own group yet.
+
+    Args:
+        subjects (list): Subjects to register (e.g. ["HIP_01"]), or None for all.
+        workers (int): Number of processes.
+        overwrite (bool): True registers pairs that already have a guess again.
+    """
+    table_path = auto_transform_path(TRANSFORM_INFO_ROOT_DIR)
+    existing = {} if overwrite else load_transform_table(table_path)
+
+    tasks = []
+    for subject in sorted(os.listdir(THERMAL_BASE_DIR)):
+        thermal_dir = os.path.join(THERMAL_BASE_DIR, subject)
+        visible_dir = os.path.join(VISIBLE_BASE_DIR, subject)
+        if (subjects and subject not in subjects) or not os.path.isdir(thermal_dir) or not os.path.isdir(visible_dir):
+            continue
+        for filename in sorted(os.listdir(thermal_dir)):
+            if not filename.endswith("_thermal.jpg"):
+                continue
+            image = filename.replace("_thermal.jpg", "")
+            optical_path = os.path.join(visible_dir, f"{image}_optical.jpg")
+            if (subject, image) in existing or not os.path.exists(optical_path):
+                continue
+            tasks.append((subject, image, os.path.join(thermal_dir, filename), optical_path))
+
+    print(f"{len(tasks)} image pairs to register")
+    saved = 0
+    for (subject, image, thermal_path, _), result, error in register_batch(tasks, workers):
+        if error is not None:
+            print(f"Error processing {thermal_path}: {error}")
+        elif result is None or result["correlation"] < MIN_CORRELATION:
+            print(f"No good match found for {image}")
+        else:
+            append_transform(table_path, make_transform_record(subject, image, result))
+            saved += 1
+    print(f"Saved {saved} guesses in {table_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make automatic thermal/optical transform guesses for semi_automatic_alignment.")
+    parser.add_argument("--subjects", nargs="+", default=None, help="subjects to register, e.g. HIP_01 HIP_02 (default: all)")
+    parser.add_argument("--workers", type=int, default=REGISTRATION_WORKERS, help="number of processes registering")
+    parser.add_argument("--overwrite", action="store_true", help="register pairs that already have a guess again")
+    args = parser.parse_args()
+
+    main(args.subjects, args.workers, args.overwrite)
@@ -1,12 +1,18 @@
 import numpy as np
 import cv2
 import os
-import json
 import sys
 
 # Add the parent directory to the system path to import custom modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.misc_folder_functions.prefetch import prefetch
+from data_processing.misc_folder_functions.work_queue import default_owner, acquire_lease, release_lease, active_leases, format_progress
+from data_processing.misc_folder_functions.file_names import parse_filename
+from data_processing.alignment.alignment_quality import alignment_score, overlap_mask
+from data_processing.alignment.transform_store import (transform_table_path, make_transform_record, append_transform, load_transform_table,
+                                                     transform_matrix, blend_images, write_outputs, BLEND_ALPHA, OPTICAL_GAIN)
+from data_processing.alignment.auto_registration import auto_transform_path
 
 # Define base directories for thermal and visible images
 THERMAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "thermal_images")
@@ -17,56 +23,235 @@ BLENDED_OUTPUT_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RE
 CROPPED_OPTICAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "cropped_optical_images")
 TRANSOFRM_INFO_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "transform_info")
 
+# Several people can align the same folder at once: each image is leased to one person while they align it.
+# ANNOTATOR is the name the leases are under (None uses user@computer)
+LEASE_DIR = os.path.join(TRANSOFRM_INFO_BASE_DIR, "leases")
+ANNOTATOR = None
+
+# Every accepted transform (and the points clicked for it) is saved in TRANSOFRM_INFO_BASE_DIR/transform_table.jsonl
+# (see transform_store.py, which can make the aligned, blended and cropped optical images from it at any time).
+# True also saves those images right away like before
+SAVE_DERIVED_IMAGES = False
+
+# True offers the accepted transform of an image for every other image of the same subject, camera and combo parity
+# (even/odd combos, see data_processing_failed_automation/averaging.py). Press y to accept it, any other key to click points
+REUSE_TRANSFORMS = True
+
+# Every alignment gets a quality score (0 to 1, see alignment_quality.py), saved in its transform info. A proposed transform
+# whose score is at least AUTO_ACCEPT_RATIO times the score of the alignment it came from is saved without showing it.
+# None always shows the proposal
+AUTO_ACCEPT_RATIO = 0.97
+
+# True offers the automatic guess of auto_registration.py (TRANSOFRM_INFO_BASE_DIR/auto_transforms.jsonl) for images
+# with no transform of their group to offer. Guesses have no score to compare with, so they are always shown
+USE_AUTO_TRANSFORMS = True
+
+# Images are shown for clicking downscaled so their longer side is at most this many pixels. Clicks are mapped back to
+# the full size image, so the alignment is as precise as before
+DISPLAY_MAX_SIZE = 1200
+
+# Number of upcoming image pairs read and decoded in the background while you click points
+PREFETCH_DEPTH = 2
+
+# How often the point windows check whether both points are clicked, in milliseconds. This is polling, at 20 checks a
+# second instead of the old 1000: waitKey(0) cannot be ended by a mouse click, only by a key, so it cannot be used here
+POINT_WAIT_MS = 50
+
+# The result windows have sliders for the weight of the optical image (alpha), how much it is brightened (gain) and
+# for drawing its edges over the blend. They only change what you see, not the saved images. Largest gain on the slider
+MAX_GAIN = 3.0
+EDGE_COLOR = (0, 255, 0)
+EDGE_THRESHOLDS = (50, 150)
+
 # Global variables to store points, current image, window name, and filename
 thermal_points = []
 optical_points = []
 current_image = None
+current_scale = 1.0
 window_name = ""
 current_filename = ""
 
+# Slider positions of the result windows, kept from one image to the next
+view_settings = {"alpha": BLEND_ALPHA, "gain": OPTICAL_GAIN, "edges": False}
+
+def make_proxy(image, max_size=DISPLAY_MAX_SIZE):
+    """Downscale an image for display so its longer side is at most max_size. Returns (proxy, scale)."""
+    scale = min(1.0, max_size / max(image.shape[:2]))
+    if scale == 1.0:
+        return image, 1.0
+    size = (max(int(round(image.shape[1] * scale)), 1), max(int(round(image.shape[0] * scale)), 1))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+def load_image_pair(thermal_path, optical_path):
+    """Read a thermal/optical pair and make their display proxies: ((thermal, optical), (thermal_proxy, optical_proxy))."""
+    thermal_img = cv2.imread(thermal_path)
+    if thermal_img is None:
+        raise ValueError(f"Could not read {thermal_path}")
+    optical_img = cv2.imread(optical_path)
+    if optical_img is None:
+        raise ValueError(f"Could not read {optical_path}")
+    return (thermal_img, optical_img), (make_proxy(thermal_img), make_proxy(optical_img))
+
 def click_event(event, x, y, flags, param):
     """Handle mouse click events to mark points on images."""
     global thermal_points, optical_points, current_image, window_name
     if event == cv2.EVENT_LBUTTONDOWN:
+        # Only the small display image is drawn on; the point is kept in full size pixel coordinates
+        # (the center of the clicked display pixel, to a fraction of a full size pixel)
+        point = ((x + 0.5) / current_scale - 0.5, (y + 0.5) / current_scale - 0.5)
         cv2.circle(current_image, (x, y), 3, (0, 255, 0), -1)
         cv2.imshow(window_name, current_image)
         if window_name.startswith("Thermal Image"):
-            thermal_points.append((x, y))
+            thermal_points.append(point)
         elif window_name.startswith("Optical Image"):
-            optical_points.append((x, y))
+            optical_points.append(point)
+
+def get_points(image, name, scale=1.0):
+    """Display image (a display proxy scaled by scale from the full size image) and collect user-clicked points.
 
-def get_points(image, name):
-    """Display image and collect user-clicked points."""
-    global current_image, window_name
+    The clicks are collected by click_event. This polls for them with waitKey(POINT_WAIT_MS) rather than blocking,
+    because HighGUI only runs the mouse callback inside waitKey and a click cannot end a waitKey(0).
+    """
+    global current_image, current_scale, window_name
     current_image = image.copy()
+    current_scale = scale
     window_name = f"{name}: {current_filename}"
     cv2.imshow(window_name, current_image)
     cv2.setMouseCallback(window_name, click_event)
+    # Polls, but sleeps in waitKey between checks, so waiting for clicks does not keep the CPU busy
     while len(thermal_points) < 2 if name.startswith("Thermal Image") else len(optical_points) < 2:
-        cv2.waitKey(1)
+        cv2.waitKey(POINT_WAIT_MS)
     cv2.destroyAllWindows()
 
-def align_images(thermal_path, optical_path, output_path, blended_output_path, cropped_optical_path, transform_info_path, alpha=0.3):
-    """Align thermal and optical images based on user-selected points."""
+def transform_group(base_name):
+    """Get the group whose images can share a transform: (subject, camera, 'even' or 'odd' combo), or None."""
+    try:
+        subject_id, camera, combo_number, _, _ = parse_filename(base_name)
+    except IndexError:
+        return None
+    if not combo_number.isdigit():
+        return None
+    return subject_id, camera, 'even' if int(combo_number) % 2 == 0 else 'odd'
+
+def score_transform(thermal_img, optical_img, aligned_optical, transform_info):
+    """Score an alignment on the part of the thermal image the optical image covers (see alignment_quality.py)."""
+    mask = overlap_mask(optical_img.shape, transform_matrix(transform_info), thermal_img.shape)
+    return alignment_score(thermal_img, aligned_optical, mask)
+
+def show_blend(window_name, thermal_img, aligned_optical):
+    """
+    Show the blend of an alignment with sliders for alpha, gain and an edge overlay, and wait for a key.
+
+    Every buffer (brightened optical image, edge overlay, shown image) is allocated at most once per window,
+    so moving a slider only redoes the blend into the same buffer, which keeps it smooth on large images.
+    The sliders start where they were left on the previous image (see view_settings). Only at the default
+    positions (BLEND_ALPHA, OPTICAL_GAIN, no edges) does the window show exactly what blend_images saves.
+
+    Args:
+        window_name (str): Name of the window.
+        thermal_img (np.ndarray): Thermal image.
+        aligned_optical (np.ndarray): Optical image warped onto the thermal image.
+
+    Returns:
+        int: The key pressed.
+    """
+    gained = np.empty_like(aligned_optical)
+    display = np.empty_like(thermal_img)
+    state = {"gain": None, "edges": None, "edge_color": None}
+
+    def redraw():
+        alpha, gain = view_settings["alpha"], view_settings["gain"]
+        if state["gain"] != gain:
+            # Brighten the optical image like blend_images does, only when the gain changes
+            cv2.convertScaleAbs(aligned_optical, dst=gained, alpha=gain)
+            state["gain"] = gain
+        cv2.addWeighted(thermal_img, 1 - alpha, gained, alpha, 0, dst=display)
+        if view_settings["edges"]:
+            if state["edges"] is None:
+                # Found the first time the overlay is turned on, then kept
+                state["edges"] = cv2.Canny(cv2.cvtColor(aligned_optical, cv2.COLOR_BGR2GRAY), *EDGE_THRESHOLDS)
+                state["edge_color"] = np.empty_like(thermal_img)
+                state["edge_color"][:] = EDGE_COLOR
+            cv2.copyTo(state["edge_color"], state["edges"], display)
+        cv2.imshow(window_name, display)
+
+    def on_alpha(position):
+        view_settings["alpha"] = position / 100
+        redraw()
+
+    def on_gain(position):
+        view_settings["gain"] = position / 10
+        redraw()
+
+    def on_edges(position):
+        view_settings["edges"] = position == 1
+        redraw()
+
+    cv2.namedWindow(window_name)
+    cv2.createTrackbar("Alpha %", window_name, int(round(view_settings["alpha"] * 100)), 100, on_alpha)
+    cv2.createTrackbar("Gain x10", window_name, int(round(view_settings["gain"] * 10)), int(MAX_GAIN * 10), on_gain)
+    cv2.createTrackbar("Edges", window_name, int(view_settings["edges"]), 1, on_edges)
+    redraw()
+    return cv2.waitKey(0)
+
+def align_images(thermal_path, optical_path, output_paths, alpha=0.3,
+                 proposal=None, proposal_from=None, auto_accept_score=None, images=None):
+    """Align thermal and optical images based on user-selected points.
+
+    images is the pair already loaded by load_image_pair (e.g. by the prefetcher), or None to read it here.
+    output_paths maps the derived images to write on acceptance to their paths (see transform_store.write_outputs);
+    empty writes none, they can be rendered from the transform table later.
+
+    alpha is the weight of the optical image in the saved blended image; the result windows have their own sliders.
+
+    If a proposal (the transform of another image of the same group) is given, it is shown first and
+    pressing y accepts it without clicking any points. If its score here is at least auto_accept_score, it is
+    saved without being shown. Returns the accepted transform_info and the clicked (thermal_points, optical_points),
+    which are (None, None) for an accepted proposal.
+    """
     global thermal_points, optical_points, current_filename
+    base_name = os.path.basename(thermal_path).replace("_thermal.jpg", "")
+
+    # Load images
+    if images is None:
+        images = load_image_pair(thermal_path, optical_path)
+    (thermal_img, optical_img), ((thermal_proxy, thermal_scale), (optical_proxy, optical_scale)) = images
+
+    if proposal is not None:
+        transform_info = {key: proposal[key] for key in ("scale_x", "scale_y", "translation_x", "translation_y")}
+        transform_info.update(reused_from=proposal_from, auto_accepted=False)
+        aligned_optical = cv2.warpAffine(optical_img, transform_matrix(transform_info), (thermal_img.shape[1], thermal_img.shape[0]))
+        transform_info["score"] = score_transform(thermal_img, optical_img, aligned_optical, transform_info)
+
+        print(f"Processing: {os.path.basename(thermal_path)}")
+        if auto_accept_score is not None and transform_info["score"] >= auto_accept_score:
+            transform_info["auto_accepted"] = True
+            write_outputs(thermal_img, aligned_optical, blend_images(thermal_img, aligned_optical, alpha), output_paths)
+            print(f"Accepted the alignment from {proposal_from} automatically (score {transform_info['score']:.3f}, needed {auto_accept_score:.3f}).")
+            return transform_info, (None, None)
+
+        print(f"Proposed alignment from {proposal_from} (score {transform_info['score']:.3f}): press 'y' to accept, any other key to click points yourself.")
+        key = show_blend(f"Proposed Result: {base_name}", thermal_img, aligned_optical) & 0xFF
+        cv2.destroyAllWindows()
+
+        if key == ord('y'):
+            write_outputs(thermal_img, aligned_optical, blend_images(thermal_img, aligned_optical, alpha), output_paths)
+            print("Results saved successfully.")
+            return transform_info, (None, None)
 
     while True:
         thermal_points.clear()
         optical_points.clear()
 
-        # Load images
-        thermal_img = cv2.imread(thermal_path)
-        optical_img = cv2.imread(optical_path)
-
         # Get user input for alignment points
         current_filename = os.path.basename(thermal_path)
         print(f"Processing: {current_filename}")
         print("Please click 2 points on the thermal image")
-        get_points(thermal_img, "Thermal Image")
+        get_points(thermal_proxy, "Thermal Image", thermal_scale)
 
         current_filename = os.path.basename(optical_path)
         print("Please click 2 corresponding points on the optical image")
-        get_points(optical_img, "Optical Image")
+        get_points(optical_proxy, "Optical Image", optical_scale)
 
         # Calculate transformation matrix
         thermal_pts = np.array(thermal_points)
@@ -78,41 +263,30 @@ def align_images(thermal_path, optical_path, output_path, blended_output_path, c
         tx = thermal_pts[0][0] - scale_x * optical_pts[0][0]
         ty = thermal_pts[0][1] - scale_y * optical_pts[0][1]
 
-        #First two columns, scalin and rotation. rotation = 0. and the last column is translation
-        M = np.array([ 
-            [scale_x, 0, tx],
-            [0, scale_y, ty]
-        ])
-
         # Store transformation info
         transform_info = {
             "scale_x": float(scale_x),
             "scale_y": float(scale_y),
             "translation_x": float(tx),
-            "translation_y": float(ty)
+            "translation_y": float(ty),
+            "reused_from": None,
+            "auto_accepted": False
         }
 
         # Apply transformation and blend images
-        aligned_optical = cv2.warpAffine(optical_img, M, (thermal_img.shape[1], thermal_img.shape[0]))
-        blended_image = blend_images(thermal_img, aligned_optical, alpha)
+        aligned_optical = cv2.warpAffine(optical_img, transform_matrix(transform_info), (thermal_img.shape[1], thermal_img.shape[0]))
+        transform_info["score"] = score_transform(thermal_img, optical_img, aligned_optical, transform_info)
+        print(f"Alignment score: {transform_info['score']:.3f}")
 
         # Display result and wait for user confirmation
-        cv2.imshow(f"Blended Result: {os.path.basename(output_path)}", blended_image)
-        key = cv2.waitKey(0) & 0xFF
+        key = show_blend(f"Blended Result: {base_name}", thermal_img, aligned_optical) & 0xFF
 
         if key == ord('y'):
             # Save results if user approves
-            result = np.hstack((aligned_optical, thermal_img))
-            cv2.imwrite(output_path, result)
-            cv2.imwrite(blended_output_path, blended_image)
-            cv2.imwrite(cropped_optical_path, aligned_optical)
-            
-            with open(transform_info_path, 'w') as f:
-                json.dump(transform_info, f, indent=4)
-            
+            write_outputs(thermal_img, aligned_optical, blend_images(thermal_img, aligned_optical, alpha), output_paths)
             cv2.destroyAllWindows()
             print("Results saved successfully.")
-            break
+            return transform_info, (list(thermal_points), list(optical_points))
         elif key == ord('n'):
             cv2.destroyAllWindows()
             print("Alignment not satisfactory. Let's try again.")
@@ -120,43 +294,131 @@ def align_images(thermal_path, optical_path, output_path, blended_output_path, c
             cv2.destroyAllWindows()
             print("Invalid input. Please try again.")
 
-def blend_images(image1, image2, alpha):
-    """Blend two images with enhanced contrast for the optical image."""
-    enhanced_optical = cv2.addWeighted(image2, 1.2, np.zeros(image2.shape, image2.dtype), 0, 0)
-    blended_image = cv2.addWeighted(image1, 1 - alpha, enhanced_optical, alpha, 0)
-    return blended_image
-
-def process_images(thermal_dir, visible_dir, output_dir, blended_output_dir, cropped_optical_dir, transform_info_dir):
-    """Process all images in the given directories."""
-    # Create output directories if they don't exist
-    os.makedirs(output_dir, exist_ok=True)
-    os.makedirs(blended_output_dir, exist_ok=True)
-    os.makedirs(cropped_optical_dir, exist_ok=True)
-    os.makedirs(transform_info_dir, exist_ok=True)
-
-    for filename in os.listdir(thermal_dir):
-        if filename.endswith("_thermal.jpg"):
-            base_name = os.path.splitext(filename)[0].replace("_thermal", "")
-            thermal_path = os.path.join(thermal_dir, filename)
-            optical_filename = base_name + '_optical.jpg'
-            optical_path = os.path.join(visible_dir, optical_filename)
-
-            if not os.path.exists(optical_path):
-                print(f"Error: Could not find matching optical image for {filename}")
-                continue
+def process_images(thermal_dir, visible_dir, output_dir, blended_output_dir, cropped_optical_dir, transform_root_dir,
+                   lease_dir=None, owner=None, reuse_transforms=False, auto_accept_ratio=None, save_derived_images=False,
+                   auto_transforms=None):
+    """Process all images in the given directories.
+
+    Accepted transforms are added to the owner's part of the transform table in transform_root_dir (see
+    transform_store.py). An image is done when it is in the table, or has a transform_info json from before the table
+    in transform_root_dir/<subject>. With save_derived_images, the aligned, blended and cropped optical images are
+    written to output_dir, blended_output_dir and cropped_optical_dir too.
+
+    With a lease_dir, each image is leased before it is aligned (see misc_folder_functions/work_queue.py),
+    so images someone else is aligning are skipped, and the progress of the subject is printed after each image.
+
+    With reuse_transforms, the transform of an aligned image (from this session, or saved earlier) is offered
+    for the other images of its group (see transform_group), so points only need clicking when it is rejected.
+    With an auto_accept_ratio, an offered transform that scores at least that share of the score it had on the image
+    it came from is accepted without being shown.
+
+    auto_transforms is the table of automatic guesses (see auto_registration.py), or None. The guess for an
+    image is offered when there is no transform of its group to offer.
+    """
+    subject = os.path.basename(os.path.normpath(thermal_dir))
+    owner = owner or default_owner()
+    transform_table = transform_table_path(transform_root_dir)
+    own_transform_table = transform_table_path(transform_root_dir, owner)
+    transforms = load_transform_table(transform_table)
+    base_names = sorted(os.path.splitext(filename)[0].replace("_thermal", "") for filename in os.listdir(thermal_dir) if filename.endswith("_thermal.jpg"))
 
-            output_path = os.path.join(output_dir, f"{base_name}_aligned.jpg")
-            blended_output_path = os.path.join(blended_output_dir, f"{base_name}_blended.jpg")
-            cropped_optical_path = os.path.join(cropped_optical_dir, f"{base_name}_cropped_optical.jpg")
-            transform_info_path = os.path.join(transform_info_dir, f"{base_name}_transform_info.json")
+    def is_done(base_name):
+        return ((subject, base_name) in transforms
+                or os.path.exists(os.path.join(transform_root_dir, subject, f"{base_name}_transform_info.json")))
 
-            # Skip if results already exist
-            if os.path.exists(blended_output_path) and os.path.exists(cropped_optical_path) and os.path.exists(transform_info_path):
+    # Last accepted transform of each group: group -> (base_name, transform)
+    group_transforms = {}
+
+    def find_proposal(base_name):
+        group = transform_group(base_name)
+        if not reuse_transforms or group is None:
+            return auto_proposal(base_name)
+        if group not in group_transforms:
+            # Nothing accepted this session yet: use a transform saved earlier for the group, if any.
+            # Only alignments someone looked at, so auto-accept scores do not drift down a chain of proposals
+            for other in base_names:
+                record = transforms.get((subject, other))
+                if other != base_name and record is not None and transform_group(other) == group and not record.get("auto_accepted"):
+                    group_transforms[group] = (other, record)
+                    break
+        if group not in group_transforms:
+            return auto_proposal(base_name)
+        proposal_from, proposal = group_transforms[group]
+        return proposal, proposal_from
+
+    def auto_proposal(base_name):
+        proposal = (auto_transforms or {}).get((subject, base_name))
+        return (proposal, "auto_registration") if proposal is not None else (None, None)
+
+    def align(base_name, thermal_path, optical_path, images):
+        proposal, proposal_from = find_proposal(base_name)
+        auto_accept_score = None
+        if proposal is not None and auto_accept_ratio is not None and proposal.get("score") is not None:
+            auto_accept_score = proposal["score"] * auto_accept_ratio
+
+        output_paths = {}
+        if save_derived_images:
+            output_paths = {
+                "aligned": os.path.join(output_dir, f"{base_name}_aligned.jpg"),
+                "blended": os.path.join(blended_output_dir, f"{base_name}_blended.jpg"),
+                "cropped_optical": os.path.join(cropped_optical_dir, f"{base_name}_cropped_optical.jpg"),
+            }
+
+        transform_info, (clicked_thermal, clicked_optical) = align_images(
+            thermal_path, optical_path, output_paths, proposal=proposal, proposal_from=proposal_from,
+            auto_accept_score=auto_accept_score, images=images)
+        record = make_transform_record(subject, base_name, transform_info, clicked_thermal, clicked_optical)
+        append_transform(own_transform_table, record)
+        transforms[(subject, base_name)] = record
+
+        if transform_group(base_name) is not None and not transform_info.get("auto_accepted"):
+            group_transforms[transform_group(base_name)] = (base_name, record)
+        print(f"Processed: {base_name}")
+
+    pending = []
+    for base_name in base_names:
+        filename = base_name + '_thermal.jpg'
+        thermal_path = os.path.join(thermal_dir, filename)
+        optical_filename = base_name + '_optical.jpg'
+        optical_path = os.path.join(visible_dir, optical_filename)
+
+        if not os.path.exists(optical_path):
+            print(f"Error: Could not find matching optical image for {filename}")
+            continue
+
+        # Skip if results already exist
+        if is_done(base_name):
+            print(f"Skipping {base_name} - results already exist")
+            continue
+        pending.append((base_name, thermal_path, optical_path))
+
+    # Read the next pairs in the background so there is no wait between images
+    for (base_name, thermal_path, optical_path), images, error in prefetch(
+            pending, lambda item: load_image_pair(item[1], item[2]), PREFETCH_DEPTH):
+        if error is not None:
+            print(f"Error processing {thermal_path}: {error}")
+            continue
+
+        if lease_dir is None:
+            align(base_name, thermal_path, optical_path, images)
+            continue
+
+        # Take the image so nobody else aligns it at the same time
+        if not acquire_lease(lease_dir, base_name, owner):
+            print(f"Skipping {base_name} - being aligned by someone else")
+            continue
+        try:
+            # Someone else may have finished it in the meantime
+            transforms.update(load_transform_table(transform_table))
+            if is_done(base_name):
                 print(f"Skipping {base_name} - results already exist")
                 continue
+            align(base_name, thermal_path, optical_path, images)
+        finally:
+            release_lease(lease_dir, base_name, owner)
 
-            align_images(thermal_path, optical_path, output_path, blended_output_path, cropped_optical_path, transform_info_path)
-            print(f"Processed: {base_name}")
+        done = {name for name in base_names if is_done(name)}
+        print(format_progress(subject, base_names, done, active_leases(lease_dir), owner))
 
 # Main execution
 thermal_base_dir = THERMAL_BASE_DIR
@@ -168,6 +430,8 @@ blended_output_base_dir = BLENDED_OUTPUT_BASE_DIR
 cropped_optical_base_dir = CROPPED_OPTICAL_BASE_DIR
 transform_info_base_dir = TRANSOFRM_INFO_BASE_DIR
 
+auto_transforms = load_transform_table(auto_transform_path(transform_info_base_dir)) if USE_AUTO_TRANSFORMS else None
+
 # Process images in subdirectories
 for subdir in os.listdir(thermal_base_dir):
     thermal_subdir = os.path.join(thermal_base_dir, subdir)
@@ -178,8 +442,8 @@ for subdir in os.listdir(thermal_base_dir):
         output_subdir = os.path.join(output_base_dir, subdir)
         blended_output_subdir = os.path.join(blended_output_base_dir, subdir)
         cropped_optical_subdir = os.path.join(cropped_optical_base_dir, subdir)
-        transform_info_subdir = os.path.join(transform_info_base_dir, subdir)
-        process_images(thermal_subdir, visible_subdir, output_subdir, blended_output_subdir, cropped_optical_subdir, transform_info_subdir)
+        process_images(thermal_subdir, visible_subdir, output_subdir, blended_output_subdir, cropped_optical_subdir, transform_info_base_dir,
+                       LEASE_DIR, ANNOTATOR, REUSE_TRANSFORMS, AUTO_ACCEPT_RATIO, SAVE_DERIVED_IMAGES, auto_transforms)
     else:
         print(f"Skipping {subdir} - directories not found")
 
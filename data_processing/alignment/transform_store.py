@@ -0,0 +1,299 @@
+import os  # For interacting with the file system
+import json  # For the transform table, one JSON object per line
+import argparse  # For the render and import command line options
+from concurrent.futures import ProcessPoolExecutor  # For rendering on several cores
+import cv2  # For warping, blending and writing the images
+import numpy as np  # For the transform matrix
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+
+#Change as you need to
+THERMAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "thermal_images")
+VISIBLE_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "optical_images")
+TRANSFORM_INFO_ROOT_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "transform_info")
+
+# Images that can be rendered from the transform table: name -> (folder with a folder per subject, file suffix)
+DERIVED_OUTPUTS = {
+    "aligned": (os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "aligned_images"), "_aligned.jpg"),
+    "blended": (os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "blended_images"), "_blended.jpg"),
+    "cropped_optical": (os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "cropped_optical_images"), "_cropped_optical.jpg"),
+}
+
+# Name of the transform table kept in the root of the transform_info folder
+TRANSFORM_TABLE_FILENAME = "transform_table.jsonl"
+
+# Look of the blended images: weight of the optical image, and how much it is brightened first
+BLEND_ALPHA = 0.3
+OPTICAL_GAIN = 1.2
+
+# Number of processes rendering images
+RENDER_WORKERS = 4
+
+def transform_table_path(transform_root_dir, annotator=None):
+    """
+    Get the path of the transform table of a transform_info folder.
+
+    Args:
+        transform_root_dir (str): Root of the transform_info folder.
+        annotator (str): Name of the annotator to get their own part of the table, or None for the main table.
+                         When several people align on the same synced folder each writes to their own part.
+
+    Returns:
+        str: Path of the transform table (e.g. transform_table.jsonl, or transform_table.andrew.jsonl for an annotator).
+    """
+    if annotator is None:
+        return os.path.join(transform_root_dir, TRANSFORM_TABLE_FILENAME)
+    safe_name = ''.join(c if c.isalnum() or c in '-_@' else '_' for c in annotator)
+    stem, extension = os.path.splitext(TRANSFORM_TABLE_FILENAME)
+    return os.path.join(transform_root_dir, f"{stem}.{safe_name}{extension}")
+
+def make_transform_record(subject, image, transform_info, thermal_points=None, optical_points=None):
+    """
+    Build the transform table entry of one image.
+
+    Args:
+        subject (str): Subject folder (e.g. "HIP_01").
+        image (str): Image name without suffix and extension (e.g. "HIP_01_E8XT_1_Base").
+        transform_info (dict): scale_x, scale_y, translation_x, translation_y and whatever else was
+                               saved with the alignment (reused_from, auto_accepted, score).
+        thermal_points (list): The clicked (x, y) points on the thermal image, or None if none were clicked.
+        optical_points (list): The matching clicked (x, y) points on the optical image, in full size pixels.
+
+    Returns:
+        dict: The transform record.
+    """
+    def rounded(points):
+        return [[round(float(x), 3), round(float(y), 3)] for x, y in points] if points is not None else None
+
+    return {
+        "subject": subject,
+        "image": image,
+        **transform_info,
+        "thermal_points": rounded(thermal_points),
+        "optical_points": rounded(optical_points),
+    }
+
+def append_transform(table_path, record):
+    """
+    Add a transform to the transform table.
+
+    The table is only ever appended to, so a redone alignment is added again and the newest entry
+    of an image is the one that counts (see load_transform_table).
+
+    Args:
+        table_path (str): Path of the transform table.
+        record (dict): Transform record, see make_transform_record.
+    """
+    os.makedirs(os.path.dirname(table_path), exist_ok=True)
+    with open(table_path, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+def load_transform_table(table_path):
+    """
+    Load the transform table, together with the annotators' parts of it (see transform_table_path).
+
+    Args:
+        table_path (str): Path of the transform table.
+
+    Returns:
+        dict: Maps (subject, image) to the newest transform record of that image. Empty if the table does not exist.
+    """
+    transforms = {}
+    table_dir = os.path.dirname(table_path)
+    stem, extension = os.path.splitext(os.path.basename(table_path))
+
+    # The main table first, then the annotators' parts from the least to the most recently changed
+    paths = [table_path] if os.path.exists(table_path) else []
+    if os.path.isdir(table_dir):
+        parts = [os.path.join(table_dir, name) for name in os.listdir(table_dir)
+                 if name.startswith(f"{stem}.") and name.endswith(extension) and name != os.path.basename(table_path)]
+        paths += sorted(parts, key=os.path.getmtime)
+
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut off while it was being written
+                transforms[(record["subject"], record["image"])] = record
+    return transforms
+
+def transform_matrix(transform_info):
+    """
+    Build the 2x3 affine matrix (optical to thermal pixels) of a transform.
+
+    Args:
+        transform_info (dict): Transform record or transform_info with scale_x, scale_y, translation_x, translation_y.
+
+    Returns:
+        np.ndarray: The matrix, for cv2.warpAffine.
+    """
+    #First two columns, scalin and rotation. rotation = 0. and the last column is translation
+    return np.array([
+        [transform_info["scale_x"], 0, transform_info["translation_x"]],
+        [0, transform_info["scale_y"], transform_info["translation_y"]]
+    ])
+
+def blend_images(image1, image2, alpha, gain=OPTICAL_GAIN):
+    """Blend two images with enhanced contrast for the optical image."""
+    enhanced_optical = cv2.convertScaleAbs(image2, alpha=gain)  # Same as addWeighted with a zeros image, without making one
+    blended_image = cv2.addWeighted(image1, 1 - alpha, enhanced_optical, alpha, 0)
+    return blended_image
+
+def write_outputs(thermal_img, aligned_optical, blended_image, output_paths):
+    """
+    Write the derived images of an alignment.
+
+    Args:
+        thermal_img (np.ndarray): Thermal image.
+        aligned_optical (np.ndarray): Optical image warped onto the thermal image.
+        blended_image (np.ndarray): Blend of the two, see blend_images.
+        output_paths (dict): Maps the names in DERIVED_OUTPUTS to write to their paths. Missing names are not written.
+    """
+    images = {
+        "aligned": lambda: np.hstack((aligned_optical, thermal_img)),
+        "blended": lambda: blended_image,
+        "cropped_optical": lambda: aligned_optical,
+    }
+    for kind, path in output_paths.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cv2.imwrite(path, images[kind]())
+
+def output_path(kind, subject, image):
+    """Get the path of a derived image (see DERIVED_OUTPUTS) of an image."""
+    base_dir, suffix = DERIVED_OUTPUTS[kind]
+    return os.path.join(base_dir, subject, f"{image}{suffix}")
+
+def render_record(task):
+    """
+    Render the derived images of one transform record in a worker process.
+
+    Args:
+        task (tuple): (record, thermal_path, optical_path, output_paths, alpha), see write_outputs for output_paths.
+
+    Returns:
+        int: Number of images written.
+    """
+    record, thermal_path, optical_path, output_paths, alpha = task
+    thermal_img = cv2.imread(thermal_path)
+    if thermal_img is None:
+        raise ValueError(f"Could not read {thermal_path}")
+    optical_img = cv2.imread(optical_path)
+    if optical_img is None:
+        raise ValueError(f"Could not read {optical_path}")
+
+    aligned_optical = cv2.warpAffine(optical_img, transform_matrix(record), (thermal_img.shape[1], thermal_img.shape[0]))
+    blended_image = blend_images(thermal_img, aligned_optical, alpha) if "blended" in output_paths else None
+    write_outputs(thermal_img, aligned_optical, blended_image, output_paths)
+    return len(output_paths)
+
+def render(kinds=("blended", "cropped_optical"), subjects=None, alpha=BLEND_ALPHA, overwrite=False, workers=RENDER_WORKERS,
+           table_path=None, thermal_dir=THERMAL_BASE_DIR, visible_dir=VISIBLE_BASE_DIR):
+    """
+    Render derived images from the transform table, without opening any window.
+
+    Only the images asked for are made, and by default only those that do not exist yet, so this
+    can be run whenever some are needed. Change alpha (or BLEND_ALPHA) and use overwrite to redo
+    every blended image without clicking anything again.
+
+    Args:
+        kinds (tuple): Names in DERIVED_OUTPUTS to render.
+        subjects (list): Subjects to render (e.g. ["HIP_01"]), or None for all.
+        alpha (float): Weight of the optical image in the blended images.
+        overwrite (bool): True renders images that already exist again.
+        workers (int): Number of processes rendering.
+        table_path (str): Path of the transform table, or None for the one in TRANSFORM_INFO_ROOT_DIR.
+        thermal_dir (str): Folder with a thermal image folder per subject.
+        visible_dir (str): Folder with an optical image folder per subject.
+    """
+    transforms = load_transform_table(table_path or transform_table_path(TRANSFORM_INFO_ROOT_DIR))
+    tasks = []
+    for (subject, image), record in sorted(transforms.items()):
+        if subjects and subject not in subjects:
+            continue
+        output_paths = {kind: output_path(kind, subject, image) for kind in kinds}
+        if not overwrite:
+            output_paths = {kind: path for kind, path in output_paths.items() if not os.path.exists(path)}
+        if not output_paths:
+            continue
+        thermal_path = os.path.join(thermal_dir, subject, f"{image}_thermal.jpg")
+        optical_path = os.path.join(visible_dir, subject, f"{image}_optical.jpg")
+        tasks.append((record, thermal_path, optical_path, output_paths, alpha))
+
+    print(f"{len(tasks)} images to render")
+    written = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(render_record, task) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                written += future.result()
+            except Exception as e:
+                print(f"Error processing {task[1]}: {e}")
+    print(f"Wrote {written} images")
+
+def import_transform_info_folder(transform_root_dir, table_path=None):
+    """
+    Add the transforms of existing *_transform_info.json files to the transform table.
+
+    The clicked points are not known for these, so they are stored as None. Images already
+    in the table are skipped.
+
+    Args:
+        transform_root_dir (str): Root of the transform_info folder (HIP_xx/*_transform_info.json).
+        table_path (str): Path of the transform table, or None for the table in transform_root_dir.
+    """
+    if not os.path.exists(transform_root_dir):
+        print(f"The directory {transform_root_dir} does not exist.")
+        return
+
+    table_path = table_path or transform_table_path(transform_root_dir)
+    transforms = load_transform_table(table_path)
+    imported = 0
+
+    for subject in sorted(os.listdir(transform_root_dir)):
+        subject_dir = os.path.join(transform_root_dir, subject)
+        if not os.path.isdir(subject_dir):
+            continue
+
+        for filename in sorted(os.listdir(subject_dir)):
+            if not filename.endswith("_transform_info.json"):
+                continue
+            image = filename.replace("_transform_info.json", "")
+            if (subject, image) in transforms:
+                continue
+
+            info_path = os.path.join(subject_dir, filename)
+            try:
+                with open(info_path, 'r') as f:
+                    transform_info = json.load(f)
+                append_transform(table_path, make_transform_record(subject, image, transform_info))
+                imported += 1
+            except Exception as e:
+                print(f"Error processing {info_path}: {e}")
+
+    print(f"Imported {imported} transforms into {table_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render alignment images from the transform table, or import old transform_info files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = commands.add_parser("render", help="make the aligned, blended and/or cropped optical images")
+    render_parser.add_argument("--outputs", nargs="+", choices=list(DERIVED_OUTPUTS), default=["blended", "cropped_optical"],
+                               help="images to make (default: blended cropped_optical)")
+    render_parser.add_argument("--subjects", nargs="+", default=None, help="subjects to render, e.g. HIP_01 HIP_02 (default: all)")
+    render_parser.add_argument("--alpha", type=float, default=BLEND_ALPHA, help="weight of the optical image in the blended images")
+    render_parser.add_argument("--overwrite", action="store_true", help="render images that already exist again")
+    render_parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="number of processes rendering")
+
+    import_parser = commands.add_parser("import", help="add existing *_transform_info.json files to the transform table")
+    import_parser.add_argument("root", nargs="?", default=TRANSFORM_INFO_ROOT_DIR, help="transform_info folder with HIP_xx folders")
+    args = parser.parse_args()
+
+    if args.command == "render":
+        render(tuple(args.outputs), args.subjects, args.alpha, args.overwrite, args.workers)
+    else:
+        import_transform_info_folder(args.root)
@@ -0,0 +1,58 @@
+import exiftool  # For extracting EXIF metadata from image files
+
+# Number of files sent to exiftool in a single get_metadata / get_tags call
+EXIF_BATCH_SIZE = 100
+
+def get_exif_batch(et, file_paths, tags=None):
+    """
+    Read metadata for a batch of files from an already running exiftool process.
+
+    Args:
+        et (exiftool.ExifToolHelper): An open ExifToolHelper.
+        file_paths (list): Paths of the files to read.
+        tags (list): Tag names to request (e.g. ['APP1:DateTimeOriginal']), or None for all tags.
+
+    Returns:
+        list: One metadata dictionary per file, in the same order as file_paths.
+    """
+    if tags is None:
+        return et.get_metadata(file_paths)
+    return et.get_tags(file_paths, tags)
+
+def read_exif_metadata(file_paths, tags=None, batch_size=EXIF_BATCH_SIZE):
+    """
+    Read EXIF metadata for many files with one exiftool process kept alive for the whole run.
+
+    File paths are sent to exiftool in batches instead of starting a new process per file.
+    If a batch fails, it is retried one file at a time so a single bad file does not lose
+    the metadata of the rest of the batch.
+
+    Args:
+        file_paths (list): Paths of the files to read.
+        tags (list): Tag names to request (e.g. ['APP1:DateTimeOriginal']), or None for all tags.
+        batch_size (int): Number of files per exiftool call.
+
+    Returns:
+        dict: Maps each file path to its metadata dictionary, or to None if it could not be read.
+    """
+    file_paths = list(file_paths)
+    results = {}
+
+    if not file_paths:
+        return results
+
+    with exiftool.ExifToolHelper() as et:
+        for start in range(0, len(file_paths), batch_size):
+            batch = file_paths[start:start + batch_size]
+            try:
+                results.update(zip(batch, get_exif_batch(et, batch, tags)))
+            except Exception:
+                # Fall back to one file at a time to find the file(s) exiftool failed on
+                for file_path in batch:
+                    try:
+                        results[file_path] = get_exif_batch(et, [file_path], tags)[0]
+                    except Exception as e:
+                        print(f"Error processing {file_path}: {e}")
+                        results[file_path] = None
+
+    return results
@@ -0,0 +1,353 @@
+import os  # For interacting with the operating system, such as file and directory management
+import csv  # For reading and writing CSV files
+import argparse  # For the --workers command line option
+from concurrent.futures import ProcessPoolExecutor  # For decoding images on several cores
+import flyr  # For processing FLIR thermal images and extracting their metadata
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.data_extraction.metadata_extraction import read_flir_metadata, read_date_times_original, build_metadata_header, build_metadata_row
+from data_processing.data_extraction.metadata_extraction import metadata_manifest_path, load_metadata_manifest, save_metadata_manifest
+from data_processing.misc_folder_functions.file_helpers import file_signature, read_csv_rows
+from data_processing.data_extraction.temperature_store import save_temperature_array
+from data_processing.data_extraction.flir_records import read_embedded_optical_jpeg
+from data_processing.data_extraction.thermal_render import save_thermal_renders
+
+#Change as you need to. Set any destination to None to skip that output.
+ORIGINAL_FLIR_IMAGE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "SubjData", "Phase 1")
+OPTICAL_FOLDER_DESTINATION = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "optical_images")
+THERMAL_FOLDER_DESTINATION = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "thermal_images")
+TEMPERATURE_CSV_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "temperature_csv")
+METADATA_CSV_PATH = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "metadata_extraction_results.csv")
+
+# "npy" writes compact float32 arrays (see temperature_store.py), "npy_int16" halves that again, "csv" writes the old text files
+TEMPERATURE_FORMAT = "npy"
+
+# True: write the optical JPEG embedded by the camera byte for byte. False: decode and re-encode it with PIL (old behaviour)
+COPY_OPTICAL_JPEG = True
+
+# Palettes to render from each image, the first one is saved as {name}_thermal.jpg (see thermal_render.py)
+THERMAL_PALETTES = ["grayscale"]
+
+# (min, max) in Celsius to color every image the same way, or None to use the range the camera rendered each image with
+THERMAL_TEMPERATURE_RANGE = None
+
+# "jpg" with the quality below (what the alignment and ROI scripts read), or "png" / "webp" for lossless images
+THERMAL_IMAGE_FORMAT = "jpg"
+THERMAL_JPEG_QUALITY = 75
+
+# True: only extract metadata for images that are new or changed since the last run (see metadata_extraction.py)
+INCREMENTAL_METADATA = False
+
+def find_flir_images(root_directory):
+    """
+    Walk the directory tree once and collect every original FLIR image.
+
+    Only JPEG files inside folders named "Renamed Images" are collected. Folders and files
+    are visited in sorted order so every output is written in the same order on each run.
+
+    Args:
+        root_directory (str): The root directory containing subject folders (e.g. "Phase 1").
+
+    Returns:
+        list: (relative_dir, flir_path) tuples, where relative_dir is the subject folder
+              relative to root_directory (e.g. "HIP_01").
+    """
+    flir_images = []
+
+    for subdir, dirs, files in os.walk(root_directory):
+        dirs.sort()  # Visit subject folders in order (HIP_01, HIP_02, ...)
+
+        if os.path.basename(subdir) != "Renamed Images":
+            continue
+
+        relative_dir = os.path.relpath(os.path.dirname(subdir), root_directory)
+        for filename in sorted(files):
+            if filename.lower().endswith(('.jpg', '.jpeg')):
+                flir_images.append((relative_dir, os.path.join(subdir, filename)))
+
+    return flir_images
+
+def write_temperature_csv(csv_path, celsius_temps):
+    """
+    Write a temperature array to a CSV file, one image row per CSV row.
+
+    Args:
+        csv_path (str): Path of the CSV file to write.
+        celsius_temps (np.ndarray): 2D array of temperatures in Celsius.
+    """
+    with open(csv_path, mode='w', newline='') as file:
+        writer = csv.writer(file)  # Create a CSV writer object
+        writer.writerows(celsius_temps)  # Write the temperature data to the CSV file
+
+def write_temperature_file(temperature_subdir, base_filename, celsius_temps, flir_path, temperature_format="npy"):
+    """
+    Write a temperature array in the selected format.
+
+    Args:
+        temperature_subdir (str): Folder to write the file into.
+        base_filename (str): Image name without extension, used as the file name.
+        celsius_temps (np.ndarray): 2D array of temperatures in Celsius.
+        flir_path (str): Path of the original FLIR image, recorded in the .npy header.
+        temperature_format (str): "npy", "npy_int16" or "csv".
+    """
+    if temperature_format == "csv":
+        write_temperature_csv(os.path.join(temperature_subdir, f"{base_filename}.csv"), celsius_temps)
+    elif temperature_format in ("npy", "npy_int16"):
+        dtype = "int16" if temperature_format == "npy_int16" else "float32"
+        save_temperature_array(os.path.join(temperature_subdir, f"{base_filename}.npy"), celsius_temps, flir_path, dtype)
+    else:
+        raise ValueError(f"Unsupported temperature format: {temperature_format}")
+
+def process_flir_file(flir_path, relative_dir, optical_dir=None, thermal_dir=None, temperature_dir=None, want_metadata=False, temperature_format="npy", copy_optical=True, thermal_palettes=("grayscale",), thermal_range=None,
+                      thermal_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY):
+    """
+    Decode one FLIR image at most once and write every selected output from that single decode.
+
+    The image is only unpacked with flyr when an output needs it: a copied optical JPEG and the
+    metadata are both read without decoding the thermal data.
+
+    Args:
+        flir_path (str): Path to the original FLIR image.
+        relative_dir (str): Subject folder relative to the source root (e.g. "HIP_01").
+        optical_dir (str): Destination folder for optical images, or None to skip.
+        thermal_dir (str): Destination folder for rendered thermal images, or None to skip.
+        temperature_dir (str): Destination folder for temperature arrays, or None to skip.
+        want_metadata (bool): Whether to return the FLIR metadata of the image.
+        temperature_format (str): "npy", "npy_int16" or "csv", see TEMPERATURE_FORMAT.
+        copy_optical (bool): Write the embedded optical JPEG bytes as they are instead of re-encoding them.
+        thermal_palettes (list): Palettes to render the thermal image in, see THERMAL_PALETTES.
+        thermal_range (tuple): (min, max) in Celsius for the thermal renders, or None for the camera's range.
+        thermal_format (str): "jpg", "png" or "webp", see THERMAL_IMAGE_FORMAT.
+        jpeg_quality (int): JPEG quality of the thermal renders, see THERMAL_JPEG_QUALITY.
+
+    Returns:
+        dict: The FLIR metadata if want_metadata is True, otherwise None.
+    """
+    thermogram = None
+
+    # Generate base filename without the extension for saving processed images
+    base_filename = os.path.splitext(os.path.basename(flir_path))[0]
+
+    if optical_dir is not None:
+        optical_subdir = os.path.join(optical_dir, relative_dir)
+        os.makedirs(optical_subdir, exist_ok=True)  # Create directory if it doesn't exist
+        optical_image_path = os.path.join(optical_subdir, f"{base_filename}_optical.jpg")
+
+        optical_bytes = read_embedded_optical_jpeg(flir_path) if copy_optical else None
+        if optical_bytes is not None:
+            # Copy the camera's own JPEG: no decode, no re-encode, no extra compression loss
+            with open(optical_image_path, "wb") as f:
+                f.write(optical_bytes)
+        else:
+            # Not a plain JPEG (or copying is off), so decode and re-encode it as before
+            thermogram = flyr.unpack(flir_path)
+            thermogram.optical_pil.save(optical_image_path)
+
+    if thermal_dir is not None or temperature_dir is not None:
+        # Unpack the FLIR image a single time; both outputs below reuse this thermogram
+        if thermogram is None:
+            thermogram = flyr.unpack(flir_path)
+        kelvin_temps = thermogram.kelvin  # Converted from the raw sensor values once, Celsius is derived from it
+        celsius_temps = kelvin_temps - 273.15
+
+        if thermal_dir is not None:
+            thermal_subdir = os.path.join(thermal_dir, relative_dir)
+            os.makedirs(thermal_subdir, exist_ok=True)  # Create directory if it doesn't exist
+            # Render without edge emphasis, every palette from the same array
+            if thermal_range is None:
+                # The camera's own range, exactly like thermogram.render_pil(edge_emphasis=0, palette='grayscale')
+                save_thermal_renders(thermal_subdir, base_filename, kelvin_temps, thermal_palettes, thermogram.embedded_range("kelvin"),
+                                     thermal_format, jpeg_quality)
+            else:
+                save_thermal_renders(thermal_subdir, base_filename, celsius_temps, thermal_palettes, thermal_range,
+                                     thermal_format, jpeg_quality)
+
+        if temperature_dir is not None:
+            temperature_subdir = os.path.join(temperature_dir, relative_dir)
+            os.makedirs(temperature_subdir, exist_ok=True)  # Create directory if it doesn't exist
+            write_temperature_file(temperature_subdir, base_filename, celsius_temps, flir_path, temperature_format)
+
+    if want_metadata:
+        # Reuse the decode if there was one, otherwise read only the JPEG header
+        return thermogram.camera_metadata.data if thermogram is not None else read_flir_metadata(flir_path)
+    return None
+
+def process_flir_task(task):
+    """
+    Run process_flir_file for one image and capture any error instead of raising it.
+
+    This is the unit of work for both the serial and the process-pool paths, so both
+    write the same files and report failures the same way.
+
+    Args:
+        task (tuple): The arguments of process_flir_file, starting with flir_path.
+
+    Returns:
+        tuple: (flir_path, flir_metadata, error_message). error_message is None on success.
+    """
+    flir_path = task[0]
+    try:
+        return flir_path, process_flir_file(*task), None
+    except Exception as e:
+        return flir_path, None, str(e)
+
+def extract_flir_outputs(root_directory, optical_dir=None, thermal_dir=None, temperature_dir=None, metadata_csv_path=None, workers=1, temperature_format="npy", incremental_metadata=False, copy_optical=True, thermal_palettes=("grayscale",), thermal_range=None,
+                         thermal_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY):
+    """
+    Walk the FLIR image tree once, decode each image once and write every selected output.
+
+    Each output is selected by passing its destination; outputs left as None are skipped,
+    so e.g. a metadata-only rerun still goes through the same traversal.
+
+    With workers > 1 the per-image work is fanned out to a process pool in chunks. Results
+    are collected in traversal order, so the files written and the messages printed are the
+    same as in the serial run.
+
+    A manifest of the size and modification time of every image in the metadata CSV is kept
+    next to it. With incremental_metadata, only new or changed images are extracted, their
+    rows are merged into the existing CSV and rows whose image no longer exists are dropped.
+
+    Args:
+        root_directory (str): The root directory containing subject folders with FLIR images.
+        optical_dir (str): Destination folder for the optical JPEGs.
+        thermal_dir (str): Destination folder for the rendered thermal images.
+        temperature_dir (str): Destination folder for the per-image temperature arrays.
+        metadata_csv_path (str): Path of the metadata results CSV.
+        workers (int): Number of worker processes. 1 decodes in this process.
+        temperature_format (str): "npy", "npy_int16" or "csv", see TEMPERATURE_FORMAT.
+        incremental_metadata (bool): Only extract metadata for new or changed images.
+        copy_optical (bool): Write the embedded optical JPEG bytes as they are, see COPY_OPTICAL_JPEG.
+        thermal_palettes (list): Palettes to render the thermal images in, see THERMAL_PALETTES.
+        thermal_range (tuple): (min, max) in Celsius for the thermal renders, see THERMAL_TEMPERATURE_RANGE.
+        thermal_format (str): "jpg", "png" or "webp", see THERMAL_IMAGE_FORMAT.
+        jpeg_quality (int): JPEG quality of the thermal renders, see THERMAL_JPEG_QUALITY.
+    """
+    want_metadata = metadata_csv_path is not None
+    other_outputs = any(output is not None for output in (optical_dir, thermal_dir, temperature_dir))
+    new_rows = {}
+    header = None
+
+    flir_images = find_flir_images(root_directory)
+    print(f"Found {len(flir_images)} FLIR images in {root_directory}")
+
+    # Work out which images need their metadata (re-)extracted
+    manifest_keys, signatures, needs_metadata = {}, {}, {}
+    previous_manifest, previous_header, previous_rows = {}, None, {}
+    if want_metadata:
+        if incremental_metadata:
+            previous_manifest = load_metadata_manifest(metadata_manifest_path(metadata_csv_path))
+            previous_header, previous_rows = read_csv_rows(metadata_csv_path)
+
+        for relative_dir, flir_path in flir_images:
+            manifest_keys[flir_path] = os.path.relpath(flir_path, root_directory).replace(os.sep, '/')
+            signatures[flir_path] = file_signature(flir_path)
+            filename = os.path.splitext(os.path.basename(flir_path))[0]
+            needs_metadata[flir_path] = (previous_manifest.get(manifest_keys[flir_path]) != signatures[flir_path]
+                                         or filename not in previous_rows)
+
+    tasks = [(flir_path, relative_dir, optical_dir, thermal_dir, temperature_dir, needs_metadata.get(flir_path, False), temperature_format, copy_optical,
+              thermal_palettes, thermal_range, thermal_format, jpeg_quality)
+             for relative_dir, flir_path in flir_images
+             if other_outputs or needs_metadata.get(flir_path, False)]
+    if want_metadata and incremental_metadata:
+        print(f"{sum(needs_metadata.values())} new or changed images need metadata extracted")
+
+    # Read all capture dates up front through one batched exiftool session
+    date_times_original = read_date_times_original([task[0] for task in tasks if task[5]]) if want_metadata else {}
+
+    if workers > 1:
+        # Send the tasks in chunks to cut down on inter-process overhead; map keeps results in order
+        chunksize = max(1, len(tasks) // (workers * 4))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(process_flir_task, tasks, chunksize=chunksize)
+    else:
+        executor = None
+        results = map(process_flir_task, tasks)
+
+    try:
+        for flir_path, flir_metadata, error in results:
+            if error is not None:
+                # Print an error message and move on to the next image
+                print(f"Error processing {flir_path}: {error}")
+                continue
+            print(f"Processed: {flir_path}")
+
+            if flir_metadata:
+                try:
+                    if header is None:
+                        header = build_metadata_header(flir_metadata)
+                    date_time_original = date_times_original.get(flir_path, '')
+                    new_rows[flir_path] = build_metadata_row(flir_path, flir_metadata, date_time_original, header)
+                except Exception as e:
+                    print(f"Error processing {flir_path}: {e}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if want_metadata:
+        if header is None:
+            header = previous_header
+
+        # Merge new rows with the unchanged rows of the previous run, in traversal order.
+        # Images that no longer exist are not visited, so their rows are dropped.
+        metadata_rows, manifest = [], {}
+        for relative_dir, flir_path in flir_images:
+            filename = os.path.splitext(os.path.basename(flir_path))[0]
+            if flir_path in new_rows:
+                row = new_rows[flir_path]
+            elif not needs_metadata[flir_path]:
+                row = previous_rows[filename]
+                if previous_header != header:
+                    # Line the old row up with the new columns
+                    previous_values = dict(zip(previous_header, row))
+                    row = [previous_values.get(column, '') for column in header]
+            else:
+                continue  # Extraction failed, leave it out so it is retried next run
+            metadata_rows.append(row)
+            manifest[manifest_keys[flir_path]] = signatures[flir_path]
+
+        with open(metadata_csv_path, 'w', newline='') as csvfile:
+            csvwriter = csv.writer(csvfile)
+            if header is not None:
+                csvwriter.writerow(header)
+            csvwriter.writerows(metadata_rows)
+        save_metadata_manifest(metadata_manifest_path(metadata_csv_path), manifest)
+
+        removed = len(set(previous_manifest) - set(manifest_keys.values()))
+        print(f"Metadata written to: {metadata_csv_path} ({len(new_rows)} extracted, "
+              f"{len(metadata_rows) - len(new_rows)} unchanged, {removed} removed)")
+
+    print("Processing complete.")
+
+def parse_workers_argument(description):
+    """
+    Parse the --workers option shared by the FLIR extraction scripts.
+
+    Args:
+        description (str): Description shown by --help.
+
+    Returns:
+        int: The number of worker processes to use.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to decode images with (default: 1, no pool)")
+    return parser.parse_args().workers
+
+if __name__ == "__main__":
+    extract_flir_outputs(ORIGINAL_FLIR_IMAGE_DIR,
+                         optical_dir=OPTICAL_FOLDER_DESTINATION,
+                         thermal_dir=THERMAL_FOLDER_DESTINATION,
+                         temperature_dir=TEMPERATURE_CSV_DIR,
+                         metadata_csv_path=METADATA_CSV_PATH,
+                         temperature_format=TEMPERATURE_FORMAT,
+                         incremental_metadata=INCREMENTAL_METADATA,
+                         copy_optical=COPY_OPTICAL_JPEG,
+                         thermal_palettes=THERMAL_PALETTES,
+                         thermal_range=THERMAL_TEMPERATURE_RANGE,
+                         thermal_format=THERMAL_IMAGE_FORMAT,
+                         jpeg_quality=THERMAL_JPEG_QUALITY,
+                         workers=parse_workers_argument("Split FLIR images and extract temperatures and metadata in one pass."))
@@ -0,0 +1,94 @@
+import struct  # For unpacking the binary FLIR record directory
+
+# FLIR record type of the embedded visible-light image (see https://exiftool.org/TagNames/FLIR.html)
+RECORD_EMBEDDED_IMAGE = 14
+
+# Every FLIR record starts with a 32 byte header before its data
+RECORD_HEADER_LENGTH = 32
+
+def read_flir_app1(file_path):
+    """
+    Collect the FLIR APP1 segments of a FLIR JPEG into the FFF byte string they make up.
+
+    Only the JPEG segment headers are walked; nothing is decoded.
+
+    Args:
+        file_path (str): Path to the original FLIR image.
+
+    Returns:
+        bytes: The FFF data, or None if the file has no FLIR APP1 segments.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    chunks = {}
+    position = 2
+    while position + 4 <= len(data) and data[position] == 0xFF:
+        marker = data[position + 1]
+        if marker == 0xDA:  # Start of scan, no more metadata segments after this
+            break
+        length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        segment = data[position + 4:position + 2 + length]
+
+        # FLIR segments look like: FLIR\0 <1 byte> <chunk number> <last chunk number> <data>
+        if marker == 0xE1 and segment[:5] == b"FLIR\x00":
+            chunks[segment[6]] = segment[8:]
+
+        position += 2 + length
+
+    if not chunks:
+        return None
+    return b"".join(chunks[number] for number in sorted(chunks))
+
+def read_flir_records(fff):
+    """
+    Read the record directory of FFF data.
+
+    Args:
+        fff (bytes): FFF data as returned by read_flir_app1.
+
+    Returns:
+        dict: Maps each record type to its (offset, length) in the FFF data.
+    """
+    directory_offset, entry_count = struct.unpack(">II", fff[0x18:0x20])
+
+    records = {}
+    for entry in range(entry_count):
+        start = directory_offset + 32 * entry
+        record_type = struct.unpack(">H", fff[start:start + 2])[0]
+        if record_type == 0:  # Unused directory entry
+            continue
+        offset, length = struct.unpack(">II", fff[start + 12:start + 20])
+        records[record_type] = (offset, length)
+    return records
+
+def read_embedded_optical_jpeg(file_path):
+    """
+    Get the bytes of the visible-light JPEG embedded in a FLIR image without decoding it.
+
+    Args:
+        file_path (str): Path to the original FLIR image.
+
+    Returns:
+        bytes: The embedded JPEG exactly as stored by the camera, or None if the file has no
+               embedded image or the embedded image is not a plain JPEG (e.g. PNG or raw).
+    """
+    fff = read_flir_app1(file_path)
+    if fff is None:
+        return None
+
+    records = read_flir_records(fff)
+    if RECORD_EMBEDDED_IMAGE not in records:
+        return None
+
+    offset, length = records[RECORD_EMBEDDED_IMAGE]
+    image_bytes = fff[offset + RECORD_HEADER_LENGTH:offset + length]
+
+    # Only copy data that is a complete JPEG (starts with SOI and has an EOI marker)
+    end = image_bytes.rfind(b"\xff\xd9")
+    if image_bytes[:2] != b"\xff\xd8" or end == -1:
+        return None
+    return image_bytes[:end + 2]
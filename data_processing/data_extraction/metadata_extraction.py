@@ -1,14 +1,16 @@
 # Import necessary libraries
 import sys  # For system-specific parameters and functions
 import os  # For interacting with the operating system, such as file and directory management
-import flyr  # For processing FLIR thermal images and extracting their metadata
-import csv  # For reading and writing CSV files
+from flyr.camera_metadata import CameraMetadata  # For reading FLIR camera metadata without decoding the thermal data
+import json  # For reading and writing the incremental extraction manifest
 from datetime import datetime  # For working with dates and times
 import exiftool  # For extracting EXIF metadata from image files
 
 #Allows the function in mis_folder_functions to be imported
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.data_extraction.exif_reader import read_exif_metadata
+from data_processing.misc_folder_functions.file_names import parse_filename
 
 #Change as you need to
 BASE_DIRECTORY = os.path.join(get_sharepoint_path(), "HIP_Project", "SubjData", "Phase 1")
@@ -17,6 +19,11 @@ OUTPUT_CSV_PATH = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_fr
 # Set code version (can be easily updated)
 CODE_VERSION = "1"
 
+# True: only extract images that are new or changed since the last run and merge them into the existing CSV.
+# False: re-extract every image and rewrite the whole CSV. Keep the same as INCREMENTAL_METADATA in flir_extraction.py,
+# which writes the same CSV
+INCREMENTAL = False
+
 # Dictionary containing information for different combinations of body position, lighting, and distance
 combo_info = {
     "1": {"Body Position": "Knee Forward", "Lighting": "Room Light", "Distance": "35 cm"},
@@ -33,139 +40,214 @@ combo_info = {
     "12": {"Body Position": "Knee Back", "Lighting": "Ring Light", "Distance": "50 cm"},
 }
 
-def extract_camera_metadata(file_path):
+# List of columns to exclude from the metadata when writing to CSV
+COLUMNS_TO_DROP = ['model','date_time','gps_info', 'make', 'resolution_unit', 'exif_offset', 'software', 'orientation', 'y_cb_cr_positioning', 'x_resolution', 'y_resolution']
+
+# The only exiftool tags the metadata results use, so exiftool does not have to return all of them
+EXIF_TAGS = ['APP1:DateTimeOriginal']
+
+def read_date_time_original(file_path, et=None):
+    """
+    Read the original capture date/time of an image using exiftool.
+
+    Args:
+        file_path (str): Path to the image file.
+        et (exiftool.ExifToolHelper): An open ExifToolHelper to reuse. If None, one is started for this file.
+
+    Returns:
+        str: The APP1:DateTimeOriginal value, or '' if it is not present.
+    """
+    if et is None:
+        with exiftool.ExifToolHelper() as et:
+            exif_metadata = et.get_tags(file_path, EXIF_TAGS)[0]
+    else:
+        exif_metadata = et.get_tags(file_path, EXIF_TAGS)[0]
+    return exif_metadata.get('APP1:DateTimeOriginal', '')
+
+def read_date_times_original(file_paths):
+    """
+    Read the original capture date/time of many images with a single exiftool process.
+
+    Args:
+        file_paths (list): Paths to the image files.
+
+    Returns:
+        dict: Maps each file path to its APP1:DateTimeOriginal value ('' if missing or unreadable).
+    """
+    exif_metadata = read_exif_metadata(file_paths, tags=EXIF_TAGS)
+    return {file_path: (metadata or {}).get('APP1:DateTimeOriginal', '') for file_path, metadata in exif_metadata.items()}
+
+def read_flir_metadata(file_path):
+    """
+    Read the FLIR camera metadata of an image without decoding any thermal or optical pixels.
+
+    flyr.unpack(file_path).camera_metadata.data is the EXIF block of the outer JPEG, so it is
+    read here directly with the same flyr class. Only the JPEG header is parsed, which skips
+    flyr's parsing of the FLIR APP1 records and the raw thermal payload.
+
+    Args:
+        file_path (str): Path to the image file.
+
+    Returns:
+        dict: The same keys and values as thermogram.camera_metadata.data.
+    """
+    return CameraMetadata(file_path).data
+
+def extract_camera_metadata(file_path, et=None):
     """
     Extract metadata from a FLIR image file using flyr and exiftool.
 
     Args:
         file_path (str): Path to the image file.
+        et (exiftool.ExifToolHelper): An open ExifToolHelper to reuse across calls, or None.
 
     Returns:
         tuple: FLIR metadata and original date/time, or (None, None) if an error occurs.
     """
     try:
-        # Extract FLIR-specific metadata using flyr
-        thermogram = flyr.unpack(file_path)
-        flir_metadata = thermogram.camera_metadata.data
+        # Extract FLIR-specific metadata using flyr, without decoding the thermal data
+        flir_metadata = read_flir_metadata(file_path)
 
         # Extract EXIF metadata using exiftool
-        with exiftool.ExifToolHelper() as et:
-            exif_metadata = et.get_metadata(file_path)[0]
-            date_time_original = exif_metadata.get('APP1:DateTimeOriginal', '')
+        date_time_original = read_date_time_original(file_path, et)
         return flir_metadata, date_time_original
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
         return None, None
 
-def parse_filename(filename):
+def format_date_time(date_time_original):
+    """
+    Split an exiftool DateTimeOriginal value into a date and a time string.
+
+    Args:
+        date_time_original (str): Value such as '2024:06:12 10:31:05.123-04:00'.
+
+    Returns:
+        tuple: (date, time) as ('YYYY-MM-DD', 'HH:MM:SS<tz>'), or ('', '') if it cannot be parsed.
+    """
+    date, time = '', ''  # Initialize date and time as empty strings
+    if date_time_original:
+        try:
+            # Parse the date-time string to extract date and time
+            date_time = datetime.strptime(date_time_original.split('.')[0], '%Y:%m:%d %H:%M:%S')
+            # Extract timezone offset if available
+            tz_offset = date_time_original.split('.')[-1]
+            date = date_time.strftime('%Y-%m-%d')  # Format date as 'YYYY-MM-DD'
+            time = f"{date_time.strftime('%H:%M:%S')}{tz_offset}"  # Format time with timezone offset
+        except ValueError:
+            print(f"Unable to parse date_time_original: {date_time_original}")
+            date, time = '', ''  # Reset date and time if parsing fails
+    return date, time
+
+def build_metadata_header(flir_metadata):
+    """
+    Build the CSV header for the metadata results from the first image's FLIR metadata.
+
+    Args:
+        flir_metadata (dict): FLIR metadata of an image, as returned by flyr.
+
+    Returns:
+        list: Column names, including combo information and metadata fields.
+    """
+    header = ['Filename', 'Subject ID', 'Camera', 'Combo Number', 'Body Position', 'Lighting', 'Distance', '# Minutes', 'Base or Cool', 'Code Version']
+    header += [key for key in flir_metadata.keys() if key not in COLUMNS_TO_DROP and key != 'image_description']
+    header += ['date', 'time']
+    return header
+
+def build_metadata_row(file_path, flir_metadata, date_time_original, header):
     """
-    Parse information from the filename.
+    Build one CSV row of metadata results for a FLIR image.
 
     Args:
-        filename (str): Name of the file.
+        file_path (str): Path to the original FLIR image.
+        flir_metadata (dict): FLIR metadata of the image, as returned by flyr.
+        date_time_original (str): The APP1:DateTimeOriginal value read by exiftool.
+        header (list): The CSV header returned by build_metadata_header.
 
     Returns:
-        tuple: Extracted information (subject_id, camera, combo_number, minutes, base_or_cool).
+        list: The row values in the same order as the header.
     """
-    parts = filename.split('_')  # Split the filename using underscores
-    subject_id = '_'.join(parts[:2])  # Combine the first two parts for the subject ID
-    camera = parts[2]  # Extract the camera identifier
-    combo_number = parts[3]  # Extract the combo number
+    date, time = format_date_time(date_time_original)
 
-    # Extract the last part of the filename to determine additional information
-    last_part = parts[-1].split('.')[0]
-    minutes = ''  # Initialize minutes as an empty string
-    base_or_cool = ''  # Initialize base_or_cool as an empty string
+    # Parse the filename to extract information
+    file_name = os.path.basename(file_path)
+    file_name_without_extension = os.path.splitext(file_name)[0]  # Remove the .jpg extension
+    subject_id, camera, combo_number, minutes, base_or_cool = parse_filename(file_name)
+    combo_data = combo_info.get(combo_number, {"Body Position": "", "Lighting": "", "Distance": ""})
 
-    # Determine the type of measurement (minutes, Cool/Base, or initial control)
-    if 'min' in last_part:
-        minutes = last_part.replace('min', '')  # Extract the number of minutes
-    elif last_part in ['Cool', 'Base']:
-        base_or_cool = last_part  # Determine if it's "Cool" or "Base"
-    elif last_part in ['InitialCtrl', 'PreCup']:
-        minutes = '0'  # Set minutes to 0 for initial control or pre-cup measurements
-        base_or_cool = 'None'  # Set base_or_cool to 'None' for these cases
+    # Prepare row data to be written to the CSV file
+    row = [file_name_without_extension, subject_id, camera, combo_number,
+           combo_data["Body Position"], combo_data["Lighting"], combo_data["Distance"],
+           minutes, base_or_cool, CODE_VERSION]
+    row += [flir_metadata[key] for key in flir_metadata.keys() if key not in COLUMNS_TO_DROP and key != 'image_description']
+    row += [date, time]
 
-    return subject_id, camera, combo_number, minutes, base_or_cool
+    # Find the index of the 'model' column
+    model_index = header.index('model') if 'model' in header else -1
 
-def write_metadata_to_csv(base_directory, output_csv_path):
+    # Update the 'model' column if any parameter is empty
+    if '' in row and model_index != -1:
+        row[model_index] = 'FLIR ONE Pro (gen 3)'
+
+    return row
+
+def metadata_manifest_path(output_csv_path):
+    """
+    Get the path of the manifest kept next to a metadata results CSV.
+
+    Args:
+        output_csv_path (str): Path of the metadata results CSV.
+
+    Returns:
+        str: Path of the manifest JSON file (e.g. metadata_extraction_results_manifest.json).
+    """
+    return os.path.splitext(output_csv_path)[0] + "_manifest.json"
+
+def load_metadata_manifest(manifest_path):
+    """
+    Load the manifest of images whose metadata is already in the results CSV.
+
+    Args:
+        manifest_path (str): Path of the manifest JSON file.
+
+    Returns:
+        dict: Maps each image path (relative to the base directory) to its file signature.
+              Empty if the manifest does not exist yet.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_metadata_manifest(manifest_path, manifest):
+    """
+    Save the manifest of images whose metadata is in the results CSV.
+
+    Args:
+        manifest_path (str): Path of the manifest JSON file.
+        manifest (dict): Maps each image path (relative to the base directory) to its file signature.
+    """
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+def write_metadata_to_csv(base_directory, output_csv_path, incremental=False):
     """
     Extract metadata from all FLIR images in the HIP directories and write to a CSV file.
 
+    This reuses the single-pass traversal in flir_extraction.py with only the metadata
+    output selected, so it walks the same "Renamed Images" folders as the other outputs.
+
     Args:
         base_directory (str): Base directory containing HIP folders.
         output_csv_path (str): Path to save the output CSV file.
+        incremental (bool): Only extract new or changed images and merge them into the existing CSV.
     """
-    # List of columns to exclude from the metadata when writing to CSV
-    columns_to_drop = ['model','date_time','gps_info', 'make', 'resolution_unit', 'exif_offset', 'software', 'orientation', 'y_cb_cr_positioning', 'x_resolution', 'y_resolution']
-
-    # Open the CSV file for writing
-    with open(output_csv_path, 'w', newline='') as csvfile:
-        csvwriter = csv.writer(csvfile)
-        header_written = False  # Flag to check if the header has been written
-
-        # Iterate through HIP directories (01 to 35)
-        for i in range(1, 36):
-            hip_dir = f"HIP_{i:02d}"  # Format the directory name (e.g., "HIP_01", "HIP_02", etc.)
-            directory_path = os.path.join(base_directory, hip_dir, "Renamed Images")
-
-            if not os.path.exists(directory_path):  # Skip if the directory does not exist
-                print(f"Directory not found: {directory_path}")
-                continue
-
-            # Get all FLIR image files in the directory
-            flir_files = [os.path.join(directory_path, file) for file in os.listdir(directory_path) if file.lower().endswith('.jpg')]
-
-            for file_path in flir_files:
-                # Extract metadata from each FLIR image
-                flir_metadata, date_time_original = extract_camera_metadata(file_path)
-
-                if flir_metadata:
-                    date, time = '', ''  # Initialize date and time as empty strings
-                    if date_time_original:
-                        try:
-                            # Parse the date-time string to extract date and time
-                            date_time = datetime.strptime(date_time_original.split('.')[0], '%Y:%m:%d %H:%M:%S')
-                            # Extract timezone offset if available
-                            tz_offset = date_time_original.split('.')[-1]
-                            date = date_time.strftime('%Y-%m-%d')  # Format date as 'YYYY-MM-DD'
-                            time = f"{date_time.strftime('%H:%M:%S')}{tz_offset}"  # Format time with timezone offset
-                        except ValueError:
-                            print(f"Unable to parse date_time_original: {date_time_original}")
-                            date, time = '', ''  # Reset date and time if parsing fails
-
-                    # Write header if not already written
-                    if not header_written:
-                        # Define the CSV header, including combo information and metadata fields
-                        header = ['Filename', 'Subject ID', 'Camera', 'Combo Number', 'Body Position', 'Lighting', 'Distance', '# Minutes', 'Base or Cool', 'Code Version']
-                        header += [key for key in flir_metadata.keys() if key not in columns_to_drop and key != 'image_description']
-                        header += ['date', 'time']
-                        csvwriter.writerow(header)  # Write the header row to the CSV file
-                        header_written = True  # Set the flag to indicate the header has been written
-
-                    # Parse the filename to extract information
-                    file_name = os.path.basename(file_path)
-                    file_name_without_extension = os.path.splitext(file_name)[0]  # Remove the .jpg extension
-                    subject_id, camera, combo_number, minutes, base_or_cool = parse_filename(file_name)
-                    combo_data = combo_info.get(combo_number, {"Body Position": "", "Lighting": "", "Distance": ""})
-
-                    # Prepare row data to be written to the CSV file
-                    row = [file_name_without_extension, subject_id, camera, combo_number, 
-                           combo_data["Body Position"], combo_data["Lighting"], combo_data["Distance"],
-                           minutes, base_or_cool, CODE_VERSION]
-                    row += [flir_metadata[key] for key in flir_metadata.keys() if key not in columns_to_drop and key != 'image_description']
-                    row += [date, time]
-
-                    # Find the index of the 'model' column
-                    model_index = header.index('model') if 'model' in header else -1
-
-                    # Update the 'model' column if any parameter is empty
-                    if '' in row and model_index != -1:
-                        row[model_index] = 'FLIR ONE Pro (gen 3)'
-
-                    # Write the row to the CSV file
-                    csvwriter.writerow(row)
-
-# Execute the main function to process the metadata and write to CSV
-write_metadata_to_csv(BASE_DIRECTORY, OUTPUT_CSV_PATH)
-print(f"Camera metadata for all HIP directories has been written to {OUTPUT_CSV_PATH}")
\ No newline at end of file
+    # Imported here because flir_extraction imports the helpers above from this module
+    from data_processing.data_extraction.flir_extraction import extract_flir_outputs
+
+    extract_flir_outputs(base_directory, metadata_csv_path=output_csv_path, incremental_metadata=incremental)
+
+if __name__ == "__main__":
+    # Execute the main function to process the metadata and write to CSV
+    write_metadata_to_csv(BASE_DIRECTORY, OUTPUT_CSV_PATH, INCREMENTAL)
+    print(f"Camera metadata for all HIP directories has been written to {OUTPUT_CSV_PATH}")
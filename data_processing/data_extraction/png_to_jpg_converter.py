@@ -1,46 +1,119 @@
 import os
+import argparse  # For the command line options
+from concurrent.futures import ProcessPoolExecutor  # For converting images on several cores
 from PIL import Image
 
 #Allows the function in mis_folder_functions to be imported
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.data_extraction.thermal_render import save_image, IMAGE_FORMATS, THERMAL_JPEG_QUALITY
 
 #Change as you need to
 THERMAL_IMAGE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "thermal_images")
 
-def convert_png_to_jpg(root_directory):
+# Format to convert the png files to: "jpg" (needed by the alignment script), or "webp" for lossless and smaller files
+TARGET_FORMAT = "jpg"
+JPEG_QUALITY = THERMAL_JPEG_QUALITY
+
+# True deletes each png once its converted file has been written
+DELETE_PNG = True
+
+def convert_image(task):
+    """
+    Convert one PNG image, capturing any error instead of raising it.
+
+    Args:
+        task (tuple): (png_image_path, target_image_path, target_format, jpeg_quality, delete_png).
+
+    Returns:
+        tuple: (png_image_path, target_image_path, converted, error_message). converted is False
+               when the target already existed from an earlier run. error_message is None on success.
+    """
+    png_image_path, target_image_path, target_format, jpeg_quality, delete_png = task
+    try:
+        # The target is only ever renamed into place once complete, so if it exists it is finished
+        converted = not os.path.exists(target_image_path)
+        if converted:
+            with Image.open(png_image_path) as img:
+                save_image(target_image_path, img, target_format, jpeg_quality)
+
+        if delete_png:
+            os.remove(png_image_path)
+        return png_image_path, target_image_path, converted, None
+    except Exception as e:
+        return png_image_path, target_image_path, False, str(e)
+
+def convert_png_to_jpg(root_directory, workers=1, target_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY, delete_png=True):
+    """
+    Convert every PNG under a folder to JPG (or another format), keeping the same name and folder.
+
+    Only needed for thermal image folders written as PNG by older versions of split_thermal_optical,
+    which now writes JPG directly. The conversion can be stopped and rerun: PNGs whose converted
+    file already exists are not converted again, only deleted (if delete_png is set).
+
+    Args:
+        root_directory (str): Folder to convert, including all subfolders.
+        workers (int): Number of processes to convert with. 1 converts in this process.
+        target_format (str): "jpg", "png" or "webp", see TARGET_FORMAT.
+        jpeg_quality (int): JPEG quality, see JPEG_QUALITY.
+        delete_png (bool): Delete each PNG after it has been converted, see DELETE_PNG.
+    """
     # Check if the root directory exists
     if not os.path.exists(root_directory):
         print(f"The directory {root_directory} does not exist.")
         return
 
-    # Walk through all subdirectories
+    extension = IMAGE_FORMATS[target_format][0]
+
+    # Walk through all subdirectories and collect the PNG files first
+    tasks = []
     for dirpath, dirnames, filenames in os.walk(root_directory):
-        # Process each file in the current directory
-        for filename in filenames:
+        dirnames.sort()
+        for filename in sorted(filenames):
             if filename.endswith(".png"):
-                # Full path to the PNG file
                 png_image_path = os.path.join(dirpath, filename)
-                
-                # Open the PNG file
-                with Image.open(png_image_path) as img:
-                    # Convert the image to RGB (JPG doesn't support transparency)
-                    rgb_img = img.convert('RGB')
-                    
-                    # Create the JPG filename
-                    jpg_filename = f"{os.path.splitext(filename)[0]}.jpg"
-                    jpg_image_path = os.path.join(dirpath, jpg_filename)
-                    
-                    # Save the image as JPG in the same directory
-                    rgb_img.save(jpg_image_path)
-                    print(f"Converted {png_image_path} to {jpg_image_path}")
-                    
-                    # Delete the original PNG file
-                    os.remove(png_image_path)
-                    print(f"Deleted original PNG: {png_image_path}")
-
-    print("Conversion complete.")
-
-# Example usage:
-convert_png_to_jpg(THERMAL_IMAGE_DIR) 
+                target_image_path = os.path.join(dirpath, f"{os.path.splitext(filename)[0]}{extension}")
+                tasks.append((png_image_path, target_image_path, target_format, jpeg_quality, delete_png))
+    print(f"Found {len(tasks)} png images in {root_directory}")
+
+    if workers > 1:
+        # Send the tasks in chunks to cut down on inter-process overhead; map keeps results in order
+        chunksize = max(1, len(tasks) // (workers * 4))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(convert_image, tasks, chunksize=chunksize)
+    else:
+        executor = None
+        results = map(convert_image, tasks)
+
+    converted_count, resumed_count, failed_count = 0, 0, 0
+    try:
+        for png_image_path, target_image_path, converted, error in results:
+            if error is not None:
+                failed_count += 1
+                print(f"Error processing {png_image_path}: {error}")
+                continue
+            if converted:
+                converted_count += 1
+                print(f"Converted {png_image_path} to {target_image_path}")
+            else:
+                resumed_count += 1
+                print(f"Already converted: {target_image_path}")
+            if delete_png:
+                print(f"Deleted original PNG: {png_image_path}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Conversion complete. Converted: {converted_count}, already converted: {resumed_count}, errors: {failed_count}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a folder of png thermal images to jpg (or webp).")
+    parser.add_argument("root", nargs="?", default=THERMAL_IMAGE_DIR, help="folder to convert")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes to convert with (default: 1, no pool)")
+    parser.add_argument("--format", choices=[f for f in IMAGE_FORMATS if f != "png"], default=TARGET_FORMAT, help="format to convert to (default: %(default)s)")
+    parser.add_argument("--quality", type=int, default=JPEG_QUALITY, help="JPEG quality (default: %(default)s)")
+    parser.add_argument("--keep-png", action="store_true", help="keep the png files after converting them")
+    args = parser.parse_args()
+
+    convert_png_to_jpg(args.root, args.workers, args.format, args.quality, DELETE_PNG and not args.keep_png)
@@ -1,67 +1,55 @@
 import os  # Import the os module to interact with the operating system
-import flyr  # Import the flyr module to process FLIR thermal images
-from PIL import Image  # Import the Image class from PIL (Pillow) to handle image processing
 
 #Allows the function in mis_folder_functions to be imported
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.data_extraction.flir_extraction import extract_flir_outputs, parse_workers_argument
 
 #Change as you need to
 ORIGNAL_FLIR_IMAGE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "SubjData", "Phase 1")
 OPTICAL_FOLDER_DESTINATION = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "optical_images")
 THERMAL_FOLDER_DESTINATION =  os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "thermal_images")
-
-def process_flir_images(source_folder, destination_folder_optical, destination_folder_thermal):
+# True: write the optical JPEG embedded by the camera byte for byte. False: decode and re-encode it with PIL (old behaviour)
+COPY_OPTICAL_JPEG = True
+# Palettes to render, the first one is saved as {name}_thermal.jpg (see thermal_render.py for the options)
+THERMAL_PALETTES = ["grayscale"]
+# (min, max) in Celsius to color every image the same way, or None to use the range the camera rendered each image with
+THERMAL_TEMPERATURE_RANGE = None
+# "jpg" with the quality below (what the alignment and ROI scripts read), or "png" / "webp" for lossless images
+THERMAL_IMAGE_FORMAT = "jpg"
+THERMAL_JPEG_QUALITY = 75
+
+def process_flir_images(source_folder, destination_folder_optical, destination_folder_thermal, workers=1, copy_optical=True, thermal_palettes=("grayscale",), thermal_range=None,
+                        thermal_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY):
     """
     Processes FLIR images from the source folder, extracts optical and thermal images,
     and saves them in the specified destination folders.
 
+    Uses the single-pass engine in flir_extraction.py with only the optical and thermal
+    outputs selected. Run flir_extraction.py instead to also get the temperature CSVs and
+    metadata from the same decode.
+
     :param source_folder: Path to the folder containing the source images.
     :param destination_folder_optical: Path to the folder where optical images will be saved.
     :param destination_folder_thermal: Path to the folder where thermal images will be saved.
+    :param workers: Number of processes to decode images with (1 = no process pool).
+    :param copy_optical: Write the embedded optical JPEG bytes as they are instead of re-encoding them.
+    :param thermal_palettes: Palettes to render the thermal images in.
+    :param thermal_range: (min, max) in Celsius for the thermal renders, or None for the camera's range.
+    :param thermal_format: "jpg", "png" or "webp". jpg is written directly, so png_to_jpg_converter is not needed.
+    :param jpeg_quality: JPEG quality of the thermal images.
     """
-
-    # Walk through the directory tree, starting from source_folder
-    for root, dirs, files in os.walk(source_folder):
-        # Process only if the current directory's name is "Renamed Images"
-        if "Renamed Images" in root:
-            # Extract the top-level subdirectory name (e.g., "HIP_01")
-            top_level_dir = root.split(os.sep)[-2]
-            
-            # Create corresponding subdirectories in the optical and thermal destination folders
-            optical_subdir = os.path.join(destination_folder_optical, top_level_dir)
-            thermal_subdir = os.path.join(destination_folder_thermal, top_level_dir)
-            os.makedirs(optical_subdir, exist_ok=True)  # Create directory if it doesn't exist
-            os.makedirs(thermal_subdir, exist_ok=True)  # Create directory if it doesn't exist
-
-            # Iterate over all files in the current directory
-            for filename in files:
-                # Process only JPEG files (case insensitive)
-                if filename.lower().endswith((".jpg", ".jpeg")):
-                    flir_path = os.path.join(root, filename)  # Full path to the FLIR image file
-                    print(f"Processing: {flir_path}")
-
-                    # Unpack the FLIR image to extract thermal data and the embedded optical image
-                    thermogram = flyr.unpack(flir_path)
-
-                    # Generate base filename without the extension for saving processed images
-                    base_filename = os.path.splitext(filename)[0]
-                    
-                    # Define the full path for saving the optical image
-                    optical_image_path = os.path.join(optical_subdir, f"{base_filename}_optical.jpg")
-                    
-                    # Define the full path for saving the thermal image
-                    render_no_edge_emphasis_path = os.path.join(thermal_subdir, f"{base_filename}_thermal.png")
-
-                    # Save the extracted optical image
-                    thermogram.optical_pil.save(optical_image_path)
-                    
-                    # Render and save the thermal image without edge emphasis (can change colors here - palettes = ["turbo", "cividis", "inferno", "grayscale", "hot"])
-                    thermogram.render_pil(edge_emphasis=0, palette = 'grayscale').save(render_no_edge_emphasis_path)
-
-                    # Print confirmation of the saved images
-                    print(f"Saved {filename} to {optical_subdir} and {thermal_subdir}")
-
-# Call the function to process the FLIR images
-process_flir_images(ORIGNAL_FLIR_IMAGE_DIR, OPTICAL_FOLDER_DESTINATION, THERMAL_FOLDER_DESTINATION)
+    extract_flir_outputs(source_folder, optical_dir=destination_folder_optical, thermal_dir=destination_folder_thermal, workers=workers, copy_optical=copy_optical,
+                         thermal_palettes=thermal_palettes, thermal_range=thermal_range,
+                         thermal_format=thermal_format, jpeg_quality=jpeg_quality)
+
+if __name__ == "__main__":
+    # Call the function to process the FLIR images
+    process_flir_images(ORIGNAL_FLIR_IMAGE_DIR, OPTICAL_FOLDER_DESTINATION, THERMAL_FOLDER_DESTINATION,
+                        workers=parse_workers_argument("Split FLIR images into optical and thermal images."),
+                        copy_optical=COPY_OPTICAL_JPEG,
+                        thermal_palettes=THERMAL_PALETTES,
+                        thermal_range=THERMAL_TEMPERATURE_RANGE,
+                        thermal_format=THERMAL_IMAGE_FORMAT,
+                        jpeg_quality=THERMAL_JPEG_QUALITY)
@@ -0,0 +1,162 @@
+import os  # For interacting with the file system
+import json  # For the small header file stored next to int16 arrays
+import argparse  # For the migration command line options
+import numpy as np  # For storing and memory-mapping the temperature arrays
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+
+#Change as you need to
+TEMPERATURE_CSV_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "temperature_csv")
+
+# Temperatures stored as int16 are multiplied by 1 / INT16_SCALE, i.e. kept to 0.01 degrees Celsius
+INT16_SCALE = 0.01
+
+def save_temperature_array(npy_path, celsius_temps, source_file, dtype="float32"):
+    """
+    Save a temperature array as a .npy file, plus a small .json header next to it for int16 arrays.
+
+    The .npy file can be opened directly with np.load(npy_path, mmap_mode='r') and already holds
+    the shape and dtype. Only int16 arrays need more to be read back, their scale factor, so only
+    they get the header (scale and the FLIR file it came from). This keeps the synced temperature
+    folders at one file per image for float32.
+
+    Args:
+        npy_path (str): Path of the .npy file to write.
+        celsius_temps (np.ndarray): 2D array of temperatures in Celsius.
+        source_file (str): Path of the original FLIR image the temperatures came from.
+        dtype (str): "float32", or "int16" to store temperatures scaled by INT16_SCALE (half the size).
+    """
+    celsius_temps = np.asarray(celsius_temps)
+
+    if dtype == "float32":
+        stored = celsius_temps.astype(np.float32)
+    elif dtype == "int16":
+        stored = np.round(celsius_temps / INT16_SCALE).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported temperature dtype: {dtype}")
+
+    np.save(npy_path, stored)
+
+    if dtype == "int16":
+        header = {
+            "shape": list(stored.shape),
+            "dtype": dtype,
+            "scale": INT16_SCALE,
+            "source_file": os.path.basename(source_file),
+        }
+        with open(os.path.splitext(npy_path)[0] + ".json", "w") as f:
+            json.dump(header, f, indent=4)
+
+def read_temperature_header(npy_path):
+    """
+    Read the header stored next to a .npy temperature array.
+
+    Args:
+        npy_path (str): Path of the .npy file.
+
+    Returns:
+        dict: The header, or None if the .json file does not exist (float32 arrays have none).
+    """
+    header_path = os.path.splitext(npy_path)[0] + ".json"
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, "r") as f:
+        return json.load(f)
+
+def load_temperature_array(path, mmap_mode="r"):
+    """
+    Load a temperature array in degrees Celsius from a .npy store or a legacy CSV.
+
+    float32 .npy files are memory-mapped, so nothing is read until pixels are accessed.
+    int16 .npy files are scaled back to Celsius. CSV files are parsed as before.
+
+    Args:
+        path (str): Path of the .npy or .csv temperature file.
+        mmap_mode (str): Passed to np.load for .npy files. Use None to read fully into memory.
+
+    Returns:
+        np.ndarray: 2D array of temperatures in Celsius.
+    """
+    if path.lower().endswith(".csv"):
+        return np.loadtxt(path, delimiter=",", ndmin=2)
+
+    temps = np.load(path, mmap_mode=mmap_mode)
+    if temps.dtype == np.int16:
+        header = read_temperature_header(path)
+        scale = header["scale"] if header is not None else INT16_SCALE
+        temps = temps.astype(np.float32) * np.float32(scale)
+    return temps
+
+def find_temperature_file(directory, base_name):
+    """
+    Find the temperature file for an image, preferring the binary store over a legacy CSV.
+
+    Args:
+        directory (str): Folder containing the temperature files of one subject.
+        base_name (str): Image name without extension (e.g. "HIP_01_E8XT_1_Base").
+
+    Returns:
+        str: Path of the .npy or .csv file, or None if neither exists.
+    """
+    for extension in (".npy", ".csv"):
+        path = os.path.join(directory, f"{base_name}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def migrate_csv_tree(root_directory, dtype="float32", delete_csv=False):
+    """
+    Convert every temperature CSV under a directory into the binary .npy store.
+
+    CSVs that already have a .npy next to them are skipped, so the migration can be rerun.
+
+    Args:
+        root_directory (str): Root of an existing temperature_csv tree.
+        dtype (str): "float32" or "int16", see save_temperature_array.
+        delete_csv (bool): Whether to delete each CSV after it has been converted and checked.
+    """
+    if not os.path.exists(root_directory):
+        print(f"The directory {root_directory} does not exist.")
+        return
+
+    converted, skipped, failed = 0, 0, 0
+
+    for dirpath, _, filenames in os.walk(root_directory):
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(".csv"):
+                continue
+
+            csv_path = os.path.join(dirpath, filename)
+            npy_path = os.path.splitext(csv_path)[0] + ".npy"
+
+            if os.path.exists(npy_path):
+                skipped += 1
+                continue
+
+            try:
+                celsius_temps = load_temperature_array(csv_path)
+                # The CSVs are named after the original FLIR image, which is a .jpg
+                save_temperature_array(npy_path, celsius_temps, f"{os.path.splitext(filename)[0]}.jpg", dtype)
+
+                # Only delete the CSV once the stored array reads back with the same shape
+                if delete_csv and load_temperature_array(npy_path).shape == celsius_temps.shape:
+                    os.remove(csv_path)
+                converted += 1
+                print(f"Converted {csv_path} to {npy_path}")
+            except Exception as e:
+                failed += 1
+                print(f"Error converting {csv_path}: {e}")
+
+    print(f"Migration complete. Converted: {converted}, already converted: {skipped}, errors: {failed}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an existing temperature_csv tree to .npy temperature arrays.")
+    parser.add_argument("root", nargs="?", default=TEMPERATURE_CSV_DIR, help="temperature_csv folder to convert")
+    parser.add_argument("--dtype", choices=["float32", "int16"], default="float32", help="stored data type (default: float32)")
+    parser.add_argument("--delete-csv", action="store_true", help="delete each CSV after converting it")
+    args = parser.parse_args()
+
+    migrate_csv_tree(args.root, args.dtype, args.delete_csv)
@@ -0,0 +1,276 @@
+import os  # For interacting with the file system
+import argparse  # For the command line options
+import numpy as np  # For normalizing temperatures and applying the palettes
+from PIL import Image  # For saving the rendered images
+from flyr.palettes import palettes as FLYR_PALETTES  # Color lists of the palettes flyr ships with
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.data_extraction.temperature_store import load_temperature_array
+
+#Change as you need to
+TEMPERATURE_CSV_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "temperature_csv")
+RENDER_DESTINATION = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "thermal_renders")
+
+# Palettes to render, the first one is written as {name}_thermal.jpg and the rest as {name}_thermal_{palette}.jpg
+# Options: "grayscale", "grayscale-inverted" and every flyr palette, e.g. "turbo", "cividis", "inferno", "hot"
+THERMAL_PALETTES = ["grayscale"]
+
+# (min, max) in Celsius to color every image the same way, or None for a range per image
+THERMAL_TEMPERATURE_RANGE = None
+
+# "jpg" (what the alignment and ROI scripts read), or "png" / "webp" for lossless images
+THERMAL_IMAGE_FORMAT = "jpg"
+# JPEG quality from 1 to 95, 75 is what PIL (and so png_to_jpg_converter) has always used
+THERMAL_JPEG_QUALITY = 75
+
+# Percentiles of all temperatures used as the range when a cohort range is computed (see compute_cohort_range)
+COHORT_PERCENTILES = (1, 99)
+
+# File extension and PIL format name of each output format
+IMAGE_FORMATS = {
+    "jpg": (".jpg", "JPEG"),
+    "png": (".png", "PNG"),
+    "webp": (".webp", "WEBP"),
+}
+
+_lut_cache = {}
+
+def save_image(path, image, image_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY):
+    """
+    Encode an image straight to its final format in a single write.
+
+    The image is written to a temporary file first and then renamed, so an interrupted run
+    never leaves a half-written image behind that would be mistaken for a finished one.
+
+    Args:
+        path (str): Path of the file to write.
+        image (np.ndarray or PIL.Image): RGB image.
+        image_format (str): "jpg", "png" or "webp" (webp is saved lossless).
+        jpeg_quality (int): Quality used for "jpg".
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    image = image.convert('RGB')  # JPG doesn't support transparency
+
+    options = {}
+    if image_format == "jpg":
+        options["quality"] = jpeg_quality
+    elif image_format == "webp":
+        options["lossless"] = True
+
+    temporary_path = f"{path}.tmp"
+    image.save(temporary_path, format=IMAGE_FORMATS[image_format][1], **options)
+    os.replace(temporary_path, path)
+
+def build_palette_lut(palette):
+    """
+    Build the 256 entry color lookup table of a palette.
+
+    Entry i is the color flyr gives a temperature that is i / 255 of the way through the range,
+    so grayscale renders are identical to thermogram.render(palette='grayscale').
+
+    Args:
+        palette (str): "grayscale", "grayscale-inverted" or the name of a flyr palette.
+
+    Returns:
+        np.ndarray: (256, 3) uint8 array of RGB colors.
+    """
+    if palette in _lut_cache:
+        return _lut_cache[palette]
+
+    levels = np.arange(256, dtype=np.uint8)
+    if palette == "grayscale":
+        lut = np.repeat(levels[:, None], 3, axis=1)
+    elif palette == "grayscale-inverted":
+        lut = np.repeat(255 - levels[:, None], 3, axis=1)
+    elif palette in FLYR_PALETTES:
+        colors = np.array(FLYR_PALETTES[palette], dtype=np.uint8)
+        # Same bins as flyr's map_colors: the color whose [idx / n, (idx + 1) / n] interval holds the value
+        color_index = np.minimum(levels.astype(np.int64) * len(colors) // 255, len(colors) - 1)
+        lut = colors[color_index]
+    else:
+        raise ValueError(f"Unknown palette: {palette}")
+
+    _lut_cache[palette] = lut
+    return lut
+
+def temperatures_to_levels(temperatures, temperature_range=None):
+    """
+    Map temperatures onto the 256 palette levels.
+
+    Args:
+        temperatures (np.ndarray): 2D array of temperatures.
+        temperature_range (tuple): (min, max) in the same unit as temperatures. Values outside it
+                                   are clipped. None uses the minimum and maximum of the array.
+
+    Returns:
+        np.ndarray: 2D uint8 array of palette levels (0 = min, 255 = max).
+    """
+    temperatures = np.asarray(temperatures)
+    if temperature_range is None:
+        temperature_range = (float(temperatures.min()), float(temperatures.max()))
+    min_t, max_t = temperature_range
+    if not min_t < max_t:
+        raise ValueError(f"Minimum temperature {min_t} should be smaller than maximum temperature {max_t}")
+
+    # Same steps as flyr's normalization, so the levels match its renders
+    normalized = (np.clip(temperatures, min_t, max_t) - min_t) / (max_t - min_t)
+    return (normalized * 255).astype(np.uint8)
+
+def render_thermal(temperatures, palettes=("grayscale",), temperature_range=None):
+    """
+    Render a temperature array in one or more palettes.
+
+    The temperatures are normalized once and every palette is then a single table lookup.
+
+    Args:
+        temperatures (np.ndarray): 2D array of temperatures.
+        palettes (list): Palette names, see THERMAL_PALETTES.
+        temperature_range (tuple): (min, max) in the same unit as temperatures, or None, see temperatures_to_levels.
+
+    Returns:
+        dict: Maps each palette name to a (height, width, 3) uint8 RGB image.
+    """
+    levels = temperatures_to_levels(temperatures, temperature_range)
+    return {palette: build_palette_lut(palette)[levels] for palette in palettes}
+
+def thermal_image_paths(directory, base_filename, palettes, image_format="jpg"):
+    """
+    Get the output path of each palette of a thermal image.
+
+    The first palette is written as {base_filename}_thermal{extension}, which is the name the
+    alignment and ROI scripts look for. Other palettes get the palette name appended.
+
+    Args:
+        directory (str): Folder to write into.
+        base_filename (str): Image name without extension (e.g. "HIP_01_E8XT_1_Base").
+        palettes (list): Palette names, see THERMAL_PALETTES.
+        image_format (str): "jpg", "png" or "webp", see THERMAL_IMAGE_FORMAT.
+
+    Returns:
+        dict: Maps each palette name to its output path.
+    """
+    extension = IMAGE_FORMATS[image_format][0]
+    paths = {}
+    for index, palette in enumerate(palettes):
+        suffix = "_thermal" if index == 0 else f"_thermal_{palette}"
+        paths[palette] = os.path.join(directory, f"{base_filename}{suffix}{extension}")
+    return paths
+
+def save_thermal_renders(directory, base_filename, temperatures, palettes=("grayscale",), temperature_range=None,
+                         image_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY):
+    """
+    Render a temperature array in every palette and save each render.
+
+    Args:
+        directory (str): Folder to write into.
+        base_filename (str): Image name without extension.
+        temperatures (np.ndarray): 2D array of temperatures.
+        palettes (list): Palette names, see THERMAL_PALETTES.
+        temperature_range (tuple): (min, max) in the same unit as temperatures, or None, see temperatures_to_levels.
+        image_format (str): "jpg", "png" or "webp", see THERMAL_IMAGE_FORMAT.
+        jpeg_quality (int): Quality used for "jpg", see THERMAL_JPEG_QUALITY.
+    """
+    renders = render_thermal(temperatures, palettes, temperature_range)
+    for palette, path in thermal_image_paths(directory, base_filename, palettes, image_format).items():
+        save_image(path, renders[palette], image_format, jpeg_quality)
+
+def find_temperature_arrays(root_directory):
+    """
+    Collect the temperature files of a temperature_csv tree, one per image.
+
+    Args:
+        root_directory (str): Root of the temperature tree (subject folders with .npy or .csv files).
+
+    Returns:
+        list: (relative_dir, base_filename, path) tuples in sorted order. A .npy file is used
+              over a .csv of the same image.
+    """
+    temperature_files = []
+
+    for subdir, dirs, files in os.walk(root_directory):
+        dirs.sort()
+        relative_dir = os.path.relpath(subdir, root_directory)
+        by_name = {}
+        for filename in sorted(files):
+            base_filename, extension = os.path.splitext(filename)
+            if extension.lower() == ".npy" or (extension.lower() == ".csv" and base_filename not in by_name):
+                by_name[base_filename] = os.path.join(subdir, filename)
+        temperature_files.extend((relative_dir, name, by_name[name]) for name in sorted(by_name))
+
+    return temperature_files
+
+def compute_cohort_range(temperature_paths, percentiles=COHORT_PERCENTILES, stride=4):
+    """
+    Compute one temperature range for a group of images so they can be colored the same way.
+
+    Every stride-th pixel in each direction is sampled, which is plenty for percentiles and
+    keeps memory-mapped arrays from being read in full.
+
+    Args:
+        temperature_paths (list): Paths of .npy or .csv temperature files.
+        percentiles (tuple): (low, high) percentiles of all sampled temperatures to use as the range.
+        stride (int): Sample every stride-th row and column.
+
+    Returns:
+        tuple: (min, max) in Celsius.
+    """
+    samples = [np.asarray(load_temperature_array(path)[::stride, ::stride], dtype=np.float32).ravel()
+               for path in temperature_paths]
+    if not samples:
+        raise ValueError("No temperature files to compute a range from")
+    low, high = np.percentile(np.concatenate(samples), percentiles)
+    return float(low), float(high)
+
+def render_temperature_tree(root_directory, output_dir, palettes=("grayscale",), temperature_range=None,
+                            image_format="jpg", jpeg_quality=THERMAL_JPEG_QUALITY):
+    """
+    Render every temperature array of a temperature tree without decoding the FLIR images again.
+
+    Args:
+        root_directory (str): Root of the temperature tree.
+        output_dir (str): Folder to write the renders to, keeping the subject folders.
+        palettes (list): Palette names, see THERMAL_PALETTES.
+        temperature_range (tuple): (min, max) in Celsius, or None for each image's own minimum and maximum.
+        image_format (str): "jpg", "png" or "webp", see THERMAL_IMAGE_FORMAT.
+        jpeg_quality (int): Quality used for "jpg", see THERMAL_JPEG_QUALITY.
+    """
+    if not os.path.exists(root_directory):
+        print(f"The directory {root_directory} does not exist.")
+        return
+
+    for relative_dir, base_filename, path in find_temperature_arrays(root_directory):
+        try:
+            render_subdir = os.path.join(output_dir, relative_dir)
+            os.makedirs(render_subdir, exist_ok=True)  # Create directory if it doesn't exist
+            save_thermal_renders(render_subdir, base_filename, load_temperature_array(path), palettes, temperature_range,
+                                 image_format, jpeg_quality)
+            print(f"Rendered: {path}")
+        except Exception as e:
+            print(f"Error processing {path}: {e}")
+
+    print("Rendering complete.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render thermal images in one or more palettes from stored temperature arrays.")
+    parser.add_argument("root", nargs="?", default=TEMPERATURE_CSV_DIR, help="temperature_csv folder to render")
+    parser.add_argument("output", nargs="?", default=RENDER_DESTINATION, help="folder to write the renders to")
+    parser.add_argument("--palettes", nargs="+", default=THERMAL_PALETTES, help="palettes to render (default: %(default)s)")
+    parser.add_argument("--format", choices=list(IMAGE_FORMATS), default=THERMAL_IMAGE_FORMAT, help="output format (default: %(default)s)")
+    parser.add_argument("--quality", type=int, default=THERMAL_JPEG_QUALITY, help="JPEG quality (default: %(default)s)")
+    range_group = parser.add_mutually_exclusive_group()
+    range_group.add_argument("--range", nargs=2, type=float, metavar=("MIN", "MAX"), help="fixed temperature range in Celsius")
+    range_group.add_argument("--cohort", action="store_true", help="use one range computed from all images under root")
+    args = parser.parse_args()
+
+    temperature_range = tuple(args.range) if args.range else THERMAL_TEMPERATURE_RANGE
+    if args.cohort:
+        temperature_range = compute_cohort_range([path for _, _, path in find_temperature_arrays(args.root)])
+        print(f"Cohort temperature range: {temperature_range[0]:.2f} to {temperature_range[1]:.2f} C")
+
+    render_temperature_tree(args.root, args.output, args.palettes, temperature_range, args.format, args.quality)
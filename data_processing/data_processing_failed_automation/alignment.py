@@ -4,6 +4,18 @@ import cv2
 import os
 import csv
 
+# Scales of the optical image that are searched for the thermal image, largest first
+SEARCH_SCALES = np.linspace(0.45, 1.0, 200)[::-1]
+
+# Pyramid search: every COARSE_STEP-th scale is first tried on edge maps shrunk COARSE_FACTOR times, then the scales
+# around the best REFINE_CANDIDATES of them are tried at full size, only within REFINE_MARGIN pixels of where they matched.
+# False goes through every scale at full size like before (much slower)
+USE_PYRAMID_SEARCH = True
+COARSE_FACTOR = 4
+COARSE_STEP = 8
+REFINE_CANDIDATES = 3
+REFINE_MARGIN = 12
+
 def adaptive_hysteresis_thresholding(edges, sigma=0.33):
     median = np.median(edges)
     low_threshold = int(max(0, (1.0 - sigma) * median))
@@ -32,19 +44,13 @@ def preprocess_thermal_image(image):
     
     return final_edges
 
-def process_image_pair(thermal_path, optical_path, output_dir, results_dir, csv_writer, visualize=False):
-    template = cv2.imread(thermal_path)
-    template = preprocess_thermal_image(template)
-    edges_template = template
+def exhaustive_search(gray, edges_template, visualize=False):
+    # Tries every scale at full size, running Canny and matchTemplate on the whole resized image each time.
+    # Returns (maxVal, maxLoc, r): the best match, its top left corner in the resized image and how much it was shrunk
     (tH, tW) = edges_template.shape[:2]
-
-    image = cv2.imread(optical_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    gray = cv2.fastNlMeansDenoising(gray, None, h=20, searchWindowSize=35, templateWindowSize=11)
-
     found = None
 
-    for scale in np.linspace(0.45, 1.0, 200)[::-1]:
+    for scale in SEARCH_SCALES:
         resized = imutils.resize(gray, width=int(gray.shape[1] * scale))
         r = gray.shape[1] / float(resized.shape[1])
 
@@ -64,6 +70,82 @@ def process_image_pair(thermal_path, optical_path, output_dir, results_dir, csv_
         if found is None or maxVal > found[0]:
             found = (maxVal, maxLoc, r)
 
+    return found
+
+def pyramid_search(gray, edges_template):
+    # Same result format as exhaustive_search. Canny runs once on the full size image and its edge map is shrunk
+    # for every scale. The scales are first tried on a coarse grid on small edge maps, then the best ones are refined
+    # at full size, where matchTemplate only runs in a small window around the coarse match
+    (tH, tW) = edges_template.shape[:2]
+    (H, W) = gray.shape[:2]
+    edged = cv2.Canny(gray, 50, 200)
+
+    # Sizes of the resized image for each scale, the same as imutils.resize gives
+    sizes = []
+    for scale in SEARCH_SCALES:
+        width = int(W * scale)
+        height = int(H * width / float(W))
+        if height < tH or width < tW:
+            break
+        sizes.append((width, height))
+    if not sizes:
+        return None
+
+    # Coarse pass on small edge maps
+    coarse_template = cv2.resize(edges_template, (max(tW // COARSE_FACTOR, 1), max(tH // COARSE_FACTOR, 1)), interpolation=cv2.INTER_AREA)
+    coarse = []
+    for index in sorted(set(range(0, len(sizes), COARSE_STEP)) | {len(sizes) - 1}):
+        width, height = sizes[index]
+        coarse_size = (max(width // COARSE_FACTOR, coarse_template.shape[1]), max(height // COARSE_FACTOR, coarse_template.shape[0]))
+        small = cv2.resize(edged, coarse_size, interpolation=cv2.INTER_AREA)
+        result = cv2.matchTemplate(small, coarse_template, cv2.TM_CCOEFF)
+        (_, maxVal, _, maxLoc) = cv2.minMaxLoc(result)
+        # Where the match is in the full size resized image of this scale
+        coarse.append((maxVal, index, maxLoc[0] * width / coarse_size[0], maxLoc[1] * height / coarse_size[1]))
+    coarse.sort(reverse=True)
+
+    # Refine around the best coarse scales at full size. Positions move with the scale, so the coarse match is
+    # moved to each neighbouring scale before searching around it
+    found = None
+    tried = set()
+    resized_maps = {}
+    for (_, coarse_index, coarse_x, coarse_y) in coarse[:REFINE_CANDIDATES]:
+        coarse_width = sizes[coarse_index][0]
+        for index in range(max(coarse_index - COARSE_STEP + 1, 0), min(coarse_index + COARSE_STEP, len(sizes))):
+            width, height = sizes[index]
+            x = int(round(coarse_x * width / coarse_width))
+            y = int(round(coarse_y * width / coarse_width))
+            x0, y0 = max(x - REFINE_MARGIN, 0), max(y - REFINE_MARGIN, 0)
+            x1, y1 = min(x + REFINE_MARGIN + tW, width), min(y + REFINE_MARGIN + tH, height)
+            if (index, x0, y0) in tried or x1 - x0 < tW or y1 - y0 < tH:
+                continue
+            tried.add((index, x0, y0))
+
+            if index not in resized_maps:
+                resized_maps[index] = cv2.resize(edged, (width, height), interpolation=cv2.INTER_AREA)
+            result = cv2.matchTemplate(resized_maps[index][y0:y1, x0:x1], edges_template, cv2.TM_CCOEFF)
+            (_, maxVal, _, maxLoc) = cv2.minMaxLoc(result)
+            if found is None or maxVal > found[0]:
+                found = (maxVal, (maxLoc[0] + x0, maxLoc[1] + y0), W / float(width))
+
+    return found
+
+def process_image_pair(thermal_path, optical_path, output_dir, results_dir, csv_writer, visualize=False):
+    template = cv2.imread(thermal_path)
+    template = preprocess_thermal_image(template)
+    edges_template = template
+    (tH, tW) = edges_template.shape[:2]
+
+    image = cv2.imread(optical_path)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.fastNlMeansDenoising(gray, None, h=20, searchWindowSize=35, templateWindowSize=11)
+
+    # The visualization steps through every scale, so it always uses the full search
+    if USE_PYRAMID_SEARCH and not visualize:
+        found = pyramid_search(gray, edges_template)
+    else:
+        found = exhaustive_search(gray, edges_template, visualize)
+
     (_, maxLoc, r) = found
     (startX, startY) = (int(maxLoc[0] * r), int(maxLoc[1] * r))
     (endX, endY) = (int((maxLoc[0] + tW) * r), int((maxLoc[1] + tH) * r))
@@ -0,0 +1,61 @@
+import os
+import time
+import argparse
+import cv2
+
+from alignment import preprocess_thermal_image, exhaustive_search, pyramid_search
+
+# Compares the pyramid search of alignment.py with the old search through every scale, on the same image pairs.
+# Run from this folder:
+#   python benchmark_alignment.py <folder with *_thermal.jpg> <folder with *_optical.jpg> --limit 10
+
+def benchmark_pair(thermal_path, optical_path):
+    # Same preprocessing as alignment.process_image_pair, then both searches on the same inputs
+    edges_template = preprocess_thermal_image(cv2.imread(thermal_path))
+    (tH, tW) = edges_template.shape[:2]
+    image = cv2.imread(optical_path)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.fastNlMeansDenoising(gray, None, h=20, searchWindowSize=35, templateWindowSize=11)
+
+    start = time.perf_counter()
+    (_, old_loc, old_r) = exhaustive_search(gray, edges_template)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    (_, new_loc, new_r) = pyramid_search(gray, edges_template)
+    new_time = time.perf_counter() - start
+
+    # Difference of the found rectangles in optical image pixels (the largest corner movement)
+    old_box = (old_loc[0] * old_r, old_loc[1] * old_r, (old_loc[0] + tW) * old_r, (old_loc[1] + tH) * old_r)
+    new_box = (new_loc[0] * new_r, new_loc[1] * new_r, (new_loc[0] + tW) * new_r, (new_loc[1] + tH) * new_r)
+    offset = max(abs(a - b) for a, b in zip(old_box, new_box))
+    return old_time, new_time, offset
+
+def main(thermal_dir, optical_dir, limit=None):
+    names = sorted(f.replace("_thermal.jpg", "") for f in os.listdir(thermal_dir) if f.endswith("_thermal.jpg"))
+    names = [n for n in names if os.path.exists(os.path.join(optical_dir, f"{n}_optical.jpg"))][:limit]
+    if not names:
+        print("No image pairs found.")
+        return
+
+    old_total, new_total, offsets = 0.0, 0.0, []
+    for name in names:
+        old_time, new_time, offset = benchmark_pair(os.path.join(thermal_dir, f"{name}_thermal.jpg"),
+                                                    os.path.join(optical_dir, f"{name}_optical.jpg"))
+        old_total += old_time
+        new_total += new_time
+        offsets.append(offset)
+        print(f"{name}: every scale {old_time:.2f} s, pyramid {new_time:.2f} s, rectangles differ by {offset:.1f} px")
+
+    offsets.sort()
+    print(f"{len(names)} pairs: every scale {old_total:.1f} s, pyramid {new_total:.1f} s ({old_total / new_total:.1f}x faster)")
+    print(f"Rectangle difference: median {offsets[len(offsets) // 2]:.1f} px, largest {offsets[-1]:.1f} px")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the pyramid search against the search through every scale.")
+    parser.add_argument("thermal_dir", help="folder with *_thermal.jpg images")
+    parser.add_argument("optical_dir", help="folder with the matching *_optical.jpg images")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N pairs")
+    args = parser.parse_args()
+
+    main(args.thermal_dir, args.optical_dir, args.limit)
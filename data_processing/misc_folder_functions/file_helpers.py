@@ -0,0 +1,34 @@
+import os  # For the file size and modification time
+import csv  # For reading results CSV files
+
+def file_signature(file_path):
+    """
+    Get the size and modification time of a file, used to tell whether it changed.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        dict: {"size": bytes, "mtime_ns": modification time in nanoseconds}.
+    """
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def read_csv_rows(csv_path):
+    """
+    Read an existing CSV whose first column names each row, e.g. a results CSV from an earlier run.
+
+    Args:
+        csv_path (str): Path of the CSV.
+
+    Returns:
+        tuple: (header, rows) where rows maps the first column of each row to the row. (None, {}) if the CSV does not exist.
+    """
+    if not os.path.exists(csv_path):
+        return None, {}
+
+    with open(csv_path, 'r', newline='') as csvfile:
+        csvreader = csv.reader(csvfile)
+        header = next(csvreader, None)
+        rows = {row[0]: row for row in csvreader if row}
+    return header, rows
@@ -0,0 +1,30 @@
+def parse_filename(filename):
+    """
+    Parse information from the filename.
+
+    Args:
+        filename (str): Name of the file.
+
+    Returns:
+        tuple: Extracted information (subject_id, camera, combo_number, minutes, base_or_cool).
+    """
+    parts = filename.split('_')  # Split the filename using underscores
+    subject_id = '_'.join(parts[:2])  # Combine the first two parts for the subject ID
+    camera = parts[2]  # Extract the camera identifier
+    combo_number = parts[3]  # Extract the combo number
+
+    # Extract the last part of the filename to determine additional information
+    last_part = parts[-1].split('.')[0]
+    minutes = ''  # Initialize minutes as an empty string
+    base_or_cool = ''  # Initialize base_or_cool as an empty string
+
+    # Determine the type of measurement (minutes, Cool/Base, or initial control)
+    if 'min' in last_part:
+        minutes = last_part.replace('min', '')  # Extract the number of minutes
+    elif last_part in ['Cool', 'Base']:
+        base_or_cool = last_part  # Determine if it's "Cool" or "Base"
+    elif last_part in ['InitialCtrl', 'PreCup']:
+        minutes = '0'  # Set minutes to 0 for initial control or pre-cup measurements
+        base_or_cool = 'None'  # Set base_or_cool to 'None' for these cases
+
+    return subject_id, camera, combo_number, minutes, base_or_cool
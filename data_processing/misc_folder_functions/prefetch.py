@@ -0,0 +1,57 @@
+import queue  # For handing loaded items from the background thread to the caller
+import threading  # For loading the next items while the current one is being worked on
+
+# Marks the end of the items in the queue
+_DONE = object()
+
+def prefetch(items, load, depth=3):
+    """
+    Load items on a background thread, a few ahead of the one being worked on.
+
+    Meant for the interactive scripts: while someone is drawing on the current image pair, the
+    next pairs are already being read from the (slow, synced) SCRG folder and decoded.
+
+    Args:
+        items (list): The items to load, e.g. tuples of image paths.
+        load (callable): Called with each item on the background thread; returns the loaded data.
+        depth (int): How many loaded items to keep ready ahead of the current one.
+
+    Yields:
+        tuple: (item, data, error) in the same order as items. If load raised, data is None and
+               error is the exception, so the caller can report it and move on.
+    """
+    loaded = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def offer(result):
+        # Wait for room in the queue, but give up if the caller has stopped
+        while not stop.is_set():
+            try:
+                loaded.put(result, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        for item in items:
+            try:
+                result = (item, load(item), None)
+            except Exception as e:
+                result = (item, None, e)
+            if not offer(result):
+                return
+        offer(_DONE)
+
+    # Daemon thread so closing the script (e.g. control + c) does not wait for it
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            result = loaded.get()
+            if result is _DONE:
+                break
+            yield result
+    finally:
+        stop.set()
@@ -0,0 +1,171 @@
+import os  # For the lease files
+import json  # For the contents of a lease file
+import time  # For the lease expiry
+import getpass  # For naming the annotator holding a lease
+import socket  # For naming the computer holding a lease
+
+# How long a lease holds before someone else can take the image over (e.g. after a crash), in seconds
+LEASE_SECONDS = 30 * 60
+
+def default_owner():
+    """
+    Get the name leases are taken under when no annotator name is given.
+
+    Returns:
+        str: "<user>@<computer>".
+    """
+    return f"{getpass.getuser()}@{socket.gethostname()}"
+
+def lease_path(lease_dir, key):
+    """
+    Get the path of the lease file of an image.
+
+    Args:
+        lease_dir (str): Folder with the lease files.
+        key (str): Name of the image (e.g. "HIP_01_E8XT_1_Base").
+
+    Returns:
+        str: Path of the lease file.
+    """
+    return os.path.join(lease_dir, f"{key}.lease")
+
+def read_lease(path):
+    """
+    Read a lease file.
+
+    Args:
+        path (str): Path of the lease file.
+
+    Returns:
+        dict: {"owner", "taken", "expires"}, or None if there is no lease (or it is being written).
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_new_lease(path, owner, lease_seconds):
+    # O_EXCL makes creating the file fail if it already exists, so only one annotator can get it
+    now = time.time()
+    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({"owner": owner, "taken": now, "expires": now + lease_seconds}, f)
+
+def acquire_lease(lease_dir, key, owner, lease_seconds=LEASE_SECONDS):
+    """
+    Take the lease of an image, so nobody else works on it at the same time.
+
+    Creating the lease file is atomic, so when two annotators ask at once only one gets it. An
+    expired lease (its holder crashed or walked away) is first moved aside with a rename, which
+    also only succeeds for one of them, and then taken like a new one. A lease already held by
+    the same owner (e.g. after restarting the script) is given back to them.
+
+    Args:
+        lease_dir (str): Folder with the lease files (shared by every annotator).
+        key (str): Name of the image.
+        owner (str): Who is taking the lease, see default_owner.
+        lease_seconds (float): How long the lease holds.
+
+    Returns:
+        bool: True if the lease was taken, False if someone else holds it.
+    """
+    os.makedirs(lease_dir, exist_ok=True)
+    path = lease_path(lease_dir, key)
+
+    try:
+        _write_new_lease(path, owner, lease_seconds)
+        return True
+    except FileExistsError:
+        pass
+
+    lease = read_lease(path)
+    if lease is None:
+        return False  # Being written or removed right now; try again later
+    if lease.get("owner") != owner and lease.get("expires", 0) > time.time():
+        return False
+
+    # Our own or an expired lease: move it aside, then take the image like a new one
+    stale_path = f"{path}.{os.getpid()}.{socket.gethostname()}.stale"
+    try:
+        os.rename(path, stale_path)
+    except OSError:
+        return False  # Someone else got to it first
+
+    moved = read_lease(stale_path)
+    if moved is not None and moved.get("owner") != owner and moved.get("expires", 0) > time.time():
+        # Someone took the image over between our check and the rename: put their lease back
+        try:
+            os.link(stale_path, path)
+        except OSError:
+            pass
+        os.remove(stale_path)
+        return False
+    os.remove(stale_path)
+
+    try:
+        _write_new_lease(path, owner, lease_seconds)
+        return True
+    except FileExistsError:
+        return False
+
+def release_lease(lease_dir, key, owner):
+    """
+    Give back the lease of an image, if it is still ours.
+
+    Args:
+        lease_dir (str): Folder with the lease files.
+        key (str): Name of the image.
+        owner (str): Who took the lease.
+    """
+    path = lease_path(lease_dir, key)
+    lease = read_lease(path)
+    if lease is not None and lease.get("owner") == owner:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def active_leases(lease_dir):
+    """
+    Get the leases that have not expired.
+
+    Args:
+        lease_dir (str): Folder with the lease files.
+
+    Returns:
+        dict: Maps each leased image name to its lease (see read_lease).
+    """
+    leases = {}
+    if not os.path.isdir(lease_dir):
+        return leases
+
+    now = time.time()
+    for filename in os.listdir(lease_dir):
+        if filename.endswith(".lease"):
+            lease = read_lease(os.path.join(lease_dir, filename))
+            if lease is not None and lease.get("expires", 0) > now:
+                leases[filename[:-len(".lease")]] = lease
+    return leases
+
+def format_progress(subject, keys, done, leases, owner):
+    """
+    Describe the progress of a subject in one line.
+
+    Args:
+        subject (str): Subject name.
+        keys (list): Names of every image of the subject.
+        done (set): Names of the images that are finished.
+        leases (dict): Active leases, see active_leases.
+        owner (str): The annotator running this script; their own leases are not counted as others.
+
+    Returns:
+        str: e.g. "HIP_01: 12/60 done, 2 in progress (andrew@lab-pc), 46 left".
+    """
+    finished = sum(1 for key in keys if key in done)
+    others = [leases[key]["owner"] for key in keys if key not in done and key in leases and leases[key].get("owner") != owner]
+    left = len(keys) - finished - len(others)
+    line = f"{subject}: {finished}/{len(keys)} done"
+    if others:
+        line += f", {len(others)} in progress ({', '.join(sorted(set(others)))})"
+    return f"{line}, {left} left"
@@ -0,0 +1,447 @@
+import os  # For interacting with the file system
+import csv  # For the redo list
+import json  # For reading the alignment transforms
+import argparse  # For the command line options
+from concurrent.futures import ProcessPoolExecutor  # For building the tiles on several cores
+import cv2  # For reading, drawing and showing the images
+import numpy as np  # For the tiles and the contact sheet
+
+#Allows the function in mis_folder_functions to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from data_processing.misc_folder_functions.get_base_filepath import get_sharepoint_path
+from data_processing.ROI.roi_statistics import load_mask
+from data_processing.ROI.roi_store import roi_table_path, load_roi_table, rasterize_roi
+from data_processing.alignment.transform_store import transform_table_path, load_transform_table, transform_matrix
+
+#Change as you need to
+THERMAL_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "thermal_images")
+VISIBLE_BASE_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "ProcessedData", "Separated & Processed Images", "optical_images")
+ROI_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "ROI_masks")
+TRANSFORM_INFO_DIR = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "transform_info")
+
+# Redo list the flagged images are written to (same format as Files_Redo.csv, read by copy_redo_image.py)
+REDO_CSV_PATH = os.path.join(get_sharepoint_path(), "HIP_Project", "RESULTS_from_python_scripts", "Files_Redo.csv")
+
+# Tiles per screen (columns, rows) and the size of each tile in pixels (width, height)
+REVIEW_GRID = (8, 8)
+TILE_SIZE = (160, 120)
+
+# Number of processes building tiles in the background
+REVIEW_WORKERS = 4
+
+# Header of the redo list
+REDO_HEADER = "Img Name"
+
+# Same look as ROI_draw's overlay and semi_automatic_alignment's blend
+ROI_OVERLAY_ALPHA = 0.5
+BLEND_ALPHA = 0.3
+OPTICAL_GAIN = 1.2
+
+def fit_to_tile(image, tile_size):
+    """
+    Downscale an image to fit in a tile, keeping its aspect ratio.
+
+    Args:
+        image (np.ndarray): BGR image.
+        tile_size (tuple): (width, height) of the tile.
+
+    Returns:
+        tuple: (tile, scale) with the image centered on a black tile and the scale it was resized by.
+    """
+    tile_width, tile_height = tile_size
+    scale = min(tile_width / image.shape[1], tile_height / image.shape[0])
+    width, height = max(int(image.shape[1] * scale), 1), max(int(image.shape[0] * scale), 1)
+    tile = np.zeros((tile_height, tile_width, 3), dtype=np.uint8)
+    x0, y0 = (tile_width - width) // 2, (tile_height - height) // 2
+    tile[y0:y0 + height, x0:x0 + width] = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return tile, scale
+
+def build_roi_tile(thermal_path, roi_record, mask_path, tile_size):
+    """
+    Build the tile of an ROI: the thermal image with the ROI in green, like ROI_draw's thermal_with_mask images.
+
+    Args:
+        thermal_path (str): Path of the thermal image.
+        roi_record (dict): The image's ROI table entry, or None to use mask_path.
+        mask_path (str): Path of the binary mask image, used when there is no ROI table entry.
+        tile_size (tuple): (width, height) of the tile.
+
+    Returns:
+        np.ndarray: The tile.
+    """
+    thermal_img = cv2.imread(thermal_path)
+    if thermal_img is None:
+        raise ValueError(f"Could not read {thermal_path}")
+    tile, scale = fit_to_tile(thermal_img, tile_size)
+
+    # Draw the mask straight at tile size instead of at full size
+    height, width = int(thermal_img.shape[0] * scale), int(thermal_img.shape[1] * scale)
+    if roi_record is not None:
+        mask = rasterize_roi(roi_record, (height, width))
+    else:
+        mask = cv2.resize(load_mask(mask_path).astype(np.uint8), (width, height), interpolation=cv2.INTER_NEAREST) > 0
+
+    x0, y0 = (tile_size[0] - width) // 2, (tile_size[1] - height) // 2
+    region = tile[y0:y0 + height, x0:x0 + width]
+    colored_mask = np.zeros_like(region)
+    colored_mask[mask] = [0, 255, 0]
+    tile[y0:y0 + height, x0:x0 + width] = cv2.addWeighted(region, 1, colored_mask, ROI_OVERLAY_ALPHA, 0)
+    return tile
+
+def build_alignment_tile(thermal_path, optical_path, transform_info, tile_size):
+    """
+    Build the tile of an alignment: the thermal image blended with the aligned optical image,
+    like semi_automatic_alignment's blended_images.
+
+    The optical image is warped straight into the tile (the transform is scaled down to it), so the
+    full size aligned image is never made.
+
+    Args:
+        thermal_path (str): Path of the thermal image.
+        optical_path (str): Path of the original optical image.
+        transform_info (dict): The transform, a transform table record or the contents of a transform_info json.
+        tile_size (tuple): (width, height) of the tile.
+
+    Returns:
+        np.ndarray: The tile.
+    """
+    thermal_img = cv2.imread(thermal_path)
+    if thermal_img is None:
+        raise ValueError(f"Could not read {thermal_path}")
+    optical_img = cv2.imread(optical_path)
+    if optical_img is None:
+        raise ValueError(f"Could not read {optical_path}")
+
+    tile, scale = fit_to_tile(thermal_img, tile_size)
+    height, width = int(thermal_img.shape[0] * scale), int(thermal_img.shape[1] * scale)
+    M = transform_matrix(transform_info) * scale
+
+    # Shrink the optical image first so the warp does not skip over pixels
+    shrunk = cv2.resize(optical_img, (max(int(optical_img.shape[1] * min(1.0, abs(M[0, 0]))), 1),
+                                      max(int(optical_img.shape[0] * min(1.0, abs(M[1, 1]))), 1)), interpolation=cv2.INTER_AREA)
+    M[0, 0] *= optical_img.shape[1] / shrunk.shape[1]
+    M[1, 1] *= optical_img.shape[0] / shrunk.shape[0]
+
+    aligned_optical = cv2.warpAffine(shrunk, M, (width, height))
+    enhanced_optical = cv2.addWeighted(aligned_optical, OPTICAL_GAIN, np.zeros(aligned_optical.shape, aligned_optical.dtype), 0, 0)
+
+    x0, y0 = (tile_size[0] - width) // 2, (tile_size[1] - height) // 2
+    region = tile[y0:y0 + height, x0:x0 + width]
+    tile[y0:y0 + height, x0:x0 + width] = cv2.addWeighted(region, 1 - BLEND_ALPHA, enhanced_optical, BLEND_ALPHA, 0)
+    return tile
+
+def build_tile(task):
+    """
+    Build one tile in a worker process.
+
+    Args:
+        task (tuple): ("roi", thermal_path, roi_record, mask_path, tile_size) or
+                      ("alignment", thermal_path, optical_path, transform_info, tile_size).
+
+    Returns:
+        np.ndarray: The tile.
+    """
+    if task[0] == "roi":
+        return build_roi_tile(*task[1:])
+    return build_alignment_tile(*task[1:])
+
+def roi_review_items(thermal_dir, roi_dir):
+    """
+    Find the ROIs to review, from the ROI table and the binary mask folders.
+
+    Args:
+        thermal_dir (str): Folder with a thermal image folder per subject.
+        roi_dir (str): ROI folder (ROI table and HIP_xx/binary_masks).
+
+    Returns:
+        dict: Maps each subject to a sorted list of (base_name, task) for build_tile.
+    """
+    rois = load_roi_table(roi_table_path(roi_dir))
+    items = {}
+
+    subjects = {subject for subject, _ in rois}
+    if os.path.isdir(roi_dir):
+        subjects.update(name for name in os.listdir(roi_dir) if os.path.isdir(os.path.join(roi_dir, name, "binary_masks")))
+
+    for subject in sorted(subjects):
+        # The table wins over a mask image of the same image
+        found = {image: None for (table_subject, image) in rois if table_subject == subject}
+        mask_dir = os.path.join(roi_dir, subject, "binary_masks")
+        if os.path.isdir(mask_dir):
+            for mask_file in os.listdir(mask_dir):
+                if mask_file.endswith("_cropped_optical_mask.png"):
+                    base_name = mask_file.replace("_cropped_optical_mask.png", "")
+                    found.setdefault(base_name, os.path.join(mask_dir, mask_file))
+
+        for base_name in sorted(found):
+            thermal_path = os.path.join(thermal_dir, subject, f"{base_name}_thermal.jpg")
+            if not os.path.exists(thermal_path):
+                print(f"Matching thermal image not found for: {base_name}")
+                continue
+            task = ("roi", thermal_path, rois.get((subject, base_name)), found[base_name], TILE_SIZE)
+            items.setdefault(subject, []).append((base_name, task))
+    return items
+
+def alignment_review_items(thermal_dir, visible_dir, transform_info_dir):
+    """
+    Find the alignments to review, from the transform table and the transform_info folders.
+
+    Args:
+        thermal_dir (str): Folder with a thermal image folder per subject.
+        visible_dir (str): Folder with an optical image folder per subject.
+        transform_info_dir (str): transform_info folder (transform table and HIP_xx/*_transform_info.json).
+
+    Returns:
+        dict: Maps each subject to a sorted list of (base_name, task) for build_tile.
+    """
+    transforms = load_transform_table(transform_table_path(transform_info_dir))
+    items = {}
+
+    # The table wins over a transform_info json of the same image
+    found = dict(transforms)
+    if os.path.isdir(transform_info_dir):
+        for subject in os.listdir(transform_info_dir):
+            subject_dir = os.path.join(transform_info_dir, subject)
+            if not os.path.isdir(subject_dir):
+                continue
+            for filename in os.listdir(subject_dir):
+                if not filename.endswith("_transform_info.json"):
+                    continue
+                base_name = filename.replace("_transform_info.json", "")
+                if (subject, base_name) in found:
+                    continue
+                info_path = os.path.join(subject_dir, filename)
+                try:
+                    with open(info_path, 'r') as f:
+                        found[(subject, base_name)] = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Error processing {info_path}: {e}")
+
+    for (subject, base_name), transform_info in sorted(found.items()):
+        thermal_path = os.path.join(thermal_dir, subject, f"{base_name}_thermal.jpg")
+        optical_path = os.path.join(visible_dir, subject, f"{base_name}_optical.jpg")
+        if not os.path.exists(thermal_path) or not os.path.exists(optical_path):
+            print(f"Matching thermal or optical image not found for: {base_name}")
+            continue
+        task = ("alignment", thermal_path, optical_path, transform_info, TILE_SIZE)
+        items.setdefault(subject, []).append((base_name, task))
+    return items
+
+def read_redo_list(csv_path):
+    """
+    Read the image names in a redo list.
+
+    Args:
+        csv_path (str): Path of the redo list (Files_Redo.csv format: "Img Name" header, one "<base_name>.jpg" per row).
+
+    Returns:
+        list: The image names without extension, in file order.
+    """
+    if not os.path.exists(csv_path):
+        return []
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header row
+        return [os.path.splitext(row[0])[0] for row in reader if row and row[0]]
+
+def write_redo_list(csv_path, base_names):
+    """
+    Write a redo list in the Files_Redo.csv format (UTF-8 with BOM, as saved by Excel).
+
+    Args:
+        csv_path (str): Path of the redo list.
+        base_names (list): Image names without extension.
+    """
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    temp_path = csv_path + ".tmp"
+    with open(temp_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow([REDO_HEADER])
+        for base_name in base_names:
+            writer.writerow([f"{base_name}.jpg"])
+    os.replace(temp_path, csv_path)
+
+def compose_sheet(tiles, names, flagged, cursor, grid, tile_size):
+    """
+    Put a page of tiles together into one contact sheet.
+
+    Args:
+        tiles (list): Tile images (None for a tile that could not be built).
+        names (list): Base name of each tile.
+        flagged (set): Base names flagged for redo; drawn with a red frame and cross.
+        cursor (int): Index of the tile the keyboard cursor is on; drawn with a yellow frame.
+        grid (tuple): (columns, rows).
+        tile_size (tuple): (width, height) of a tile.
+
+    Returns:
+        np.ndarray: The contact sheet.
+    """
+    columns, rows = grid
+    tile_width, tile_height = tile_size
+    sheet = np.full((rows * tile_height, columns * tile_width, 3), 32, dtype=np.uint8)
+
+    for index, (tile, name) in enumerate(zip(tiles, names)):
+        x0, y0 = (index % columns) * tile_width, (index // columns) * tile_height
+        if tile is not None:
+            sheet[y0:y0 + tile_height, x0:x0 + tile_width] = tile
+        # Leave out the subject, it is in the window title
+        label = name.split('_', 2)[-1]
+        cv2.putText(sheet, label, (x0 + 3, y0 + tile_height - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (0, 0, 0), 3)
+        cv2.putText(sheet, label, (x0 + 3, y0 + tile_height - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (255, 255, 255), 1)
+        if name in flagged:
+            cv2.rectangle(sheet, (x0 + 1, y0 + 1), (x0 + tile_width - 2, y0 + tile_height - 2), (0, 0, 255), 3)
+            cv2.line(sheet, (x0, y0), (x0 + tile_width - 1, y0 + tile_height - 1), (0, 0, 255), 1)
+            cv2.line(sheet, (x0 + tile_width - 1, y0), (x0, y0 + tile_height - 1), (0, 0, 255), 1)
+        if index == cursor:
+            cv2.rectangle(sheet, (x0 + 4, y0 + 4), (x0 + tile_width - 5, y0 + tile_height - 5), (0, 255, 255), 1)
+    return sheet
+
+"""
+Function to review the tiles of one subject.
+
+Shows the subject's tiles REVIEW_GRID at a time and lets the reviewer flag the bad ones:
+
+- Left click on a tile, or space on the tile under the cursor, flags or unflags it.
+- w/a/s/d move the cursor.
+- n or Enter goes to the next page (or the next subject after the last page), b to the previous page.
+- q or Esc stops reviewing; the flags made so far are kept.
+
+Parameters:
+subject (str): Subject being reviewed, shown in the window title.
+items (list): (base_name, task) of every tile of the subject.
+futures (list): Future of each tile, from the worker pool.
+flagged (set): Base names flagged for redo, updated in place.
+grid (tuple): (columns, rows) of tiles per page.
+tile_size (tuple): (width, height) of a tile.
+
+Returns:
+bool: False if the reviewer asked to stop, True to go on with the next subject.
+"""
+def review_subject(subject, items, futures, flagged, grid, tile_size):
+    per_page = grid[0] * grid[1]
+    page, cursor = 0, 0
+    window_name = f"Review - {subject}"
+    state = {}
+
+    def toggle(name):
+        if name in flagged:
+            flagged.discard(name)
+        else:
+            flagged.add(name)
+
+    def on_click(event, x, y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            index = (y // tile_size[1]) * grid[0] + x // tile_size[0]
+            if x < grid[0] * tile_size[0] and index < len(state["names"]):
+                toggle(state["names"][index])
+                cv2.imshow(window_name, compose_sheet(state["tiles"], state["names"], flagged, state["cursor"], grid, tile_size))
+
+    cv2.namedWindow(window_name)
+    cv2.setMouseCallback(window_name, on_click)
+
+    while True:
+        page_items = items[page * per_page:(page + 1) * per_page]
+        names = [base_name for base_name, _ in page_items]
+        tiles = []
+        for (base_name, task), future in zip(page_items, futures[page * per_page:(page + 1) * per_page]):
+            try:
+                tiles.append(future.result())
+            except Exception as e:
+                print(f"Error processing {task[1]}: {e}")
+                tiles.append(None)
+        cursor = min(cursor, len(names) - 1)
+        state.update(tiles=tiles, names=names, cursor=cursor)
+
+        num_pages = (len(items) + per_page - 1) // per_page
+        cv2.setWindowTitle(window_name, f"Review - {subject} - page {page + 1}/{num_pages}")
+        cv2.imshow(window_name, compose_sheet(tiles, names, flagged, cursor, grid, tile_size))
+        key = cv2.waitKey(0) & 0xFF
+
+        if key in (ord('q'), 27):
+            cv2.destroyAllWindows()
+            return False
+        elif key in (ord('n'), 13):
+            if page + 1 >= num_pages:
+                cv2.destroyAllWindows()
+                return True
+            page, cursor = page + 1, 0
+        elif key == ord('b'):
+            page = max(page - 1, 0)
+        elif key == ord(' '):
+            toggle(names[cursor])
+        elif key in (ord('w'), ord('a'), ord('s'), ord('d')):
+            step = {ord('w'): -grid[0], ord('s'): grid[0], ord('a'): -1, ord('d'): 1}[key]
+            cursor = min(max(cursor + step, 0), len(names) - 1)
+        state["cursor"] = cursor
+
+def main(mode, redo_csv_path=REDO_CSV_PATH, subjects=None, workers=REVIEW_WORKERS, grid=REVIEW_GRID):
+    """
+    Review ROIs or alignments on contact sheets and write the flagged images to a redo list.
+
+    Tiles are built by a pool of worker processes: the next subject's tiles are being built while
+    the current one is reviewed. Images already in the redo list start flagged; unflagging one
+    removes it, and entries of images not reviewed are kept as they are.
+
+    Args:
+        mode (str): "roi" to review the ROIs, "alignment" to review the alignments.
+        redo_csv_path (str): Path of the redo list.
+        subjects (list): Subjects to review (e.g. ["HIP_01"]), or None for all.
+        workers (int): Number of processes building tiles.
+        grid (tuple): (columns, rows) of tiles per page.
+    """
+    if mode == "roi":
+        items = roi_review_items(THERMAL_BASE_DIR, ROI_DIR)
+    else:
+        items = alignment_review_items(THERMAL_BASE_DIR, VISIBLE_BASE_DIR, TRANSFORM_INFO_DIR)
+    if subjects:
+        items = {subject: items[subject] for subject in subjects if subject in items}
+    if not items:
+        print("Nothing to review.")
+        return
+
+    redo_list = read_redo_list(redo_csv_path)
+    flagged = set(redo_list)
+    reviewed = set()
+    order = list(items)
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Build the current and the next subject's tiles, the rest are submitted as we go
+        futures = {}
+        for subject in order[:2]:
+            futures[subject] = [executor.submit(build_tile, task) for _, task in items[subject]]
+
+        for index, subject in enumerate(order):
+            if index + 2 < len(order):
+                next_subject = order[index + 2]
+                futures[next_subject] = [executor.submit(build_tile, task) for _, task in items[next_subject]]
+
+            print(f"Reviewing {subject}: {len(items[subject])} images")
+            keep_going = review_subject(subject, items[subject], futures.pop(subject), flagged, grid, TILE_SIZE)
+            reviewed.update(base_name for base_name, _ in items[subject])
+
+            # Save after every subject so nothing is lost if the script is stopped
+            kept = [name for name in redo_list if name not in reviewed or name in flagged]
+            added = sorted(name for name in flagged if name in reviewed and name not in redo_list)
+            redo_list = kept + added
+            flagged = set(redo_list)
+            write_redo_list(redo_csv_path, redo_list)
+            print(f"{len([name for name in redo_list if name in reviewed])} flagged so far, saved in {redo_csv_path}")
+
+            if not keep_going:
+                for pending in futures.values():
+                    for future in pending:
+                        future.cancel()
+                break
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Review ROIs or alignments on contact sheets and write the bad ones to a redo list.")
+    parser.add_argument("mode", choices=["roi", "alignment"], help="what to review")
+    parser.add_argument("--subjects", nargs="+", default=None, help="subjects to review, e.g. HIP_01 HIP_02 (default: all)")
+    parser.add_argument("--output", default=REDO_CSV_PATH, help="redo list to write (default: REDO_CSV_PATH)")
+    parser.add_argument("--workers", type=int, default=REVIEW_WORKERS, help="number of processes building tiles")
+    parser.add_argument("--grid", type=int, nargs=2, default=list(REVIEW_GRID), metavar=("COLUMNS", "ROWS"),
+                        help="tiles per screen")
+    args = parser.parse_args()
+
+    main(args.mode, args.output, args.subjects, args.workers, tuple(args.grid))
@@ -1,8 +1,12 @@
 import os
 import csv
-import exiftool
 from datetime import datetime
 
+#Allows the function in data_extraction to be imported
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from data_processing.data_extraction.exif_reader import read_exif_metadata
+
 def extract_all_metadata(file_path):
     """
     Extract all metadata from a given file using ExifTool.
@@ -13,13 +17,19 @@ def extract_all_metadata(file_path):
     Returns:
     dict: A dictionary containing all metadata, or None if an error occurs.
     """
-    try:
-        with exiftool.ExifToolHelper() as et:
-            metadata = et.get_metadata(file_path)[0]
-        return metadata
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-        return None
+    return extract_all_metadata_batch([file_path])[file_path]
+
+def extract_all_metadata_batch(file_paths):
+    """
+    Extract all metadata from several files using a single ExifTool process.
+
+    Args:
+    file_paths (list): Paths to the files from which to extract metadata.
+
+    Returns:
+    dict: Maps each file path to its metadata dictionary, or to None if an error occurs.
+    """
+    return read_exif_metadata(file_paths)
 
 def write_metadata_to_csv(input_file, output_csv_path):
     """